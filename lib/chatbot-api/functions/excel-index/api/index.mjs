@@ -5,13 +5,16 @@
  *   POST   /admin/indexes              — create a new index
  *   GET    /admin/indexes/{indexId}/status
  *   GET    /admin/indexes/{indexId}/preview
- *   POST   /admin/indexes/{indexId}/upload-url
+ *   POST   /admin/indexes/{indexId}/upload-url  — body: { file_name } (.xlsx/.csv/.tsv)
  *   PUT    /admin/indexes/{indexId}     — update display_name / description
  *   DELETE /admin/indexes/{indexId}
+ *
+ * Worksheet sub-indexes (registry items with parent_index_id) are created and
+ * removed by their parent's uploads, so they reject upload-url and DELETE.
  */
 import { LambdaClient, InvokeCommand } from "@aws-sdk/client-lambda";
 import { S3Client, PutObjectCommand, DeleteObjectCommand } from "@aws-sdk/client-s3";
-import { DynamoDBClient, QueryCommand, DeleteItemCommand, PutItemCommand, UpdateItemCommand, BatchWriteItemCommand, ScanCommand } from "@aws-sdk/client-dynamodb";
+import { DynamoDBClient, QueryCommand, GetItemCommand, DeleteItemCommand, PutItemCommand, UpdateItemCommand, BatchWriteItemCommand, ScanCommand } from "@aws-sdk/client-dynamodb";
 import { getSignedUrl } from "@aws-sdk/s3-request-presigner";
 
 const lambdaClient = new LambdaClient({});
@@ -24,7 +27,13 @@ const REGISTRY_TABLE = process.env.INDEX_REGISTRY_TABLE;
 const DATA_TABLE = process.env.TABLE_NAME;
 
 const URL_EXPIRATION_SECONDS = 300;
-const XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet";
+// Upload formats the parser ingests, by extension. The object is stored as
+// indexes/{indexId}/latest.{ext}; the signed URL pins its Content-Type.
+const UPLOAD_TYPES = {
+  xlsx: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+  csv: "text/csv",
+  tsv: "text/tab-separated-values",
+};
 const BATCH_SIZE = 25;
 
 const corsHeaders = {
@@ -88,7 +97,10 @@ export const handler = async (event) => {
 
     // POST /admin/indexes/{indexId}/upload-url
     if (path.endsWith("/upload-url") && method === "POST") {
-      return await getUploadUrl(indexId);
+      const parent = await parentIndexOf(indexId);
+      if (parent) return subIndexError(parent);
+      const body = typeof event.body === "string" ? JSON.parse(event.body || "{}") : (event.body || {});
+      return await getUploadUrl(indexId, body);
     }
 
     // PUT /admin/indexes/{indexId} — update display_name / description
@@ -99,6 +111,8 @@ export const handler = async (event) => {
 
     // DELETE /admin/indexes/{indexId}
     if (method === "DELETE") {
+      const parent = await parentIndexOf(indexId);
+      if (parent) return subIndexError(parent);
       return await deleteIndex(indexId);
     }
 
@@ -123,10 +137,27 @@ async function listIndexes() {
     row_count: parseInt(item.row_count?.N || "0", 10),
     last_updated: item.last_updated?.S || null,
     status: item.status?.S || "NO_DATA",
+    parent_index_id: item.parent_index_id?.S || null,
   }));
   return jsonResponse(200, { indexes });
 }
 
+// The parent index of a worksheet sub-index, or null for a top-level index.
+async function parentIndexOf(indexId) {
+  const resp = await ddb.send(new GetItemCommand({
+    TableName: REGISTRY_TABLE,
+    Key: { pk: { S: "TOOLS" }, sk: { S: indexId } },
+    ProjectionExpression: "parent_index_id",
+  }));
+  return resp.Item?.parent_index_id?.S || null;
+}
+
+function subIndexError(parent) {
+  return jsonResponse(400, {
+    error: `This index is a worksheet of '${parent}'; upload or delete '${parent}' instead`,
+  });
+}
+
 async function createIndex(body) {
   const indexName = body.index_name || body.name;
   const displayName = body.display_name || body.displayName;
@@ -166,15 +197,21 @@ async function proxyToQuery(indexId, action) {
   return { statusCode, headers: corsHeaders, body: bodyStr };
 }
 
-async function getUploadUrl(indexId) {
-  const key = `indexes/${indexId}/latest.xlsx`;
+async function getUploadUrl(indexId, body) {
+  // Callers that predate CSV support send no file name: keep them on .xlsx
+  const fileName = body.file_name || "latest.xlsx";
+  const ext = fileName.split(".").pop().toLowerCase();
+  const contentType = UPLOAD_TYPES[ext];
+  if (!contentType) {
+    return jsonResponse(400, { error: `Unsupported file type; expected one of: ${Object.keys(UPLOAD_TYPES).map((e) => "." + e).join(", ")}` });
+  }
   const command = new PutObjectCommand({
     Bucket: BUCKET,
-    Key: key,
-    ContentType: XLSX_MIME,
+    Key: `indexes/${indexId}/latest.${ext}`,
+    ContentType: contentType,
   });
   const signedUrl = await getSignedUrl(s3, command, { expiresIn: URL_EXPIRATION_SECONDS });
-  return jsonResponse(200, { signedUrl });
+  return jsonResponse(200, { signedUrl, contentType });
 }
 
 async function updateIndex(indexId, body) {
@@ -195,11 +232,14 @@ async function updateIndex(indexId, body) {
   if (updates.length === 0) {
     return jsonResponse(400, { error: "Nothing to update" });
   }
+  // An admin-written description is never replaced by the parser's
+  // fallback or generated ones, which are tagged with description_source
+  const remove = body.description !== undefined ? " REMOVE description_source" : "";
 
   const resp = await ddb.send(new UpdateItemCommand({
     TableName: REGISTRY_TABLE,
     Key: { pk: { S: "TOOLS" }, sk: { S: indexId } },
-    UpdateExpression: "SET " + updates.join(", "),
+    UpdateExpression: "SET " + updates.join(", ") + remove,
     ExpressionAttributeNames: names,
     ExpressionAttributeValues: values,
     ReturnValues: "ALL_NEW",
@@ -214,24 +254,32 @@ async function updateIndex(indexId, body) {
 }
 
 async function deleteIndex(indexId) {
-  // 1. Delete S3 object
-  try {
-    await s3.send(new DeleteObjectCommand({
-      Bucket: BUCKET,
-      Key: `indexes/${indexId}/latest.xlsx`,
-    }));
-  } catch (e) {
-    console.warn(`S3 delete for ${indexId} failed (may not exist):`, e.message);
+  // 1. Delete the uploaded file, whichever format it was
+  for (const ext of Object.keys(UPLOAD_TYPES)) {
+    try {
+      await s3.send(new DeleteObjectCommand({
+        Bucket: BUCKET,
+        Key: `indexes/${indexId}/latest.${ext}`,
+      }));
+    } catch (e) {
+      console.warn(`S3 delete of latest.${ext} for ${indexId} failed (may not exist):`, e.message);
+    }
   }
 
-  // 2. Clear all rows from the shared data table
+  // 2. Clear all rows from the shared data table: the META partition plus
+  //    every row generation (pk = "<indexId>#g<N>") the parser has written,
+  //    and the same for each worksheet sub-index (pk = "<indexId>.<sheet>...")
   if (DATA_TABLE) {
     let lastKey = undefined;
     do {
       const scanParams = {
         TableName: DATA_TABLE,
-        FilterExpression: "pk = :pk",
-        ExpressionAttributeValues: { ":pk": { S: indexId } },
+        FilterExpression: "pk = :pk OR begins_with(pk, :gen) OR begins_with(pk, :sheet)",
+        ExpressionAttributeValues: {
+          ":pk": { S: indexId },
+          ":gen": { S: `${indexId}#g` },
+          ":sheet": { S: `${indexId}.` },
+        },
         ProjectionExpression: "pk, sk",
       };
       if (lastKey) scanParams.ExclusiveStartKey = lastKey;
@@ -251,11 +299,19 @@ async function deleteIndex(indexId) {
     } while (lastKey);
   }
 
-  // 3. Delete registry entry
-  await ddb.send(new DeleteItemCommand({
+  // 3. Delete registry entries: the index and its worksheet sub-indexes
+  const subs = await ddb.send(new QueryCommand({
     TableName: REGISTRY_TABLE,
-    Key: { pk: { S: "TOOLS" }, sk: { S: indexId } },
+    KeyConditionExpression: "pk = :pk AND begins_with(sk, :sheet)",
+    ExpressionAttributeValues: { ":pk": { S: "TOOLS" }, ":sheet": { S: `${indexId}.` } },
+    ProjectionExpression: "sk",
   }));
+  for (const sk of [indexId, ...(subs.Items || []).map((item) => item.sk.S)]) {
+    await ddb.send(new DeleteItemCommand({
+      TableName: REGISTRY_TABLE,
+      Key: { pk: { S: "TOOLS" }, sk: { S: sk } },
+    }));
+  }
 
   return jsonResponse(200, { deleted: indexId });
 }
@@ -0,0 +1,136 @@
+"""
+Parallel DynamoDB bulk puts/deletes for the Excel index parser.
+
+Reprocessing an index deletes every old row and writes every new one. Done
+one ``batch_write_item`` at a time that is thousands of serialized round
+trips for a large sheet, and anything DynamoDB hands back as
+``UnprocessedItems`` (throttling, partition hot spots) was silently lost,
+leaving orphan rows behind.
+
+``BulkWriter`` buffers puts and deletes into 25-item batches and sends them
+from a thread pool. Unprocessed items and throttling errors are retried with
+exponential backoff and jitter; a batch that still has unprocessed items
+after ``max_retries`` fails the whole operation rather than dropping rows.
+At most ``2 * workers`` batches are in flight, so memory stays bounded
+however many items are fed in. ``stats`` reports items, batches, retries
+and throughput once the writer is closed.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+BATCH_SIZE = 25
+_RETRYABLE_ERRORS = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "InternalServerError",
+}
+_SERIALIZER = TypeSerializer()
+
+
+def _to_attribute_values(item: dict) -> dict:
+    return {k: _SERIALIZER.serialize(v) for k, v in item.items()}
+
+
+class BulkWriter:
+    """Context manager sending batched puts/deletes for one table from a thread pool.
+
+    ``client`` is a low-level DynamoDB client (thread-safe, unlike resources).
+    Items and keys are plain Python dicts, as with ``Table.put_item``.
+    Leaving the ``with`` block waits for every batch and re-raises the first
+    failure.
+    """
+
+    def __init__(self, client, table_name: str, workers: int = 8,
+                 max_retries: int = 8, base_delay: float = 0.05):
+        self.client = client
+        self.table_name = table_name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._buffer: list[dict] = []
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._in_flight = threading.BoundedSemaphore(2 * workers)
+        self._lock = threading.Lock()
+        self._error: BaseException | None = None
+        self._started = time.monotonic()
+        self.stats = {"items": 0, "batches": 0, "retries": 0, "seconds": 0.0, "items_per_second": 0.0}
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(raise_errors=exc_type is None)
+
+    def put(self, item: dict) -> None:
+        self._add({"PutRequest": {"Item": _to_attribute_values(item)}})
+
+    def delete(self, key: dict) -> None:
+        self._add({"DeleteRequest": {"Key": _to_attribute_values(key)}})
+
+    def _add(self, request: dict) -> None:
+        if self._error is not None:
+            raise self._error
+        self._buffer.append(request)
+        if len(self._buffer) >= BATCH_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        self._in_flight.acquire()
+        future = self._executor.submit(self._send, batch)
+        future.add_done_callback(self._done)
+
+    def _done(self, future) -> None:
+        self._in_flight.release()
+        exc = future.exception()
+        if exc is not None:
+            with self._lock:
+                if self._error is None:
+                    self._error = exc
+
+    def _send(self, requests: list[dict]) -> None:
+        """Write one batch, retrying unprocessed items and throttling with backoff."""
+        sent = len(requests)
+        pending = {self.table_name: requests}
+        attempt = 0
+        while True:
+            try:
+                resp = self.client.batch_write_item(RequestItems=pending)
+                pending = resp.get("UnprocessedItems") or {}
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in _RETRYABLE_ERRORS:
+                    raise
+            if not pending:
+                break
+            attempt += 1
+            if attempt > self.max_retries:
+                left = sum(len(v) for v in pending.values())
+                raise RuntimeError(
+                    f"{left} item(s) still unprocessed in {self.table_name} after {self.max_retries} retries"
+                )
+            with self._lock:
+                self.stats["retries"] += 1
+            time.sleep(random.uniform(0, self.base_delay * 2 ** attempt))
+        with self._lock:
+            self.stats["items"] += sent
+            self.stats["batches"] += 1
+
+    def close(self, raise_errors: bool = True) -> None:
+        """Send the last partial batch, wait for all batches and fill in ``stats``."""
+        try:
+            if self._error is None:
+                self._flush()
+        finally:
+            self._executor.shutdown(wait=True)
+        elapsed = time.monotonic() - self._started
+        self.stats["seconds"] = round(elapsed, 3)
+        self.stats["items_per_second"] = round(self.stats["items"] / elapsed, 1) if elapsed > 0 else 0.0
+        if raise_errors and self._error is not None:
+            raise self._error
@@ -1,50 +1,164 @@
 """
-Excel Index Parser Lambda -- S3 event-driven ingestion of .xlsx files into DynamoDB.
+Excel Index Parser Lambda -- S3 event-driven ingestion of .xlsx/.csv/.tsv files into DynamoDB.
 
 Triggered automatically by S3 notifications when a file is created or deleted
 under the ``indexes/`` prefix. The S3 key must follow the convention
-``indexes/{index_id}/latest.xlsx``; other paths are silently ignored.
+``indexes/{index_id}/latest.xlsx`` (or ``latest.csv`` / ``latest.tsv``);
+other paths are silently ignored.
 
 Processing pipeline:
-  1. Extract ``index_id`` from the S3 key.
-  2. For delete events: clear all data rows and remove the tool-registry entry.
+  1. Extract ``index_id`` from the S3 key. Created events for an object
+     whose key/ETag/VersionId match the index's COMPLETE META, or an upload
+     of it already in flight, are skipped (see ``_claim_source``): S3
+     delivers events at least once and syncs re-copy unchanged files.
+  2. For delete events: clear every generation of the index, drop its
+     sub-indexes and remove the tool-registry entry. A delete of an object
+     other than the one the index was built from (META ``source_key``) is
+     ignored.
   3. For create/update events:
-     a. Download and parse the Excel file with openpyxl.
+     a. Download the file to ``/tmp``. CSV/TSV files are read with the
+        stdlib ``csv`` module; workbooks are opened with openpyxl in
+        read-only (streaming) mode. The active worksheet is the index itself;
+        every other worksheet with a header row becomes a sub-index
+        ``{index_id}.{sheet}`` ingested concurrently through steps b-h (see
+        ``_ingest_workbook``), and sub-indexes of sheets that no longer exist
+        are dropped.
      b. Validate that at least 2 header columns exist.
-     c. Write a PROCESSING status to the META item.
-     d. Clear stale rows from any previous version of this index.
-     e. Batch-write all new rows to DynamoDB.
-     f. Update the META item with COMPLETE status, row count, and column list.
-     g. Register the index in the tool registry so the chat agent can discover
-        and query it. The registry call triggers AI-generated descriptions of
-        the index contents based on column names and sample rows.
+     c. Reserve a new generation number on the META item. An index with no
+        live generation yet is marked PROCESSING; otherwise the live one keeps
+        serving queries and ``pending_generation`` flags the re-upload.
+     d. Stream rows straight from the sheet into the new generation's
+        partition with parallel, retrying batch writes
+        (``bulk_writer.BulkWriter``), accumulating column statistics, a
+        reservoir sample for type inference and a JSON-lines spool of the rows
+        in ``/tmp`` on the way. Nothing holds the whole sheet, so memory stays
+        flat however large it is. A re-upload is instead diffed against the
+        live generation by row key while spooling; a small diff is applied
+        to the live partition in place, a large one replays the spool into
+        the new generation (see ``_ingest``). Sheets of ``FANOUT_MIN_ROWS``
+        rows or more are spooled first and written by parallel slice
+        workers (``_fan_out``).
+     e. Infer date/number columns from the sample, then replay the spool into a
+        compressed row snapshot (``indexes/{index_id}/snapshot.jsonl.gz``) so
+        cold query containers can load the index with a single S3 GET.
+     f. Cut over: overwrite the META item with COMPLETE status, row count,
+        column list, snapshot key and ``data_pk`` pointing at the new
+        generation, in one conditional ``put_item`` (skipped if a newer upload
+        has started since -- it will cut over instead).
+     g. Delete the superseded generation asynchronously (see
+        ``_collect_garbage``), off the critical path.
+     h. Register the index in the tool registry so the chat agent can discover
+        and query it. An index without a description is registered with a
+        deterministic fallback (or the cached description for its schema) and
+        the AI description is generated asynchronously from column names and
+        sample rows (see ``_queue_description``).
 
 DynamoDB layout (shared table, partitioned by index_id):
-  - ``pk=index_id, sk=META`` -- status, row_count, last_updated, column list
-  - ``pk=index_id, sk=0..N`` -- one item per Excel row
+  - ``pk=index_id, sk=META`` -- status, row_count, last_updated, column list,
+    inferred date/number columns, per-column statistics (cardinality, null
+    rate, type, top values) and complete value counts for low-cardinality
+    columns (state, category, ...) so unfiltered group/distinct queries
+    never touch the rows; both are trimmed to fit ``models.STATS_MAX_BYTES``
+    together (``stats_truncated``). ``data_pk`` / ``generation`` name the live
+    generation; ``generation_counter`` hands out generation numbers.
+    ``source_key`` / ``source_etag`` / ``source_version_id`` identify the
+    ingested object, and ``pending_source`` the one being ingested (claimed
+    by Lambda request ``pending_source_request``).
+    ``sheets`` lists the workbook's sub-indexes (``{sheet, index_id}``); a
+    sub-index's own META names its ``parent_index`` and ``sheet``.
+    ``applying_generation`` / ``applying_since`` lock the live partition
+    while an incremental re-upload edits it.
+  - ``pk=index_id#g{N}, sk=<row content hash>`` -- one item per Excel row of
+    generation N (``_row_key``; repeated identical rows get a ``#n`` suffix).
+    ``_pos`` orders the rows as in the spreadsheet: full writes space
+    positions ``POSITION_GAP`` apart, and rows added in place take positions
+    between their neighbours', so unchanged rows keep their items. Indexes
+    ingested before generations existed keep their rows under
+    ``pk=index_id`` until their next upload supersedes them.
 
-The META item is intentionally preserved during ``_clear_index`` so that the
-UI can display status/error information even while the index is being
-reprocessed. It is overwritten (not deleted) once the new parse completes.
+Queries follow ``data_pk``, so they only ever see a fully written
+generation: never a half-cleared or half-written one. The exception is an
+incremental re-upload, which edits the live partition under a lock (one
+such upload at a time; see ``_lock_partition``), marks META PROCESSING
+meanwhile so no query container caches it mid-update, and puts the removed
+rows back if it fails or is superseded before its cutover.
+
+The snapshot object mirrors the DynamoDB rows and carries the same
+``last_updated`` stamp as the META item it was published with; the query
+Lambda ignores a snapshot whose stamp doesn't match META and falls back to
+reading the partition.
 """
-import io
+import csv
+import gzip
+import hashlib
 import json
 import os
 import re
+import tempfile
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from openpyxl import load_workbook
 
-from models import excel_column_to_field, infer_date_columns, row_dict_from_excel_row
-from tool_registry import write_to_registry, delete_from_registry
+from abe_utils.excel_snapshot import TYPE_DATE, TYPE_NUMBER, snapshot_key, write_snapshot
+from bulk_writer import BulkWriter
+from models import (
+    ColumnStatsAccumulator,
+    ReservoirSample,
+    excel_column_to_field,
+    infer_date_columns,
+    infer_number_columns,
+    row_dict_from_excel_row,
+)
+from tool_registry import delete_from_registry, describe_index, write_to_registry
 
 S3 = boto3.client("s3")
 DDB = boto3.resource("dynamodb")
+# Low-level client for BulkWriter: thread-safe and takes typed attribute values.
+DDB_CLIENT = boto3.client("dynamodb")
+# Slice workers are invoked synchronously and may run for minutes.
+LAMBDA = boto3.client("lambda", config=Config(read_timeout=900, retries={"max_attempts": 1}))
 BUCKET = os.environ["BUCKET"]
 TABLE_NAME = os.environ["TABLE_NAME"]
 SK_META = "META"
-BATCH_SIZE = 25
+GENERATION_SEP = "#g"
+BULK_WRITE_WORKERS = int(os.environ.get("BULK_WRITE_WORKERS", "8"))
+# Rows sampled (uniformly, across the whole sheet) for date/number inference.
+TYPE_SAMPLE_SIZE = 1000
+SAMPLE_ROWS = 5
+# Row item attribute holding the row's spreadsheet position, and the spacing
+# of positions on a full write (room for rows inserted in place later).
+ROW_POSITION = "_pos"
+POSITION_GAP = 1 << 20
+# Largest share of rows an upload may change and still be applied in place
+# to the live generation (see _ingest); above it a new generation is written.
+INCREMENTAL_MAX_CHANGE_RATIO = float(os.environ.get("INCREMENTAL_MAX_CHANGE_RATIO", "0.2"))
+# Sheets with at least FANOUT_MIN_ROWS rows are written by parallel slice
+# workers (see _fan_out) instead of this invocation alone.
+FANOUT_MIN_ROWS = int(os.environ.get("FANOUT_MIN_ROWS", "50000"))
+FANOUT_SLICE_ROWS = int(os.environ.get("FANOUT_SLICE_ROWS", "25000"))
+FANOUT_WORKERS = int(os.environ.get("FANOUT_WORKERS", "8"))
+# Extra worksheets of a workbook ingested concurrently as sub-indexes.
+SHEET_WORKERS = int(os.environ.get("SHEET_WORKERS", "4"))
+# Sub-index ids are "{index_id}{SHEET_SEP}{sheet}"; admin-created index ids
+# are [a-z0-9_] only, so they never collide with a sub-index.
+SHEET_SEP = "."
+# Delimited-text uploads, by extension; everything else is read as a workbook.
+CSV_DELIMITERS = {".csv": ",", ".tsv": "\t"}
+SUPPORTED_EXTENSIONS = (".xlsx", *CSV_DELIMITERS)
+
+# An in-flight claim on a source object (pending_source) older than the
+# parser's 15-minute timeout belongs to a dead invocation.
+CLAIM_TTL_SECONDS = 15 * 60
+# Keys per batch_get_item call (the API's limit).
+BATCH_GET_SIZE = 100
+_DESERIALIZER = TypeDeserializer()
 
 _INDEX_ID_RE = re.compile(r"^indexes/([^/]+)/")
 
@@ -60,40 +174,319 @@ def _index_id_to_display_name(index_id: str) -> str:
     return index_id.replace("_", " ").title()
 
 
-def _clear_index(table, index_id: str) -> None:
-    """Delete all data-row items for the given index_id, preserving the META item.
+def _generation_pk(index_id: str, generation: int) -> str:
+    """Partition holding one generation of an index's rows."""
+    return f"{index_id}{GENERATION_SEP}{generation}"
+
+
+def _clear_partition(pk: str) -> None:
+    """Delete every item in partition ``pk`` except a META item.
 
-    The META item (sk=META) is kept so the UI can still display index status
-    and error information during reprocessing. It will be overwritten by
-    ``_put_meta`` once parsing completes or fails.
+    Used on generation partitions (which have no META) and on the index's
+    own partition, whose META item is kept so the UI can still display index
+    status and error information. Deletes go through a ``BulkWriter``, so
+    unprocessed items are retried rather than left behind.
     """
-    keys_to_delete = []
-    paginator = boto3.client("dynamodb").get_paginator("query")
-    for page in paginator.paginate(
-        TableName=TABLE_NAME,
-        KeyConditionExpression="pk = :pk",
-        ExpressionAttributeValues={":pk": {"S": index_id}},
-        ProjectionExpression="pk, sk",
-    ):
-        for item in page.get("Items", []):
-            if item.get("sk", {}).get("S") == SK_META:
-                continue
-            keys_to_delete.append({"pk": item["pk"], "sk": item["sk"]})
-    for i in range(0, len(keys_to_delete), BATCH_SIZE):
-        chunk = keys_to_delete[i : i + BATCH_SIZE]
-        request_items = {TABLE_NAME: [{"DeleteRequest": {"Key": k}} for k in chunk]}
-        boto3.client("dynamodb").batch_write_item(RequestItems=request_items)
+    paginator = DDB_CLIENT.get_paginator("query")
+    with BulkWriter(DDB_CLIENT, TABLE_NAME, workers=BULK_WRITE_WORKERS) as writer:
+        for page in paginator.paginate(
+            TableName=TABLE_NAME,
+            KeyConditionExpression="pk = :pk",
+            ExpressionAttributeValues={":pk": {"S": pk}},
+            ProjectionExpression="pk, sk",
+        ):
+            for item in page.get("Items", []):
+                if item.get("sk", {}).get("S") == SK_META:
+                    continue
+                writer.delete({"pk": item["pk"]["S"], "sk": item["sk"]["S"]})
+    _log_bulk_stats(f"Cleared partition '{pk}'", writer.stats)
+
+
+def _index_partitions(index_id: str, meta: dict) -> list[str]:
+    """Every partition that may hold rows of the index, per its META item."""
+    pks = [index_id, meta.get("data_pk")]
+    if meta.get("pending_generation") is not None:
+        pks.append(_generation_pk(index_id, int(meta["pending_generation"])))
+    return list(dict.fromkeys(p for p in pks if p))
+
+
+def _clear_generations(table, index_id: str, pks: list[str]) -> None:
+    """Delete superseded partitions of an index, never the live one.
+
+    META is re-read first, so a stale or replayed request can't remove the
+    generation queries are reading. Partitions that don't belong to the
+    index are ignored.
+    """
+    meta = table.get_item(Key={"pk": index_id, "sk": SK_META}, ConsistentRead=True).get("Item") or {}
+    for pk in pks:
+        if pk == meta.get("data_pk") or not (pk == index_id or pk.startswith(index_id + GENERATION_SEP)):
+            continue
+        _clear_partition(pk)
+
+
+def _collect_garbage(table, index_id: str, pks: list[str]) -> None:
+    """Delete superseded generations off the critical path.
+
+    When running in Lambda this re-invokes the function asynchronously
+    (``InvocationType=Event``) with a ``collect_generations`` request, so the
+    upload finishes as soon as the new generation is live. Elsewhere, or if
+    the invoke fails, the partitions are deleted inline.
+    """
+    pks = [p for p in pks if p]
+    if not pks:
+        return
+    function_name = os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+    if function_name:
+        try:
+            LAMBDA.invoke(
+                FunctionName=function_name,
+                InvocationType="Event",
+                Payload=json.dumps({"collect_generations": {"index_id": index_id, "partitions": pks}}),
+            )
+            return
+        except Exception as e:
+            print(f"Async generation cleanup for '{index_id}' failed to start, clearing inline: {e}")
+    _clear_generations(table, index_id, pks)
+
+
+def _queue_description(index_id: str, display_name: str, columns: list[str], sample_rows: list[dict]) -> None:
+    """Generate an index's AI description off the critical path.
+
+    Like ``_collect_garbage``: an asynchronous ``describe_index``
+    self-invocation in Lambda, inline elsewhere or if the invoke fails. A
+    failure leaves the fallback description in place.
+    """
+    request = {"index_id": index_id, "display_name": display_name,
+               "columns": columns, "sample_rows": sample_rows[:3]}
+    function_name = os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+    if function_name:
+        try:
+            LAMBDA.invoke(FunctionName=function_name, InvocationType="Event",
+                          Payload=json.dumps({"describe_index": request}, default=str))
+            return
+        except Exception as e:
+            print(f"Async description for '{index_id}' failed to start, generating inline: {e}")
+    try:
+        describe_index(index_id, display_name, columns, request["sample_rows"])
+    except Exception as e:
+        print(f"Description generation for '{index_id}' failed: {e}")
+
+
+def _object_source(bucket: str, key: str, obj: dict) -> dict:
+    """Identity of an uploaded object: key, ETag and VersionId (unversioned buckets have none).
+
+    Taken from the event record, falling back to ``head_object`` for
+    records without an ETag.
+    """
+    etag, version_id = obj.get("eTag"), obj.get("versionId")
+    if not etag:
+        head = S3.head_object(Bucket=bucket, Key=key)
+        etag, version_id = head.get("ETag"), head.get("VersionId")
+    return {"source_key": key, "source_etag": (etag or "").strip('"'), "source_version_id": version_id or ""}
+
+
+def _source_tag(source: dict) -> str:
+    return "|".join((source["source_key"], source["source_etag"], source["source_version_id"]))
+
+
+def _claim_source(table, index_id: str, source: dict, request_id: str = "") -> str | None:
+    """Claim an uploaded object for ingestion; return why it needs none, or None once claimed.
+
+    "unchanged": it is what the live COMPLETE generation was built from.
+    "in_progress": another invocation is already ingesting it (its claim,
+    ``pending_source`` on META, is cleared by the cutover's META put or by
+    ``_mark_error``, and ignored after ``CLAIM_TTL_SECONDS``).
+
+    The claim records the Lambda ``request_id``. Lambda retries a failed
+    asynchronous invocation (a timeout or crash that never released the
+    claim) with the same request id, so a retry takes over its own claim
+    instead of being skipped until it expires.
+    """
+    meta = table.get_item(Key={"pk": index_id, "sk": SK_META}).get("Item") or {}
+    if (meta.get("status") == "COMPLETE" and not meta.get("pending_generation")
+            and meta.get("source_etag") and _source_tag(meta) == _source_tag(source)):
+        return "unchanged"
+    now = datetime.now(timezone.utc)
+    stale = datetime.fromtimestamp(now.timestamp() - CLAIM_TTL_SECONDS, timezone.utc).isoformat()
+    condition = "attribute_not_exists(pending_source) OR pending_source <> :src OR pending_source_at < :stale"
+    values = {":src": _source_tag(source), ":now": now.isoformat(), ":stale": stale, ":req": request_id}
+    if request_id:
+        condition += " OR pending_source_request = :req"
+    try:
+        table.update_item(
+            Key={"pk": index_id, "sk": SK_META},
+            UpdateExpression="SET pending_source = :src, pending_source_at = :now, pending_source_request = :req",
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values,
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        return "in_progress"
+    return None
+
+
+def _begin_generation(table, index_id: str, started: str) -> tuple[int, dict]:
+    """Reserve the next generation number for an upload; return it with the previous META.
+
+    The counter is bumped with an atomic ``ADD``, so concurrent uploads never
+    share a partition. An index with a live (COMPLETE) generation keeps
+    serving it and only gains ``pending_generation``; any other index is
+    marked PROCESSING.
+    """
+    key = {"pk": index_id, "sk": SK_META}
+    previous = table.update_item(
+        Key=key,
+        UpdateExpression="ADD generation_counter :one",
+        ExpressionAttributeValues={":one": 1},
+        ReturnValues="ALL_OLD",
+    ).get("Attributes") or {}
+    generation = int(previous.get("generation_counter", 0)) + 1
+    if previous.get("status") == "COMPLETE":
+        table.update_item(
+            Key=key,
+            UpdateExpression="SET pending_generation = :g",
+            ExpressionAttributeValues={":g": generation},
+        )
+    else:
+        table.update_item(
+            Key=key,
+            UpdateExpression=(
+                "SET #s = :s, last_updated = :t, pending_generation = :g, "
+                "row_count = if_not_exists(row_count, :zero) REMOVE #e"
+            ),
+            ExpressionAttributeNames={"#s": "status", "#e": "error"},
+            ExpressionAttributeValues={":s": "PROCESSING", ":t": started, ":g": generation, ":zero": 0},
+        )
+    return generation, previous
+
+
+def _mark_error(table, index_id: str, error: str) -> None:
+    """Record a failed upload on the META item without touching the live generation.
+
+    Unlike ``_put_meta`` this updates in place, so ``data_pk`` and the
+    generation counter survive and the previous rows stay queryable.
+    """
+    table.update_item(
+        Key={"pk": index_id, "sk": SK_META},
+        UpdateExpression=(
+            "SET #s = :s, #e = :e, last_updated = :t, row_count = if_not_exists(row_count, :zero) "
+            "REMOVE pending_generation, pending_source, pending_source_at, pending_source_request"
+        ),
+        ExpressionAttributeNames={"#s": "status", "#e": "error"},
+        ExpressionAttributeValues={
+            ":s": "ERROR", ":e": error, ":t": datetime.now(timezone.utc).isoformat(), ":zero": 0,
+        },
+    )
+
+
+# META attributes describing an index's data, dropped when its file is deleted.
+_DATA_META_ATTRIBUTES = (
+    "data_pk", "generation", "pending_generation", "columns", "date_columns", "number_columns",
+    "column_stats", "value_counts", "stats_truncated", "snapshot_key", "sheets", "source_key",
+    "source_etag", "source_version_id", "pending_source", "pending_source_at", "pending_source_request",
+    "applying_generation", "applying_since", "error",
+)
+
+
+def _mark_no_data(table, index_id: str) -> None:
+    """Reset META to NO_DATA after the index's file was deleted.
+
+    An update rather than ``_put_meta``'s overwrite: ``generation_counter``
+    survives, so a re-upload gets a fresh generation number and a late
+    ``collect_generations`` for a deleted generation can't hit its rows.
+    """
+    names = {f"#a{i}": name for i, name in enumerate(_DATA_META_ATTRIBUTES)}
+    table.update_item(
+        Key={"pk": index_id, "sk": SK_META},
+        UpdateExpression="SET #s = :s, row_count = :zero, last_updated = :t REMOVE " + ", ".join(names),
+        ExpressionAttributeNames={"#s": "status", **names},
+        ExpressionAttributeValues={":s": "NO_DATA", ":zero": 0, ":t": datetime.now(timezone.utc).isoformat()},
+    )
+
+
+def _log_bulk_stats(label: str, stats: dict) -> None:
+    print(f"{label}: {stats['items']} items in {stats['batches']} batches, "
+          f"{stats['seconds']:.2f}s ({stats['items_per_second']:.0f} items/s, {stats['retries']} retries).")
 
 
 def _put_meta(table, index_id: str, row_count: int, last_updated: str,
-              error: str | None = None, status: str | None = None) -> None:
-    """Write or overwrite the META item for an index with current status info."""
+              error: str | None = None, status: str | None = None,
+              extra: dict | None = None, generation: int | None = None,
+              data_pk: str | None = None) -> bool:
+    """Write or overwrite the META item for an index with current status info.
+
+    ``extra`` attributes (column list, date columns, ...) are written in the
+    same ``put_item`` so readers never observe a COMPLETE item without them.
+
+    With ``generation`` this is the cutover: META points ``data_pk`` at that
+    generation (or at ``data_pk`` when an incremental upload updated the live
+    partition in place), and the put only succeeds while no newer upload has
+    reserved a generation. Returns False when it was superseded.
+    """
     item: dict = {"pk": index_id, "sk": SK_META, "row_count": row_count, "last_updated": last_updated}
     if status is not None:
         item["status"] = status
     if error is not None:
         item["error"] = error
-    table.put_item(Item=item)
+    if extra:
+        item.update(extra)
+    if generation is None:
+        table.put_item(Item=item)
+        return True
+    item.update(
+        data_pk=data_pk or _generation_pk(index_id, generation),
+        generation=generation,
+        generation_counter=generation,
+    )
+    try:
+        table.put_item(
+            Item=item,
+            ConditionExpression="generation_counter = :g",
+            ExpressionAttributeValues={":g": generation},
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def _publish_snapshot(index_id: str, version: str, col_names: list[str], spool_path: str,
+                      row_count: int, typed_columns: dict[str, str] | None = None) -> str | None:
+    """Upload the compressed row snapshot for an index; return its key, or None on failure.
+
+    Rows are replayed from the JSON-lines spool written during ingestion and
+    compressed to a file next to it, so neither side is held in memory.
+    ``typed_columns`` (column -> "date"/"number") get a canonical typed value
+    per row so the query engine compares ordinals/floats instead of parsing
+    strings. A failed upload is not fatal: the query Lambda simply falls back
+    to reading the DynamoDB partition when META carries no snapshot key.
+    """
+    key = snapshot_key(index_id)
+    out_path = spool_path + ".gz"
+    try:
+        with open(spool_path, encoding="utf-8") as spool, open(out_path, "wb") as out:
+            write_snapshot(out, version, col_names, (json.loads(line) for line in spool),
+                           row_count, typed_columns=typed_columns)
+        with open(out_path, "rb") as body:
+            S3.put_object(Bucket=BUCKET, Key=key, Body=body, ContentType="application/gzip")
+        print(f"Published snapshot for '{index_id}' ({os.path.getsize(out_path)} bytes) to s3://{BUCKET}/{key}.")
+        return key
+    except Exception as e:
+        print(f"Failed to publish snapshot for '{index_id}': {e}")
+        return None
+    finally:
+        if os.path.exists(out_path):
+            os.remove(out_path)
+
+
+def _delete_snapshot(index_id: str) -> None:
+    """Remove the published snapshot for an index (no-op if it never existed)."""
+    try:
+        S3.delete_object(Bucket=BUCKET, Key=snapshot_key(index_id))
+    except Exception as e:
+        print(f"Failed to delete snapshot for '{index_id}': {e}")
 
 
 def _serialize_value(v) -> str:
@@ -103,23 +496,728 @@ def _serialize_value(v) -> str:
     return str(v)
 
 
+def _iter_data_rows(rows, headers: list[str]):
+    """Yield a row dict per non-blank row of ``rows`` (raw value tuples after the header), lazily."""
+    for row in rows:
+        row_dict = row_dict_from_excel_row(headers, row)
+        if not row_dict or all(v == "" for v in row_dict.values()):
+            continue
+        yield row_dict
+
+
+def _row_key(row: dict, seen: dict[str, int]) -> str:
+    """Stable sort key for a serialized row: a hash of its contents.
+
+    Identical rows hash alike, so repeats get a ``#n`` suffix in order of
+    appearance (``seen`` counts them); the same rows therefore always yield
+    the same keys wherever they sit in the sheet, which is what lets a
+    re-upload be diffed by key.
+    """
+    digest = hashlib.blake2b(
+        json.dumps(row, sort_keys=True, separators=(",", ":")).encode("utf-8"), digest_size=10,
+    ).hexdigest()
+    n = seen.get(digest, 0)
+    seen[digest] = n + 1
+    return digest if n == 0 else f"{digest}#{n}"
+
+
+def _partition_positions(pk: str) -> dict[str, int]:
+    """Sort key -> ``_pos`` of every row item in partition ``pk`` (paginated).
+
+    Items without a position (written before positions existed) are left
+    out, so they count as removed and their rows as inserted.
+    """
+    positions: dict[str, int] = {}
+    paginator = DDB_CLIENT.get_paginator("query")
+    for page in paginator.paginate(
+        TableName=TABLE_NAME,
+        KeyConditionExpression="pk = :pk",
+        ExpressionAttributeValues={":pk": {"S": pk}},
+        ExpressionAttributeNames={"#p": ROW_POSITION},
+        ProjectionExpression="sk, #p",
+    ):
+        for item in page.get("Items", []):
+            if item["sk"]["S"] != SK_META and ROW_POSITION in item:
+                positions[item["sk"]["S"]] = int(item[ROW_POSITION]["N"])
+    return positions
+
+
+def _longest_increasing(values) -> list[int]:
+    """Indices of a longest strictly increasing subsequence of ``values`` (patience sorting)."""
+    tails: list[int] = []
+    tail_values: list[int] = []
+    prev = [-1] * len(values)
+    for i, v in enumerate(values):
+        j = bisect_left(tail_values, v)
+        if j:
+            prev[i] = tails[j - 1]
+        if j == len(tails):
+            tails.append(i)
+            tail_values.append(v)
+        else:
+            tails[j], tail_values[j] = i, v
+    out: list[int] = []
+    i = tails[-1] if tails else -1
+    while i >= 0:
+        out.append(i)
+        i = prev[i]
+    return out[::-1]
+
+
+def _fill_positions(row_count: int, anchors: list[tuple[int, int]]) -> dict[int, int] | None:
+    """Positions for every spool line that isn't an anchor, or None if they don't fit.
+
+    ``anchors`` are the ``(line, position)`` pairs of rows that keep their
+    items, ascending in both. Each run of other lines is spread evenly
+    between the positions of the anchors around it (lines after the last
+    anchor continue ``POSITION_GAP`` apart); None when a run has no room
+    left, and the sheet must be rewritten with fresh gaps.
+    """
+    out: dict[int, int] = {}
+    prev_line, prev_pos = -1, 0
+    for line, pos in [*anchors, (row_count, None)]:
+        run = line - prev_line - 1
+        if run:
+            step = POSITION_GAP if pos is None else (pos - prev_pos) // (run + 1)
+            if step < 1:
+                return None
+            for j in range(1, run + 1):
+                out[prev_line + j] = prev_pos + step * j
+        prev_line, prev_pos = line, pos
+    return out
+
+
+def _stream_rows(rows, col_names: list[str], spool, data_pk: str | None = None,
+                 base: dict[str, int] | None = None) -> dict:
+    """Spool ``rows`` as they arrive and collect what META needs.
+
+    Each row is serialized, keyed with ``_row_key``, appended to ``spool`` as
+    a JSON line for the snapshot (and any second pass), and fed to the column
+    statistics and the type-inference reservoir. With ``data_pk`` every row
+    is also written there straight away through a ``BulkWriter`` (25-item
+    batches sent in parallel, unprocessed items retried). With ``base``
+    (the live generation's key -> position) nothing is written; instead rows
+    whose key is missing from it are recorded as ``inserts`` (spool line ->
+    key), the others as ``kept`` (spool lines, their stored positions and
+    keys, in spool order), and ``base`` is left holding only the keys no
+    longer present.
+
+    Returns ``{"row_count", "sample_rows", "stats", "reservoir", "inserts", "kept"}``.
+    """
+    stats = ColumnStatsAccumulator(col_names)
+    reservoir = ReservoirSample(TYPE_SAMPLE_SIZE)
+    sample_rows: list[dict] = []
+    inserts: dict[int, str] = {}
+    kept: tuple[list[int], list[int], list[str]] = ([], [], [])
+    seen: dict[str, int] = {}
+    count = 0
+    writer = BulkWriter(DDB_CLIENT, TABLE_NAME, workers=BULK_WRITE_WORKERS) if data_pk else None
+    try:
+        for row in rows:
+            serialized = {k: _serialize_value(v) for k, v in row.items()}
+            sk = _row_key(serialized, seen)
+            if writer is not None:
+                writer.put({**serialized, "pk": data_pk, "sk": sk,
+                            ROW_POSITION: (count + 1) * POSITION_GAP})
+            elif base is not None:
+                pos = base.pop(sk, None)
+                if pos is None:
+                    inserts[count] = sk
+                else:
+                    kept[0].append(count)
+                    kept[1].append(pos)
+                    kept[2].append(sk)
+            spool.write(json.dumps(serialized) + "\n")
+            stats.add(row)
+            reservoir.add(row)
+            if len(sample_rows) < SAMPLE_ROWS:
+                sample_rows.append(row)
+            count += 1
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        _log_bulk_stats(f"Wrote '{data_pk}'", writer.stats)
+    return {"row_count": count, "sample_rows": sample_rows, "stats": stats,
+            "reservoir": reservoir, "inserts": inserts, "kept": kept}
+
+
+def _diff_writes(streamed: dict) -> tuple[dict[int, tuple[str, int]], dict[int, str]] | None:
+    """Items an in-place update must put: ``(spool line -> (key, position), moved)``.
+
+    Kept rows whose stored positions still increase in spool order stay as
+    they are (a longest increasing run of them); the other kept rows have
+    ``moved`` (spool line -> key) and are rewritten at a new position, like
+    the inserted rows. Returns None when the new positions don't fit
+    between the stored ones (see ``_fill_positions``).
+    """
+    lines, positions, keys = streamed["kept"]
+    anchored = _longest_increasing(positions)
+    anchored_set = set(anchored)
+    moved = {lines[i]: keys[i] for i in range(len(lines)) if i not in anchored_set}
+    filled = _fill_positions(streamed["row_count"], [(lines[i], positions[i]) for i in anchored])
+    if filled is None:
+        return None
+    keyed = {**streamed["inserts"], **moved}
+    return {line: (keyed[line], pos) for line, pos in filled.items()}, moved
+
+
+def _write_from_spool(spool_path: str, data_pk: str, only: dict[int, tuple[str, int]] | None = None,
+                      deletes: set[str] | None = None) -> None:
+    """Second pass: write spooled rows to ``data_pk``, then delete ``deletes`` keys.
+
+    ``only`` restricts the writes to those spool lines (line -> key and
+    position, from ``_diff_writes``); without it every row is written, keyed
+    exactly as the first pass keyed it and spaced ``POSITION_GAP`` apart.
+    """
+    seen: dict[str, int] = {}
+    with BulkWriter(DDB_CLIENT, TABLE_NAME, workers=BULK_WRITE_WORKERS) as writer, \
+            open(spool_path, encoding="utf-8") as spool:
+        for i, line in enumerate(spool):
+            if only is not None:
+                if i in only:
+                    sk, pos = only[i]
+                    writer.put({**json.loads(line), "pk": data_pk, "sk": sk, ROW_POSITION: pos})
+                continue
+            row = json.loads(line)
+            writer.put({**row, "pk": data_pk, "sk": _row_key(row, seen),
+                        ROW_POSITION: (i + 1) * POSITION_GAP})
+        for sk in deletes or ():
+            writer.delete({"pk": data_pk, "sk": sk})
+    _log_bulk_stats(f"Wrote '{data_pk}'", writer.stats)
+
+
+def _slice_key(index_id: str, generation: int, n: int) -> str:
+    """S3 key of the n-th row slice handed to a fan-out worker."""
+    return f"indexes/{index_id}/slices/g{generation}/{n:05d}.jsonl.gz"
+
+
+def _write_slice(index_id: str, data_pk: str, slice_key: str) -> int:
+    """Fan-out worker: write one slice of keyed rows to ``data_pk``; return the item count."""
+    if not data_pk.startswith(index_id + GENERATION_SEP):
+        raise ValueError(f"Slice target '{data_pk}' is not a generation of '{index_id}'")
+    body = S3.get_object(Bucket=BUCKET, Key=slice_key)["Body"]
+    with BulkWriter(DDB_CLIENT, TABLE_NAME, workers=BULK_WRITE_WORKERS) as writer, \
+            gzip.GzipFile(fileobj=body) as lines:
+        for line in lines:
+            entry = json.loads(line)
+            writer.put({**entry["row"], "pk": data_pk, "sk": entry["sk"]})
+    _log_bulk_stats(f"Wrote slice {slice_key} to '{data_pk}'", writer.stats)
+    return writer.stats["items"]
+
+
+def _run_slice(payload: dict) -> int:
+    """Hand one slice to a worker and wait for it; return the items it wrote.
+
+    In Lambda the worker is a synchronous invocation of this same function,
+    so slices write with the combined throughput of several containers.
+    Elsewhere (tests, local runs) the handler is simply called in-process.
+    """
+    function_name = os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+    if function_name:
+        resp = LAMBDA.invoke(FunctionName=function_name, InvocationType="RequestResponse",
+                             Payload=json.dumps(payload))
+        result = json.loads(resp["Payload"].read())
+        if resp.get("FunctionError"):
+            raise RuntimeError(f"Slice worker failed: {result}")
+    else:
+        result = lambda_handler(payload, None)
+    body = json.loads(result["body"])
+    if body.get("status") != "written":
+        raise RuntimeError(f"Slice worker failed: {body}")
+    return int(body["items"])
+
+
+def _fan_out(index_id: str, generation: int, data_pk: str, spool_path: str, tmp: str,
+             row_count: int) -> None:
+    """Write the spool to ``data_pk`` through parallel slice workers.
+
+    The spool is cut into gzipped slices of ``FANOUT_SLICE_ROWS`` rows, each
+    row carrying its ``_row_key`` and position (keys depend on the whole
+    sheet, so the coordinator assigns them). Every slice is uploaded to S3 and handed to a
+    worker as soon as it is cut, at most ``FANOUT_WORKERS`` at a time; the
+    call returns once all of them reported done, and raises if any failed or
+    the written total differs from ``row_count``. Slices are deleted after.
+    """
+    seen: dict[str, int] = {}
+    keys: list[str] = []
+    futures = []
+
+    def upload(path: str) -> None:
+        key = _slice_key(index_id, generation, len(keys))
+        S3.upload_file(path, BUCKET, key)
+        os.remove(path)
+        keys.append(key)
+        futures.append(pool.submit(
+            _run_slice, {"write_slice": {"index_id": index_id, "data_pk": data_pk, "slice_key": key}}))
+
+    path = os.path.join(tmp, "slice.jsonl.gz")
+    with ThreadPoolExecutor(max_workers=FANOUT_WORKERS) as pool:
+        try:
+            out = None
+            with open(spool_path, encoding="utf-8") as spool:
+                for i, line in enumerate(spool):
+                    if i % FANOUT_SLICE_ROWS == 0:
+                        if out is not None:
+                            out.close()
+                            upload(path)
+                        out = gzip.open(path, "wt", encoding="utf-8", compresslevel=1)
+                    row = json.loads(line)
+                    sk = _row_key(row, seen)
+                    row[ROW_POSITION] = (i + 1) * POSITION_GAP
+                    out.write(json.dumps({"sk": sk, "row": row}) + "\n")
+            if out is not None:
+                out.close()
+                upload(path)
+            written = sum(f.result() for f in futures)
+        finally:
+            for f in futures:
+                f.cancel()
+            for key in keys:
+                try:
+                    S3.delete_object(Bucket=BUCKET, Key=key)
+                except Exception as e:
+                    print(f"Failed to delete slice {key}: {e}")
+    if written != row_count:
+        raise RuntimeError(f"Fan-out wrote {written} of {row_count} rows to '{data_pk}'")
+    print(f"Fan-out wrote {written} rows to '{data_pk}' in {len(keys)} slices.")
+
+
+def _write_generation(index_id: str, generation: int, data_pk: str, spool_path: str, tmp: str,
+                      row_count: int) -> None:
+    """Write every spooled row to a new generation, fanning out for large sheets."""
+    if row_count >= FANOUT_MIN_ROWS:
+        _fan_out(index_id, generation, data_pk, spool_path, tmp, row_count)
+    else:
+        _write_from_spool(spool_path, data_pk)
+
+
+def _lock_partition(table, index_id: str, data_pk: str, generation: int) -> bool:
+    """Take the in-place update lock on the live partition ``data_pk``; return whether it was taken.
+
+    The lock (``applying_generation`` on META) is only granted while
+    ``data_pk`` is still live and no other upload holds it, so at most one
+    incremental upload edits a partition at a time; the others write a new
+    generation instead. It is released by the cutover's META put or by
+    ``_unlock_partition``, and ignored after ``CLAIM_TTL_SECONDS``.
+    """
+    now = datetime.now(timezone.utc)
+    stale = datetime.fromtimestamp(now.timestamp() - CLAIM_TTL_SECONDS, timezone.utc).isoformat()
+    try:
+        table.update_item(
+            Key={"pk": index_id, "sk": SK_META},
+            UpdateExpression="SET applying_generation = :g, applying_since = :now",
+            ConditionExpression=(
+                "data_pk = :pk AND (attribute_not_exists(applying_generation) OR applying_since < :stale)"
+            ),
+            ExpressionAttributeValues={":g": generation, ":pk": data_pk, ":now": now.isoformat(),
+                                       ":stale": stale},
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def _unlock_partition(table, index_id: str, generation: int) -> None:
+    """Release the in-place update lock if ``generation`` still holds it."""
+    try:
+        table.update_item(
+            Key={"pk": index_id, "sk": SK_META},
+            UpdateExpression="REMOVE applying_generation, applying_since",
+            ConditionExpression="applying_generation = :g",
+            ExpressionAttributeValues={":g": generation},
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+
+
+def _save_rows(pk: str, keys: set[str], path: str) -> None:
+    """Copy the items at ``keys`` of partition ``pk`` to a JSON-lines file, for ``_restore_rows``.
+
+    Items are kept in DynamoDB's typed JSON, fetched ``BATCH_GET_SIZE`` keys
+    at a time with unprocessed keys retried.
+    """
+    ordered = sorted(keys)
+    with open(path, "w", encoding="utf-8") as out:
+        for start in range(0, len(ordered), BATCH_GET_SIZE):
+            request = {TABLE_NAME: {"Keys": [{"pk": {"S": pk}, "sk": {"S": sk}}
+                                             for sk in ordered[start:start + BATCH_GET_SIZE]]}}
+            attempt = 0
+            while request:
+                resp = DDB_CLIENT.batch_get_item(RequestItems=request)
+                for item in resp.get("Responses", {}).get(TABLE_NAME, []):
+                    out.write(json.dumps(item) + "\n")
+                request = resp.get("UnprocessedKeys") or None
+                if request:
+                    attempt += 1
+                    time.sleep(min(0.05 * 2 ** attempt, 2.0))
+
+
+def _restore_rows(pk: str, inserted: dict[int, str], saved_path: str) -> None:
+    """Undo an in-place diff on ``pk``: delete the ``inserted`` keys and put back the saved rows."""
+    with BulkWriter(DDB_CLIENT, TABLE_NAME, workers=BULK_WRITE_WORKERS) as writer:
+        for sk in inserted.values():
+            writer.delete({"pk": pk, "sk": sk})
+        if os.path.exists(saved_path):
+            with open(saved_path, encoding="utf-8") as saved:
+                for line in saved:
+                    writer.put({k: _DESERIALIZER.deserialize(v) for k, v in json.loads(line).items()})
+    _log_bulk_stats(f"Restored '{pk}'", writer.stats)
+
+
+def _mark_processing(table, index_id: str, started: str) -> None:
+    """Flag META PROCESSING while the live partition is being changed in place.
+
+    The query Lambda only caches COMPLETE indexes, so no container can pin
+    a snapshot of the partition mid-update.
+    """
+    table.update_item(
+        Key={"pk": index_id, "sk": SK_META},
+        UpdateExpression="SET #s = :s, last_updated = :t",
+        ExpressionAttributeNames={"#s": "status"},
+        ExpressionAttributeValues={":s": "PROCESSING", ":t": started},
+    )
+
+
+def _header_names(cells) -> list[str]:
+    """Header row cells as stripped strings (None becomes empty)."""
+    return [str(h).strip() if h is not None else "" for h in cells]
+
+
+def _header_error(index_id: str, headers: list[str]) -> str | None:
+    non_empty = [h for h in headers if h]
+    if len(non_empty) < 2:
+        return f"Index '{index_id}' file has only {len(non_empty)} header column(s); expected at least 2."
+    return None
+
+
+def _count_lines(path: str) -> int:
+    """Newlines in a file, read in 1 MiB chunks (an upper bound on CSV records)."""
+    lines = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            lines += chunk.count(b"\n")
+    return lines
+
+
+def _sheet_slug(title: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", title.lower()).strip("_")
+
+
+def _sheet_plan(index_id: str, wb, primary_title: str) -> list[dict]:
+    """Sub-indexes for the workbook's non-active worksheets that have a header row.
+
+    Sheets with fewer than 2 header columns (notes, charts' data, blanks)
+    are skipped. Sheet names are slugged into the sub-index id, with a
+    numeric suffix when two names slug alike.
+    """
+    plan, used = [], set()
+    for n, ws in enumerate(wb.worksheets, start=1):
+        if ws.title == primary_title:
+            continue
+        headers = _header_names(next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ()))
+        if _header_error(index_id, headers):
+            print(f"Skipping sheet '{ws.title}' of '{index_id}': no header row.")
+            continue
+        slug = _sheet_slug(ws.title) or f"sheet{n}"
+        candidate, i = slug, 2
+        while candidate in used:
+            candidate, i = f"{slug}_{i}", i + 1
+        used.add(candidate)
+        plan.append({"sheet": ws.title, "index_id": f"{index_id}{SHEET_SEP}{candidate}"})
+    return plan
+
+
+def _drop_sheet_index(table, index_id: str) -> None:
+    """Drop a sub-index whose worksheet is gone: rows, snapshot and registry entry.
+
+    META is reset to NO_DATA (``_mark_no_data``) rather than deleted, so
+    ``generation_counter`` survives: if the sheet comes back, its first
+    generation can't collide with a dropped one still awaiting cleanup.
+    """
+    meta = table.get_item(Key={"pk": index_id, "sk": SK_META}).get("Item") or {}
+    for pk in _index_partitions(index_id, meta):
+        _clear_partition(pk)
+    _delete_snapshot(index_id)
+    _mark_no_data(table, index_id)
+    delete_from_registry(index_id)
+    print(f"Dropped sub-index '{index_id}'.")
+
+
+def _ingest_sheet(table, index_id: str, display_name: str, headers: list[str], rows, tmp: str,
+                  expected_rows: int = 0, meta_extra: dict | None = None) -> dict:
+    """Ingest one sheet's data ``rows`` (raw value tuples after the header) as an index.
+
+    ``tmp`` holds the row spool, ``expected_rows`` (the sheet's declared
+    size, 0 if unknown) decides up front whether the rows are streamed into
+    DynamoDB or spooled and fanned out, and ``meta_extra`` is stored on META.
+    Returns the response body.
+
+    Rows are keyed by content (``_row_key``). A first upload streams them
+    straight into a new generation. A re-upload over a COMPLETE generation
+    is first diffed against that generation's keys while spooling: if at
+    most ``INCREMENTAL_MAX_CHANGE_RATIO`` of the rows were inserted, removed
+    or moved (a changed row is an insert and a removal), only those are
+    written to and deleted from the live partition in place, inserted rows
+    taking positions between their neighbours' (``_diff_writes``);
+    otherwise the spool is written to a new generation as usual. The in-place path holds
+    the partition's lock (``_lock_partition``) and saves the rows it deletes
+    or moves first, so a failure or a superseded cutover restores the partition.
+    """
+    generation = None
+    locked = False
+    applied = None
+    try:
+        non_empty = [h for h in headers if h]
+        now_start = datetime.now(timezone.utc).isoformat()
+        generation, previous = _begin_generation(table, index_id, now_start)
+        data_pk = _generation_pk(index_id, generation)
+        base_pk = previous.get("data_pk") if previous.get("status") == "COMPLETE" else None
+        if base_pk and not _lock_partition(table, index_id, base_pk, generation):
+            print(f"'{base_pk}' is being updated in place by another upload; writing a new generation.")
+            base_pk = None
+        locked = base_pk is not None
+        saved_path = os.path.join(tmp, "removed.jsonl")
+        base_positions = _partition_positions(base_pk) if base_pk else None
+        base_count = len(base_positions) if base_positions is not None else 0
+
+        # Large sheets (by their declared size) are spooled first and fanned
+        # out, rather than written by this invocation while streaming.
+        stream_pk = None if base_pk or expected_rows >= FANOUT_MIN_ROWS else data_pk
+
+        col_names = [excel_column_to_field(h) for h in non_empty]
+        spool_path = os.path.join(tmp, "rows.jsonl")
+        with open(spool_path, "w", encoding="utf-8") as spool:
+            streamed = _stream_rows(_iter_data_rows(rows, headers), col_names, spool,
+                                    data_pk=stream_pk, base=base_positions)
+        row_count = streamed["row_count"]
+
+        mode = "full"
+        if base_pk:
+            inserted, deleted = len(streamed["inserts"]), len(base_positions)
+            ratio = (inserted + deleted) / max(row_count, base_count, 1)
+            diff = _diff_writes(streamed) if ratio <= INCREMENTAL_MAX_CHANGE_RATIO else None
+            moved = len(diff[1]) if diff else 0
+            ratio += moved / max(row_count, base_count, 1)
+            print(f"Diff for '{index_id}': {inserted} inserted, {deleted} removed, {moved} moved, "
+                  f"{row_count - inserted - moved} unchanged ({ratio:.1%} changed).")
+            if diff is None and ratio <= INCREMENTAL_MAX_CHANGE_RATIO:
+                print(f"No room left between the row positions of '{base_pk}'; rewriting it.")
+            if diff is not None and ratio <= INCREMENTAL_MAX_CHANGE_RATIO:
+                mode = "incremental"
+                writes, moved_keys = diff
+                _mark_processing(table, index_id, now_start)
+                _save_rows(base_pk, set(base_positions) | set(moved_keys.values()), saved_path)
+                applied = streamed["inserts"]
+                _write_from_spool(spool_path, base_pk, only=writes, deletes=set(base_positions))
+                data_pk = base_pk
+            else:
+                _unlock_partition(table, index_id, generation)
+                locked = False
+                _write_generation(index_id, generation, data_pk, spool_path, tmp, row_count)
+        elif stream_pk is None:
+            _write_generation(index_id, generation, data_pk, spool_path, tmp, row_count)
+
+        sample = streamed["reservoir"].items
+        date_cols = infer_date_columns(col_names, sample, sample_limit=len(sample))
+        number_cols = infer_number_columns(col_names, sample, exclude=date_cols, sample_limit=len(sample))
+
+        # COMPLETE is written only after every row is in place: the query
+        # Lambda caches snapshots keyed on (COMPLETE, last_updated), so
+        # flipping status earlier could pin a half-written partition.
+        now = datetime.now(timezone.utc).isoformat()
+        meta_extra = {
+            **(meta_extra or {}),
+            "columns": col_names,
+            "date_columns": date_cols,
+            "number_columns": number_cols,
+            **streamed["stats"].meta_stats(date_cols, number_cols),
+        }
+        typed_columns = {**{c: TYPE_DATE for c in date_cols}, **{c: TYPE_NUMBER for c in number_cols}}
+        snap_key = _publish_snapshot(index_id, now, col_names, spool_path, row_count, typed_columns)
+        if snap_key:
+            meta_extra["snapshot_key"] = snap_key
+        live = _put_meta(table, index_id, row_count, now, error=None, status="COMPLETE",
+                         extra=meta_extra, generation=generation, data_pk=data_pk)
+    except Exception:
+        if applied is not None:
+            try:
+                _restore_rows(base_pk, applied, saved_path)
+            except Exception as e:
+                print(f"Failed to restore '{base_pk}' after a failed in-place update: {e}")
+        if locked:
+            _unlock_partition(table, index_id, generation)
+        if generation is not None:
+            _collect_garbage(table, index_id, [_generation_pk(index_id, generation)])
+        raise
+
+    if not live:
+        print(f"Generation {generation} of '{index_id}' was superseded by a newer upload; discarding it.")
+        if applied is not None:
+            _restore_rows(base_pk, applied, saved_path)
+            _unlock_partition(table, index_id, generation)
+        _collect_garbage(table, index_id, [data_pk])
+        return {"status": "superseded", "index_id": index_id}
+    if mode == "full":
+        # Rows of an index ingested before generations live under the index id.
+        _collect_garbage(table, index_id, [previous.get("data_pk") or index_id])
+
+    if write_to_registry(index_id, display_name, col_names, row_count,
+                         sample_rows=streamed["sample_rows"], date_columns=date_cols,
+                         parent_index_id=meta_extra.get("parent_index")):
+        _queue_description(index_id, display_name, col_names, streamed["sample_rows"])
+    print(f"Parsed index '{index_id}': {row_count} rows, {len(col_names)} columns "
+          f"({mode}, generation {generation}).")
+    return {"status": "ok", "index_id": index_id, "row_count": row_count, "mode": mode}
+
+
+def _ingest_sub_sheet(index_id: str, display_name: str, path: str, sheet: dict, tmp: str) -> dict:
+    """Sheet-pool worker: ingest one worksheet of the workbook at ``path`` as its sub-index.
+
+    Opens its own read-only workbook and DynamoDB resource (neither is
+    thread-safe); ``tool_registry`` keeps a resource per thread for the
+    registry writes. A failure marks only the sub-index ERROR.
+    """
+    sub_id = sheet["index_id"]
+    table = boto3.session.Session().resource("dynamodb").Table(TABLE_NAME)
+    try:
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet["sheet"]]
+            rows = ws.iter_rows(values_only=True)
+            headers = _header_names(next(rows, ()))
+            result = _ingest_sheet(table, sub_id, f"{display_name} ({sheet['sheet']})", headers, rows,
+                                   tempfile.mkdtemp(dir=tmp), expected_rows=max((ws.max_row or 0) - 1, 0),
+                                   meta_extra={"parent_index": index_id, "sheet": sheet["sheet"]})
+        finally:
+            wb.close()
+    except Exception as e:
+        print(f"Parser error for sheet '{sheet['sheet']}' of '{index_id}': {e}")
+        _mark_error(table, sub_id, str(e))
+        result = {"status": "error", "message": str(e)}
+    return {"sheet": sheet["sheet"], "index_id": sub_id, **result}
+
+
+def _ingest_workbook(table, index_id: str, display_name: str, path: str, tmp: str,
+                     meta_extra: dict | None = None) -> dict:
+    """Ingest the active worksheet as the index and every other sheet as a sub-index.
+
+    The sub-indexes (``_sheet_plan``) are ingested on a pool of
+    ``SHEET_WORKERS`` threads while this thread ingests the active sheet, and
+    are recorded on the index's META (``sheets``, next to ``meta_extra``) so
+    deletes and later uploads can find them.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+        headers = _header_names(next(rows, ()))
+        err = _header_error(index_id, headers)
+        if err:
+            _mark_error(table, index_id, err)
+            return {"status": "error", "message": err}
+
+        plan = _sheet_plan(index_id, wb, ws.title)
+        with ThreadPoolExecutor(max_workers=max(SHEET_WORKERS, 1)) as pool:
+            futures = [pool.submit(_ingest_sub_sheet, index_id, display_name, path, sheet, tmp)
+                       for sheet in plan]
+            try:
+                result = _ingest_sheet(table, index_id, display_name, headers, rows, tmp,
+                                       expected_rows=max((ws.max_row or 0) - 1, 0),
+                                       meta_extra={**(meta_extra or {}), "sheets": plan})
+            finally:
+                sheets = [f.result() for f in futures]
+    finally:
+        wb.close()
+    if sheets:
+        result["sheets"] = sheets
+    return result
+
+
+def _ingest(table, bucket: str, key: str, index_id: str, display_name: str, tmp: str,
+            source: dict | None = None) -> dict:
+    """Ingest one uploaded file, using ``tmp`` for the download and the row spools.
+
+    CSV/TSV files are one sheet; workbooks go through ``_ingest_workbook``.
+    ``source`` (``_object_source``) is recorded on the index's META. Once
+    the index itself is live, sub-indexes of worksheets missing from this
+    upload are dropped.
+    """
+    ext = os.path.splitext(key)[1].lower()
+    path = os.path.join(tmp, "source" + ext)
+    S3.download_file(bucket, key, path)
+    previous = table.get_item(Key={"pk": index_id, "sk": SK_META}).get("Item") or {}
+
+    if ext in CSV_DELIMITERS:
+        with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+            rows = csv.reader(f, delimiter=CSV_DELIMITERS[ext])
+            headers = _header_names(next(rows, ()))
+            err = _header_error(index_id, headers)
+            if err:
+                _mark_error(table, index_id, err)
+                result = {"status": "error", "message": err}
+            else:
+                result = _ingest_sheet(table, index_id, display_name, headers, rows, tmp,
+                                       expected_rows=max(_count_lines(path) - 1, 0),
+                                       meta_extra={**(source or {}), "sheets": []})
+    else:
+        result = _ingest_workbook(table, index_id, display_name, path, tmp, meta_extra=source)
+
+    if result["status"] == "ok":
+        current = {s["index_id"] for s in result.get("sheets", [])}
+        for sheet in previous.get("sheets") or []:
+            if sheet["index_id"] not in current:
+                _drop_sheet_index(table, sheet["index_id"])
+    return {"statusCode": 200, "body": json.dumps(result)}
+
+
 def lambda_handler(event, context):
     """Process S3 event records for Excel index files.
 
     Handles both ObjectCreated and ObjectRemoved events. For each record:
-      - ObjectRemoved: clears the index data and deregisters the tool.
-      - ObjectCreated: downloads the .xlsx, parses it, writes rows to DynamoDB,
-        and registers the index in the tool registry (which triggers AI
-        description generation from column names and sample rows).
+      - ObjectRemoved: clears every generation of the index, drops its
+        sub-indexes and deregisters the tool -- unless the index was built
+        from a different object (META ``source_key``), e.g. a
+        ``latest.csv`` that replaced the deleted ``latest.xlsx``.
+      - ObjectCreated: unless the object was already ingested or is being
+        ingested (``_claim_source``), downloads the .xlsx/.csv/.tsv, parses it (one index
+        per worksheet), writes rows to DynamoDB, and registers the index in
+        the tool registry (queueing AI description generation from column
+        names and sample rows when the index has no description yet).
+
+    A ``collect_generations`` event (the asynchronous self-invocation made by
+    ``_collect_garbage``) deletes superseded generation partitions instead,
+    a ``write_slice`` event (a fan-out worker, see ``_fan_out``) writes
+    one slice of rows; its errors propagate so the coordinator sees them.
+    A ``describe_index`` event (see ``_queue_description``) generates and
+    publishes an index's AI description.
 
     Returns a 200 response with status details for the last processed record.
     """
     table = DDB.Table(TABLE_NAME)
+    work = event.get("write_slice")
+    if work:
+        items = _write_slice(work["index_id"], work["data_pk"], work["slice_key"])
+        return {"statusCode": 200, "body": json.dumps({"status": "written", "items": items})}
+    describe = event.get("describe_index")
+    if describe:
+        description = describe_index(describe["index_id"], describe["display_name"],
+                                     describe["columns"], describe.get("sample_rows") or [])
+        return {"statusCode": 200, "body": json.dumps(
+            {"status": "described" if description else "fallback", "index_id": describe["index_id"]})}
+    gc = event.get("collect_generations")
+    if gc:
+        _clear_generations(table, gc["index_id"], gc.get("partitions") or [])
+        return {"statusCode": 200, "body": json.dumps({"status": "collected", "index_id": gc["index_id"]})}
+
     for record in event.get("Records", []):
         event_name = record.get("eventName", "")
         bucket = record["s3"]["bucket"]["name"]
         key = record["s3"]["object"]["key"]
-        if not key.lower().endswith(".xlsx"):
+        if not key.lower().endswith(SUPPORTED_EXTENSIONS):
             continue
 
         index_id = _extract_index_id(key)
@@ -130,70 +1228,34 @@ def lambda_handler(event, context):
         display_name = _index_id_to_display_name(index_id)
 
         if "ObjectRemoved" in event_name:
+            meta = table.get_item(Key={"pk": index_id, "sk": SK_META}).get("Item") or {}
+            if meta.get("source_key") and meta["source_key"] != key:
+                # e.g. a stale latest.xlsx removed after latest.csv replaced it
+                print(f"Ignoring delete of {key}: index '{index_id}' was built from {meta['source_key']}.")
+                continue
             print(f"Delete event for {key}; clearing index '{index_id}' and registry.")
-            _clear_index(table, index_id)
-            _put_meta(table, index_id, 0, datetime.now(timezone.utc).isoformat(), status="NO_DATA")
+            for pk in _index_partitions(index_id, meta):
+                _clear_partition(pk)
+            for sheet in meta.get("sheets") or []:
+                _drop_sheet_index(table, sheet["index_id"])
+            _delete_snapshot(index_id)
+            _mark_no_data(table, index_id)
             delete_from_registry(index_id)
             return {"statusCode": 200, "body": json.dumps({"status": "deleted", "index_id": index_id})}
 
         try:
-            obj = S3.get_object(Bucket=bucket, Key=key)
-            body = obj["Body"].read()
-            wb = load_workbook(io.BytesIO(body), read_only=True, data_only=True)
-            ws = wb.active
-            headers = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-            headers = [str(h).strip() if h is not None else "" for h in headers]
-
-            non_empty = [h for h in headers if h]
-            if len(non_empty) < 2:
-                err = f"Index '{index_id}' file has only {len(non_empty)} header column(s); expected at least 2."
-                _put_meta(table, index_id, 0, datetime.now(timezone.utc).isoformat(), error=err, status="ERROR")
-                wb.close()
-                return {"statusCode": 200, "body": json.dumps({"status": "error", "message": err})}
-
-            now_start = datetime.now(timezone.utc).isoformat()
-            _put_meta(table, index_id, 0, now_start, error=None, status="PROCESSING")
-
-            col_names = [excel_column_to_field(h) for h in non_empty]
-            rows_out = []
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                row_dict = row_dict_from_excel_row(headers, row)
-                if not row_dict or all(v == "" for v in row_dict.values()):
-                    continue
-                rows_out.append(row_dict)
-
-            wb.close()
-            _clear_index(table, index_id)
-
-            date_cols = infer_date_columns(col_names, rows_out)
-
-            now = datetime.now(timezone.utc).isoformat()
-            _put_meta(table, index_id, len(rows_out), now, error=None, status="COMPLETE")
-
-            table.update_item(
-                Key={"pk": index_id, "sk": SK_META},
-                UpdateExpression="SET #col = :c, #dc = :d",
-                ExpressionAttributeNames={"#col": "columns", "#dc": "date_columns"},
-                ExpressionAttributeValues={":c": col_names, ":d": date_cols},
-            )
-
-            for offset in range(0, len(rows_out), BATCH_SIZE):
-                chunk = rows_out[offset : offset + BATCH_SIZE]
-                with table.batch_writer() as writer:
-                    for j, row in enumerate(chunk):
-                        item = {"pk": index_id, "sk": str(offset + j)}
-                        for k, v in row.items():
-                            item[k] = _serialize_value(v)
-                        writer.put_item(Item=item)
-
-            write_to_registry(index_id, display_name, col_names, len(rows_out), sample_rows=rows_out[:5], date_columns=date_cols)
-            print(f"Parsed index '{index_id}': {len(rows_out)} rows, {len(col_names)} columns.")
-            return {"statusCode": 200, "body": json.dumps({"status": "ok", "index_id": index_id, "row_count": len(rows_out)})}
-
+            source = _object_source(bucket, key, record["s3"]["object"])
+            skipped = _claim_source(table, index_id, source, getattr(context, "aws_request_id", "") or "")
+            if skipped:
+                print(f"Skipping {key} (ETag {source['source_etag']}) for index '{index_id}': {skipped}.")
+                return {"statusCode": 200, "body": json.dumps(
+                    {"status": "skipped", "reason": skipped, "index_id": index_id})}
+            with tempfile.TemporaryDirectory() as tmp:
+                return _ingest(table, bucket, key, index_id, display_name, tmp, source=source)
         except Exception as e:
             print(f"Parser error for index '{index_id}': {e}")
             try:
-                _put_meta(table, index_id, 0, datetime.now(timezone.utc).isoformat(), error=str(e), status="ERROR")
+                _mark_error(table, index_id, str(e))
             except Exception as meta_err:
                 print(f"Failed to write meta error: {meta_err}")
             return {"statusCode": 200, "body": json.dumps({"status": "error", "message": str(e)})}
@@ -3,13 +3,22 @@ Models for Excel Index rows.
 Schema-flexible: stores all columns from the uploaded spreadsheet.
 Column names are normalized (spaces/slashes/dashes -> underscores).
 """
+import hashlib
+import heapq
+import random
 import re
+from collections import Counter
 from datetime import date, datetime
+from decimal import Decimal
 from typing import Any
 
 from abe_utils.dates import parse_date_like
+from abe_utils.excel_snapshot import parse_number_like
 
 _MULTI_WS = re.compile(r"\s+")
+# Bytes the column statistics and value counts may take in META together,
+# leaving the rest of DynamoDB's 400 KB item limit to the other attributes.
+STATS_MAX_BYTES = 256 * 1024
 
 
 def _to_str(v: Any) -> str:
@@ -62,3 +71,323 @@ def infer_date_columns(col_names: list[str], rows: list[dict], sample_limit: int
         if non_empty >= 3 and parsed >= 0.8 * non_empty:
             date_cols.append(col)
     return date_cols
+
+
+def infer_number_columns(
+    col_names: list[str],
+    rows: list[dict],
+    exclude: list[str] | None = None,
+    sample_limit: int = 200,
+) -> list[str]:
+    """Infer which columns hold numbers, using the same thresholds as dates.
+
+    A column qualifies when, over the first ``sample_limit`` rows, it has at
+    least 3 non-empty values and at least 80% of them parse as finite floats.
+    Columns in ``exclude`` (the inferred date columns) are skipped so a column
+    is typed at most once.
+    """
+    skip = set(exclude or [])
+    sample = rows[:sample_limit]
+    number_cols: list[str] = []
+    for col in col_names:
+        if col in skip:
+            continue
+        non_empty = 0
+        parsed = 0
+        for row in sample:
+            val = str(row.get(col) or "").strip()
+            if not val:
+                continue
+            non_empty += 1
+            if parse_number_like(val) is not None:
+                parsed += 1
+        if non_empty >= 3 and parsed >= 0.8 * non_empty:
+            number_cols.append(col)
+    return number_cols
+
+
+class ReservoirSample:
+    """Uniform random sample of at most ``size`` items from a stream (Algorithm R).
+
+    Lets type inference look at rows from the whole sheet, not just its top,
+    without holding the sheet in memory. Seeded, so a given file always
+    infers the same column types.
+    """
+
+    def __init__(self, size: int = 1000, seed: int = 0):
+        self.size = size
+        self.seen = 0
+        self.items: list = []
+        self._rng = random.Random(seed)
+
+    def add(self, item: Any) -> None:
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        j = self._rng.randrange(self.seen)
+        if j < self.size:
+            self.items[j] = item
+
+
+class DistinctSketch:
+    """Fixed-size estimate of the number of distinct strings in a stream (k minimum values).
+
+    Keeps the ``size`` smallest 64-bit hashes seen; with ``n`` distinct
+    values they are spread evenly over the hash range, so the largest kept
+    one tells ``n`` within a few percent (about ``1/sqrt(size)``). Exact
+    while fewer than ``size`` distinct values were seen. Hashes are blake2b
+    (not the per-process salted ``hash``), so a given file always gets the
+    same estimate.
+    """
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self._heap: list[int] = []  # negated, so heap[0] is the largest kept hash
+        self._kept: set[int] = set()
+
+    def add(self, value: str) -> None:
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        if h in self._kept:
+            return
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, -h)
+            self._kept.add(h)
+        elif h < -self._heap[0]:
+            self._kept.discard(-heapq.heapreplace(self._heap, -h))
+            self._kept.add(h)
+
+    def estimate(self) -> int:
+        if len(self._heap) < self.size:
+            return len(self._heap)
+        return round((self.size - 1) / ((-self._heap[0] + 1) / 2 ** 64))
+
+
+class ColumnStatsAccumulator:
+    """Streaming per-column value counts behind ``compute_column_stats`` / ``compute_value_counts``.
+
+    Rows are fed one at a time with ``add``. Each column counts at most
+    ``max_tracked`` distinct values exactly -- enough for the value counts
+    and top values META stores -- so memory stays bounded on huge sheets.
+    Past that the column overflows: its counts continue as a Misra-Gries
+    summary (a new value when full decrements every count and is dropped,
+    so frequent values stay, with counts low by at most rows /
+    ``max_tracked``), and its ``cardinality`` is estimated by a
+    ``DistinctSketch`` (``cardinality_exact`` False). An overflowed column
+    never qualifies for value counts.
+    """
+
+    def __init__(self, col_names: list[str], max_tracked: int = 500, sketch_size: int = 1024):
+        self.col_names = col_names
+        self.max_tracked = max_tracked
+        self.sketch_size = sketch_size
+        self.rows = 0
+        self._counts: dict[str, Counter] = {c: Counter() for c in col_names}
+        self._blanks: dict[str, int] = {c: 0 for c in col_names}
+        self._sketches: dict[str, DistinctSketch] = {}
+
+    def add(self, row: dict) -> None:
+        self.rows += 1
+        for col in self.col_names:
+            val = str(row.get(col) or "").strip()
+            if not val:
+                self._blanks[col] += 1
+                continue
+            counts = self._counts[col]
+            sketch = self._sketches.get(col)
+            if sketch is not None:
+                sketch.add(val)
+            if val in counts or len(counts) < self.max_tracked:
+                counts[val] += 1
+                continue
+            if sketch is None:
+                # Until now every distinct value was tracked.
+                sketch = self._sketches[col] = DistinctSketch(self.sketch_size)
+                for seen in counts:
+                    sketch.add(seen)
+                sketch.add(val)
+            for seen in list(counts):
+                if counts[seen] == 1:
+                    del counts[seen]
+                else:
+                    counts[seen] -= 1
+
+    def column_stats(
+        self,
+        date_cols: list[str] | None = None,
+        number_cols: list[str] | None = None,
+        top_n: int = 20,
+        max_value_len: int = 256,
+    ) -> dict[str, dict]:
+        """See ``compute_column_stats``."""
+        dates = set(date_cols or [])
+        numbers = set(number_cols or [])
+        n = self.rows
+        stats: dict[str, dict] = {}
+        for col in self.col_names:
+            counts = self._counts[col]
+            blanks = self._blanks[col]
+            if not counts:
+                kind = "empty"
+            elif col in dates:
+                kind = "date"
+            elif col in numbers:
+                kind = "number"
+            else:
+                kind = "text"
+            sketch = self._sketches.get(col)
+            stats[col] = {
+                "type": kind,
+                "cardinality": len(counts) if sketch is None else sketch.estimate(),
+                "cardinality_exact": sketch is None,
+                "null_count": blanks,
+                "null_rate": Decimal(str(round(blanks / n, 4))) if n else Decimal(0),
+                "top_values": [
+                    [val, cnt] for val, cnt in counts.most_common(top_n) if len(val) <= max_value_len
+                ],
+            }
+        return stats
+
+    def value_counts(
+        self,
+        max_distinct: int = 200,
+        max_value_len: int = 256,
+        max_bytes: int = 128 * 1024,
+    ) -> dict[str, list[list]]:
+        """See ``compute_value_counts``."""
+        out: dict[str, list[list]] = {}
+        budget = max_bytes
+        for col in self.col_names:
+            counts = self._counts[col]
+            if (not counts or col in self._sketches or len(counts) > max_distinct
+                    or any(len(v) > max_value_len for v in counts)):
+                continue
+            size = sum(len(v.encode("utf-8")) + 8 for v in counts)
+            if size > budget:
+                continue
+            budget -= size
+            out[col] = [[val, counts[val]] for val in sorted(counts)]
+        return out
+
+    def meta_stats(
+        self,
+        date_cols: list[str] | None = None,
+        number_cols: list[str] | None = None,
+        max_bytes: int = STATS_MAX_BYTES,
+    ) -> dict:
+        """``column_stats`` and ``value_counts`` for META, within ``max_bytes`` together.
+
+        The per-column basics (type, cardinality, nulls) are always kept.
+        Value counts may take up to half of the budget left after them,
+        whole columns in order; the top values share what remains evenly
+        across columns (a column needing less passes its share on), each
+        list cut to the pairs that fit. ``stats_truncated`` is True when
+        anything was left out to fit; consumers already treat shortened
+        ``top_values`` as incomplete (fewer entries than ``cardinality``).
+
+        Returns ``{"column_stats", "value_counts", "stats_truncated"}``.
+        """
+        stats = self.column_stats(date_cols, number_cols)
+        tops = {col: s.pop("top_values") for col, s in stats.items()}
+        for s in stats.values():
+            s["top_values"] = []
+        remaining = max_bytes - _item_bytes({"column_stats": stats, "value_counts": {}})
+        truncated = remaining < 0
+
+        counts: dict[str, list[list]] = {}
+        counts_budget = remaining // 2
+        for col, pairs in self.value_counts(max_bytes=max(max_bytes, 0)).items():
+            size = 3 + _item_bytes(col) + _item_bytes(pairs)
+            if size > counts_budget:
+                truncated = True
+                continue
+            counts[col] = pairs
+            counts_budget -= size
+            remaining -= size
+
+        cols = [col for col in stats if tops[col]]
+        for k, col in enumerate(cols):
+            share = remaining // (len(cols) - k)
+            used = 0
+            for pair in tops[col]:
+                size = 3 + _item_bytes(pair)
+                if used + size > share:
+                    truncated = True
+                    break
+                stats[col]["top_values"].append(pair)
+                used += size
+            remaining -= used
+        return {"column_stats": stats, "value_counts": counts, "stats_truncated": truncated}
+
+
+def _item_bytes(value: Any) -> int:
+    """Upper bound of ``value``'s size as a DynamoDB attribute value.
+
+    UTF-8 strings, 21 bytes per number and 3 bytes per list, map and
+    element, so what fits this estimate fits the item.
+    """
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bool, type(None))):
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        return 21
+    if isinstance(value, dict):
+        return 3 + sum(3 + _item_bytes(k) + _item_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(3 + _item_bytes(v) for v in value)
+    return len(str(value).encode("utf-8"))
+
+
+def _accumulate(col_names: list[str], rows: list[dict]) -> ColumnStatsAccumulator:
+    acc = ColumnStatsAccumulator(col_names)
+    for row in rows:
+        acc.add(row)
+    return acc
+
+
+def compute_column_stats(
+    col_names: list[str],
+    rows: list[dict],
+    date_cols: list[str] | None = None,
+    number_cols: list[str] | None = None,
+    top_n: int = 20,
+    max_value_len: int = 256,
+) -> dict[str, dict]:
+    """Per-column statistics over every row, stored in the META item.
+
+    For each column: ``type`` ("date", "number", "text", or "empty" when no
+    row has a value), ``cardinality`` (distinct non-blank values, compared
+    after stripping; ``cardinality_exact`` is False when the column had too
+    many to track and it is an estimate, see ``ColumnStatsAccumulator``),
+    ``null_count`` / ``null_rate`` (blank or missing cells) and ``top_values`` -- up to
+    ``top_n`` ``[value, count]`` pairs, most frequent first. Values longer
+    than ``max_value_len`` are left out of ``top_values`` to keep the item
+    small, so ``top_values`` lists every value of the column exactly when its
+    length equals ``cardinality``.
+
+    ``null_rate`` is a ``Decimal`` because DynamoDB rejects floats.
+    """
+    return _accumulate(col_names, rows).column_stats(date_cols, number_cols, top_n, max_value_len)
+
+
+def compute_value_counts(
+    col_names: list[str],
+    rows: list[dict],
+    max_distinct: int = 200,
+    max_value_len: int = 256,
+    max_bytes: int = 128 * 1024,
+) -> dict[str, list[list]]:
+    """Complete ``[value, count]`` lists for low-cardinality columns, stored in META.
+
+    A column qualifies when it has between 1 and ``max_distinct`` distinct
+    non-blank values (compared after stripping) and none is longer than
+    ``max_value_len``. Each list is sorted by value and covers every
+    non-blank cell, so unfiltered ``group_by`` / ``distinct_values`` /
+    ``count_unique`` queries on the column can be answered from it alone
+    (blank cells are ``row_count`` minus the listed counts).
+
+    Columns are added in order until their encoded size would exceed
+    ``max_bytes``, keeping the META item well under DynamoDB's 400 KB limit.
+    """
+    return _accumulate(col_names, rows).value_counts(max_distinct, max_value_len, max_bytes)
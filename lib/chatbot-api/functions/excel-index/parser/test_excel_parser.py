@@ -9,18 +9,25 @@ Covers:
 - Error handling (bad file, missing/insufficient columns, DynamoDB errors)
 - META/SK record creation and PROCESSING → COMPLETE lifecycle
 - Delete event handling
-- _clear_index, _put_meta, _serialize_value, helper functions
+- Idempotent handling of duplicate/unchanged S3 events (ETag, VersionId)
+- Generations: cutover, superseded uploads, failures, garbage collection
+- CSV/TSV uploads and per-worksheet sub-indexes
+- _clear_partition, _put_meta, _serialize_value, helper functions
+- BulkWriter batching, retries of unprocessed items and throttling
 - tool_registry calls (write_to_registry, delete_from_registry)
+- Fallback, asynchronous and schema-cached index descriptions
 
 Uses moto for AWS mocking (S3 + DynamoDB), openpyxl to create in-memory
 Excel bytes for test fixtures. Matches the testing patterns in test_excel_query.py.
 """
+import gzip
 import importlib.util
 import io
 import json
 import os
 import sys
-from datetime import date, datetime
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 import boto3
@@ -66,6 +73,21 @@ def _make_xlsx(headers: list[str], rows: list[list]) -> bytes:
     return buf.getvalue()
 
 
+def _make_workbook(sheets: dict[str, tuple[list[str], list[list]]]) -> bytes:
+    """Build a workbook with one worksheet per entry (first is active); return raw bytes."""
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, (headers, rows) in sheets.items():
+        ws = wb.create_sheet(title)
+        ws.append(headers)
+        for row in rows:
+            ws.append(row)
+    wb.active = 0
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
 def _simple_xlsx(num_rows: int = 3) -> bytes:
     """Standard two-column sheet used by many tests."""
     return _make_xlsx(
@@ -128,6 +150,15 @@ def _load_models():
     return mod
 
 
+def _load_bulk_writer():
+    spec = importlib.util.spec_from_file_location(
+        "excel_parser_bulk_writer", os.path.join(_PARSER_DIR, "bulk_writer.py")
+    )
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
 def _load_lf():
     """Load lambda_function.py by absolute path, ensuring local modules are importable."""
     if _PARSER_DIR not in sys.path:
@@ -151,14 +182,18 @@ def _make_s3_event(
     key: str = KEY,
     bucket: str = BUCKET,
     event_name: str = "ObjectCreated:Put",
+    etag: str | None = None,
 ) -> dict:
+    obj = {"key": key}
+    if etag is not None:
+        obj["eTag"] = etag
     return {
         "Records": [
             {
                 "eventName": event_name,
                 "s3": {
                     "bucket": {"name": bucket},
-                    "object": {"key": key},
+                    "object": obj,
                 },
             }
         ]
@@ -197,6 +232,26 @@ def _upload(s3, xlsx_bytes: bytes, key: str = KEY) -> None:
     s3.put_object(Bucket=BUCKET, Key=key, Body=xlsx_bytes)
 
 
+def _index_items(dynamodb) -> list[dict]:
+    """The index's META item plus every row of the generation it points at."""
+    table = dynamodb.Table(TABLE)
+    meta = table.get_item(Key={"pk": INDEX_ID, "sk": "META"}).get("Item")
+    if not meta:
+        return []
+    rows = []
+    if meta.get("data_pk"):
+        rows = table.query(
+            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(meta["data_pk"])
+        )["Items"]
+    return [meta] + rows
+
+
+def _all_partitions(dynamodb) -> set[str]:
+    """Every pk in the table belonging to the test index (any generation)."""
+    items = dynamodb.Table(TABLE).scan()["Items"]
+    return {i["pk"] for i in items if i["pk"] == INDEX_ID or i["pk"].startswith(INDEX_ID + "#")}
+
+
 # ---------------------------------------------------------------------------
 # _extract_index_id
 # ---------------------------------------------------------------------------
@@ -356,6 +411,167 @@ class TestInferDateColumns:
         assert models.infer_date_columns(["D"], rows, sample_limit=5) == ["D"]
 
 
+class TestInferNumberColumns:
+    def test_numeric_column_qualifies(self):
+        models = _load_models()
+        rows = [{"Amount": v} for v in ["100", "250", "37.5", "-9"]]
+        assert models.infer_number_columns(["Amount"], rows) == ["Amount"]
+
+    def test_text_column_does_not_qualify(self):
+        models = _load_models()
+        rows = [{"Vendor": v} for v in ["Acme", "Beta", "7", "Gamma"]]
+        assert models.infer_number_columns(["Vendor"], rows) == []
+
+    def test_excluded_columns_are_skipped(self):
+        models = _load_models()
+        rows = [{"Year": v} for v in ["2021", "2022", "2023"]]
+        assert models.infer_number_columns(["Year"], rows, exclude=["Year"]) == []
+
+
+class TestComputeColumnStats:
+    def test_counts_cardinality_nulls_and_top_values(self):
+        models = _load_models()
+        rows = [{"State": "CA"}, {"State": " CA "}, {"State": "NV"}, {"State": ""}, {}]
+        stats = models.compute_column_stats(["State"], rows)["State"]
+        assert stats["type"] == "text"
+        assert stats["cardinality"] == 2
+        assert stats["null_count"] == 2
+        assert float(stats["null_rate"]) == 0.4
+        assert stats["top_values"] == [["CA", 2], ["NV", 1]]
+
+    def test_types_follow_inferred_columns(self):
+        models = _load_models()
+        rows = [{"D": "2024-01-01", "N": "1", "E": ""}]
+        stats = models.compute_column_stats(["D", "N", "E"], rows, ["D"], ["N"])
+        assert [stats[c]["type"] for c in ("D", "N", "E")] == ["date", "number", "empty"]
+
+    def test_top_values_capped_and_long_values_skipped(self):
+        models = _load_models()
+        rows = [{"C": f"v{i}"} for i in range(30)] + [{"C": "x" * 300}]
+        stats = models.compute_column_stats(["C"], rows, top_n=40)["C"]
+        assert stats["cardinality"] == 31
+        assert len(stats["top_values"]) == 30
+        assert len(models.compute_column_stats(["C"], rows)["C"]["top_values"]) == 20
+
+
+class TestComputeValueCounts:
+    def test_low_cardinality_columns_get_complete_sorted_counts(self):
+        models = _load_models()
+        rows = [{"State": "NV", "Id": "1"}, {"State": " CA ", "Id": "2"}, {"State": "CA", "Id": "3"}, {}]
+        out = models.compute_value_counts(["State", "Id"], rows, max_distinct=2)
+        assert out == {"State": [["CA", 2], ["NV", 1]]}
+
+    def test_skips_empty_long_and_oversized_columns(self):
+        models = _load_models()
+        rows = [{"E": "", "L": "x" * 300, "A": "aaaa", "B": "bbbb"}]
+        assert models.compute_value_counts(["E", "L"], rows) == {}
+        assert list(models.compute_value_counts(["A", "B"], rows, max_bytes=12)) == ["A"]
+
+    def test_meta_stats_share_one_byte_budget(self):
+        models = _load_models()
+        acc = models.ColumnStatsAccumulator(["A", "B", "C"])
+        for r in range(30):
+            acc.add({"A": f"a{r}" * 20, "B": f"b{r % 3}", "C": f"c{r}" * 20})
+        roomy = acc.meta_stats(max_bytes=1 << 20)
+        assert roomy["stats_truncated"] is False and list(roomy["value_counts"]) == ["A", "B", "C"]
+        assert all(len(s["top_values"]) == 20 or c == "B" for c, s in roomy["column_stats"].items())
+
+        tight = acc.meta_stats(max_bytes=4000)
+        assert tight["stats_truncated"] is True
+        assert models._item_bytes({k: tight[k] for k in ("column_stats", "value_counts")}) <= 4000
+        # Every column keeps its basics and a share of top values
+        assert all(s["cardinality"] and s["top_values"] for s in tight["column_stats"].values())
+
+
+class TestStreamingHelpers:
+    def test_reservoir_keeps_everything_until_full(self):
+        models = _load_models()
+        sample = models.ReservoirSample(size=5)
+        for i in range(3):
+            sample.add(i)
+        assert sample.items == [0, 1, 2]
+
+    def test_reservoir_is_bounded_and_draws_from_whole_stream(self):
+        models = _load_models()
+        sample = models.ReservoirSample(size=100, seed=1)
+        for i in range(10_000):
+            sample.add(i)
+        assert len(sample.items) == 100
+        assert sample.seen == 10_000
+        assert max(sample.items) > 5_000
+
+    def test_accumulator_overflow_marks_cardinality_inexact(self):
+        models = _load_models()
+        acc = models.ColumnStatsAccumulator(["Id", "State"], max_tracked=10)
+        for i in range(50):
+            acc.add({"Id": str(i), "State": "CA" if i % 2 else "NV"})
+        stats = acc.column_stats()
+        assert stats["Id"]["cardinality"] == 50  # the sketch is exact below its size
+        assert stats["Id"]["cardinality_exact"] is False
+        assert stats["State"]["cardinality_exact"] is True
+        assert list(acc.value_counts()) == ["State"]
+
+    def test_accumulator_memory_is_bounded_on_high_cardinality_columns(self):
+        models = _load_models()
+        acc = models.ColumnStatsAccumulator(["Id", "Vendor"], max_tracked=100, sketch_size=256)
+        for i in range(20_000):
+            # "Late Co" only shows up after the Id column has long overflowed
+            acc.add({"Id": f"ID-{i}", "Vendor": "Late Co" if i >= 15_000 and i % 3 else f"V{i}"})
+        assert all(len(acc._counts[c]) <= 100 for c in ("Id", "Vendor"))
+        stats = acc.column_stats()
+        assert stats["Id"]["cardinality_exact"] is False
+        assert abs(stats["Id"]["cardinality"] - 20_000) < 0.2 * 20_000
+        assert stats["Vendor"]["top_values"][0][0] == "Late Co"
+
+
+class TestBulkWriter:
+    def _client(self, responses):
+        client = MagicMock()
+        client.batch_write_item.side_effect = responses
+        return client
+
+    def test_batches_of_25_and_stats(self):
+        bw = _load_bulk_writer()
+        client = self._client(lambda **kw: {})
+        with bw.BulkWriter(client, TABLE, workers=4) as writer:
+            for i in range(60):
+                writer.put({"pk": "p", "sk": str(i)})
+        sizes = sorted(len(c.kwargs["RequestItems"][TABLE]) for c in client.batch_write_item.call_args_list)
+        assert sizes == [10, 25, 25]
+        assert writer.stats["items"] == 60 and writer.stats["batches"] == 3
+        first = client.batch_write_item.call_args_list[0].kwargs["RequestItems"][TABLE][0]
+        assert first["PutRequest"]["Item"]["pk"] == {"S": "p"}
+
+    def test_unprocessed_items_are_retried(self):
+        bw = _load_bulk_writer()
+        leftover = [{"DeleteRequest": {"Key": {"pk": {"S": "p"}, "sk": {"S": "1"}}}}]
+        client = self._client([{"UnprocessedItems": {TABLE: leftover}}, {}])
+        with bw.BulkWriter(client, TABLE, base_delay=0) as writer:
+            writer.delete({"pk": "p", "sk": "0"})
+            writer.delete({"pk": "p", "sk": "1"})
+        assert client.batch_write_item.call_count == 2
+        assert client.batch_write_item.call_args.kwargs["RequestItems"] == {TABLE: leftover}
+        assert writer.stats["retries"] == 1 and writer.stats["items"] == 2
+
+    def test_throttling_is_retried(self):
+        from botocore.exceptions import ClientError
+        bw = _load_bulk_writer()
+        throttled = ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "BatchWriteItem")
+        client = self._client([throttled, {}])
+        with bw.BulkWriter(client, TABLE, base_delay=0) as writer:
+            writer.put({"pk": "p", "sk": "0"})
+        assert writer.stats["retries"] == 1 and writer.stats["items"] == 1
+
+    def test_gives_up_after_max_retries(self):
+        bw = _load_bulk_writer()
+        stuck = {"UnprocessedItems": {TABLE: [{"PutRequest": {"Item": {"pk": {"S": "p"}}}}]}}
+        client = self._client(lambda **kw: stuck)
+        with pytest.raises(RuntimeError, match="still unprocessed"):
+            with bw.BulkWriter(client, TABLE, max_retries=2, base_delay=0) as writer:
+                writer.put({"pk": "p", "sk": "0"})
+        assert client.batch_write_item.call_count == 3
+
+
 # ---------------------------------------------------------------------------
 # S3 path validation — non-.xlsx keys are skipped
 # ---------------------------------------------------------------------------
@@ -407,26 +623,24 @@ class TestHappyPath:
         mod, dynamodb, s3, *_ = lf
         _upload(s3, _simple_xlsx(2))
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         # META + 2 data rows = 3 items
         assert len(resp["Items"]) == 3
 
-    def test_row_sk_is_numeric_string(self, lf):
-        """Row sort keys must be '0', '1', '2', … (numeric string offsets)."""
+    def test_row_sk_is_content_hash_and_position_is_separate(self, lf):
+        """Row sort keys hash the row's contents; ``_pos`` carries the spreadsheet order."""
         mod, dynamodb, s3, *_ = lf
-        _upload(s3, _simple_xlsx(3))
+        rows = [("Acme", "CA"), ("Beta", "NV"), ("Acme", "CA")]
+        _upload(s3, _make_xlsx(["Vendor", "State"], [list(r) for r in rows]))
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
-        sks = {item["sk"] for item in resp["Items"]}
-        assert "0" in sks
-        assert "1" in sks
-        assert "2" in sks
+        items = sorted((item for item in _index_items(dynamodb) if item["sk"] != "META"),
+                       key=lambda item: item["_pos"])
+        seen = {}
+        expected = [mod._row_key({"Vendor": v, "State": st}, seen) for v, st in rows]
+        assert [item["sk"] for item in items] == expected
+        assert expected[2] == expected[0] + "#1"
+        assert [item["Vendor"] for item in items] == ["Acme", "Beta", "Acme"]
+        assert [int(item["_pos"]) for item in items] == [mod.POSITION_GAP * n for n in (1, 2, 3)]
 
     def test_meta_status_complete_after_parse(self, lf):
         mod, dynamodb, s3, *_ = lf
@@ -456,10 +670,7 @@ class TestHappyPath:
         xlsx = _make_xlsx(["Vendor Name", "Start Date"], [["Acme", "2024-01-01"]])
         _upload(s3, xlsx)
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         assert len(data_rows) == 1
         assert "Vendor_Name" in data_rows[0]
@@ -470,10 +681,7 @@ class TestHappyPath:
         xlsx = _make_xlsx(["Start/End Date", "Amount"], [["2024-01-01", "100"]])
         _upload(s3, xlsx)
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         assert "Start_End_Date" in data_rows[0]
 
@@ -488,15 +696,22 @@ class TestHappyPath:
         assert args[1] == DISPLAY_NAME
         assert args[3] == 2   # row_count
 
+    def test_types_inferred_from_rows_past_the_top_of_the_sheet(self, lf):
+        """Type inference samples the whole sheet, not just its first rows."""
+        mod, dynamodb, s3, *_ = lf
+        rows = [[f"v{i}", ""] for i in range(300)] + [[f"w{i}", "2024-01-02"] for i in range(50)]
+        _upload(s3, _make_xlsx(["Name", "Renewal"], rows))
+        mod.lambda_handler(_make_s3_event(), {})
+        meta = dynamodb.Table(TABLE).get_item(Key={"pk": INDEX_ID, "sk": "META"})["Item"]
+        assert meta["row_count"] == 350
+        assert meta["date_columns"] == ["Renewal"]
+
     def test_large_file_batches_correctly(self, lf):
         """Files with >25 rows should be batched; all rows must arrive in DDB."""
         mod, dynamodb, s3, *_ = lf
         _upload(s3, _simple_xlsx(60))
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         assert len(data_rows) == 60
 
@@ -547,10 +762,7 @@ class TestColumnDetection:
         xlsx = _make_xlsx(["End-Date", "Vendor"], [["2024-01-01", "Acme"]])
         _upload(s3, xlsx)
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         assert "End_Date" in data_rows[0]
 
@@ -568,10 +780,7 @@ class TestBlankRows:
         )
         _upload(s3, xlsx)
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         assert len(data_rows) == 2
 
@@ -632,7 +841,7 @@ class TestMetaLifecycle:
 
 
 # ---------------------------------------------------------------------------
-# _clear_index — old rows are removed before re-parse, META is kept
+# Re-upload — new generation replaces the old one, META is kept
 # ---------------------------------------------------------------------------
 
 class TestClearIndex:
@@ -647,14 +856,21 @@ class TestClearIndex:
         _upload(s3, xlsx2)
         mod.lambda_handler(_make_s3_event(), {})
 
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         assert len(data_rows) == 1
         assert data_rows[0]["Vendor"] == "NewCo"
 
+    def test_reupload_of_large_index_leaves_no_orphans(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(130))
+        mod.lambda_handler(_make_s3_event(), {})
+        _upload(s3, _simple_xlsx(40))
+        mod.lambda_handler(_make_s3_event(), {})
+        resp = {"Items": _index_items(dynamodb)}
+        assert len([i for i in resp["Items"] if i["sk"] != "META"]) == 40
+        assert _all_partitions(dynamodb) == {INDEX_ID, f"{INDEX_ID}#g2"}
+
     def test_clear_does_not_delete_meta(self, lf):
         mod, dynamodb, s3, *_ = lf
         _upload(s3, _simple_xlsx(2))
@@ -667,6 +883,534 @@ class TestClearIndex:
         assert meta is not None
 
 
+class TestGenerations:
+    def _meta(self, dynamodb):
+        return dynamodb.Table(TABLE).get_item(Key={"pk": INDEX_ID, "sk": "META"})["Item"]
+
+    def test_reupload_cuts_over_and_removes_old_generation(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        assert self._meta(dynamodb)["data_pk"] == f"{INDEX_ID}#g1"
+        _upload(s3, _simple_xlsx(2))
+        mod.lambda_handler(_make_s3_event(), {})
+        meta = self._meta(dynamodb)
+        assert meta["data_pk"] == f"{INDEX_ID}#g2" and meta["generation"] == 2
+        assert "pending_generation" not in meta
+        assert _all_partitions(dynamodb) == {INDEX_ID, f"{INDEX_ID}#g2"}
+
+    def test_previous_generation_stays_live_during_ingest(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        seen = {}
+        real = mod._stream_rows
+
+        def spy(*args, **kwargs):
+            seen.update(self._meta(dynamodb))
+            return real(*args, **kwargs)
+
+        _upload(s3, _simple_xlsx(2))
+        with patch.object(mod, "_stream_rows", side_effect=spy):
+            mod.lambda_handler(_make_s3_event(), {})
+        assert seen["status"] == "COMPLETE"
+        assert seen["data_pk"] == f"{INDEX_ID}#g1"
+        assert seen["pending_generation"] == 2
+
+    def test_upload_superseded_by_newer_one_is_discarded(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        real = mod._stream_rows
+
+        def newer_upload_starts(*args, **kwargs):
+            out = real(*args, **kwargs)
+            mod._begin_generation(dynamodb.Table(TABLE), INDEX_ID, "2030-01-01T00:00:00+00:00")
+            return out
+
+        _upload(s3, _simple_xlsx(2))
+        with patch.object(mod, "_stream_rows", side_effect=newer_upload_starts):
+            resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["status"] == "superseded"
+        assert self._meta(dynamodb)["data_pk"] == f"{INDEX_ID}#g1"
+        assert f"{INDEX_ID}#g2" not in _all_partitions(dynamodb)
+
+    def test_failed_reupload_keeps_previous_generation(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        _upload(s3, _simple_xlsx(2))
+        with patch.object(mod, "infer_date_columns", side_effect=RuntimeError("boom")):
+            resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["status"] == "error"
+        meta = self._meta(dynamodb)
+        assert meta["status"] == "ERROR" and meta["error"] == "boom"
+        assert meta["data_pk"] == f"{INDEX_ID}#g1" and int(meta["row_count"]) == 3
+        assert _all_partitions(dynamodb) == {INDEX_ID, f"{INDEX_ID}#g1"}
+
+    def test_legacy_rows_under_index_id_are_collected(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        table = dynamodb.Table(TABLE)
+        table.put_item(Item={"pk": INDEX_ID, "sk": "META", "status": "COMPLETE", "row_count": 1,
+                             "last_updated": "2024-01-01T00:00:00+00:00"})
+        table.put_item(Item={"pk": INDEX_ID, "sk": "0", "Vendor": "Old"})
+        _upload(s3, _simple_xlsx(2))
+        mod.lambda_handler(_make_s3_event(), {})
+        items = table.query(KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID))["Items"]
+        assert [i["sk"] for i in items] == ["META"]
+        assert len(_index_items(dynamodb)) == 3
+
+    def test_garbage_collection_runs_as_async_self_invocation(self, lf, monkeypatch):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "excel-parser")
+        _upload(s3, _simple_xlsx(2))
+        with patch.object(mod.LAMBDA, "invoke") as invoke:
+            mod.lambda_handler(_make_s3_event(), {})
+        kwargs = invoke.call_args.kwargs
+        assert kwargs["FunctionName"] == "excel-parser" and kwargs["InvocationType"] == "Event"
+        assert f"{INDEX_ID}#g1" in _all_partitions(dynamodb)  # not deleted inline
+
+        resp = mod.lambda_handler(json.loads(kwargs["Payload"]), {})
+        assert json.loads(resp["body"])["status"] == "collected"
+        assert _all_partitions(dynamodb) == {INDEX_ID, f"{INDEX_ID}#g2"}
+
+    def test_garbage_collection_never_deletes_live_generation(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        event = {"collect_generations": {"index_id": INDEX_ID,
+                                         "partitions": [f"{INDEX_ID}#g1", "other_index#g1"]}}
+        mod.lambda_handler(event, {})
+        assert len(_index_items(dynamodb)) == 4
+
+
+class TestIncrementalReingest:
+    ROWS = [[f"Vendor {i}", f"CTR-{i:04d}"] for i in range(20)]
+
+    def _meta(self, dynamodb):
+        return dynamodb.Table(TABLE).get_item(Key={"pk": INDEX_ID, "sk": "META"})["Item"]
+
+    def _rows(self, dynamodb):
+        return {(i["Vendor"], i["Contract"]): i["sk"] for i in _index_items(dynamodb) if i["sk"] != "META"}
+
+    def test_small_change_applied_in_place(self, lf, capsys):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        mod.lambda_handler(_make_s3_event(), {})
+        before = self._rows(dynamodb)
+
+        changed = [list(r) for r in self.ROWS]
+        changed[5][1] = "CTR-9999"
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], changed))
+        resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["mode"] == "incremental"
+        assert "1 inserted, 1 removed, 0 moved, 19 unchanged" in capsys.readouterr().out
+
+        meta = self._meta(dynamodb)
+        assert meta["data_pk"] == f"{INDEX_ID}#g1" and meta["generation"] == 2
+        assert meta["status"] == "COMPLETE" and int(meta["row_count"]) == 20
+        after = self._rows(dynamodb)
+        assert ("Vendor 5", "CTR-9999") in after and ("Vendor 5", "CTR-0005") not in after
+        assert after[("Vendor 6", "CTR-0006")] == before[("Vendor 6", "CTR-0006")]
+        assert _all_partitions(dynamodb) == {INDEX_ID, f"{INDEX_ID}#g1"}
+        assert _read_snapshot(s3)[0]["version"] == meta["last_updated"]
+
+    def test_resaved_identical_rows_write_nothing(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        mod.lambda_handler(_make_s3_event(), {})
+        # A different object (new ETag) holding the same rows
+        with patch.object(mod.BulkWriter, "put") as put, patch.object(mod.BulkWriter, "delete") as delete:
+            resp = mod.lambda_handler(_make_s3_event(etag="resaved"), {})
+        assert json.loads(resp["body"])["mode"] == "incremental"
+        put.assert_not_called()
+        delete.assert_not_called()
+
+    def _ordered(self, dynamodb):
+        rows = sorted((i for i in _index_items(dynamodb) if i["sk"] != "META"), key=lambda i: i["_pos"])
+        return [[i["Vendor"], i["Contract"]] for i in rows]
+
+    def test_row_inserted_mid_sheet_is_one_put(self, lf, capsys):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        mod.lambda_handler(_make_s3_event(), {})
+        inserted = self.ROWS[:7] + [["Vendor 6b", "CTR-0006b"]] + self.ROWS[7:]
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], inserted))
+        with patch.object(mod.BulkWriter, "put", autospec=True, side_effect=mod.BulkWriter.put) as put, \
+                patch.object(mod.BulkWriter, "delete") as delete:
+            resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["mode"] == "incremental"
+        assert "1 inserted, 0 removed, 0 moved, 20 unchanged" in capsys.readouterr().out
+        assert put.call_count == 1
+        delete.assert_not_called()
+        assert self._ordered(dynamodb) == inserted
+
+    def test_moved_row_is_rewritten_in_its_new_place(self, lf, capsys):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        mod.lambda_handler(_make_s3_event(), {})
+        reordered = [self.ROWS[15]] + self.ROWS[:15] + self.ROWS[16:]
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], reordered))
+        resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["mode"] == "incremental"
+        assert "0 inserted, 0 removed, 1 moved, 19 unchanged" in capsys.readouterr().out
+        assert self._ordered(dynamodb) == reordered
+
+    def test_no_room_between_positions_rewrites_generation(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        mod.POSITION_GAP = 2
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        mod.lambda_handler(_make_s3_event(), {})
+        crowded = self.ROWS[:5] + [["New A", "CTR-A"], ["New B", "CTR-B"]] + self.ROWS[5:]
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], crowded))
+        resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["mode"] == "full"
+        assert self._ordered(dynamodb) == crowded
+
+    def test_partition_flagged_processing_while_changed_in_place(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        mod.lambda_handler(_make_s3_event(), {})
+        statuses = []
+        real = mod._write_from_spool
+
+        def spy(*args, **kwargs):
+            statuses.append(self._meta(dynamodb)["status"])
+            return real(*args, **kwargs)
+
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS + [["New", "CTR-1000"]]))
+        with patch.object(mod, "_write_from_spool", side_effect=spy):
+            mod.lambda_handler(_make_s3_event(), {})
+        assert statuses == ["PROCESSING"]
+        assert self._meta(dynamodb)["status"] == "COMPLETE"
+
+    def _items(self, dynamodb):
+        return sorted((i["sk"], i["Vendor"], i["Contract"]) for i in _index_items(dynamodb) if i["sk"] != "META")
+
+    def _edited(self):
+        changed = [list(r) for r in self.ROWS]
+        changed[3][1], changed[8][1] = "CTR-7777", "CTR-8888"
+        return changed
+
+    def test_failed_in_place_update_restores_partition(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        mod.lambda_handler(_make_s3_event(), {})
+        before = self._items(dynamodb)
+        real = mod._write_from_spool
+
+        def half_applied(spool_path, data_pk, only=None, deletes=None):
+            # Every insert and one of the two deletes lands, then the write fails
+            real(spool_path, data_pk, only=only, deletes=set(sorted(deletes)[:1]))
+            raise RuntimeError("throttled")
+
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self._edited()))
+        with patch.object(mod, "_write_from_spool", side_effect=half_applied):
+            resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["status"] == "error"
+        assert self._items(dynamodb) == before
+        meta = self._meta(dynamodb)
+        assert meta["status"] == "ERROR" and meta["data_pk"] == f"{INDEX_ID}#g1"
+        assert "applying_generation" not in meta
+
+    def test_superseded_in_place_update_is_rolled_back(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        mod.lambda_handler(_make_s3_event(), {})
+        before = self._items(dynamodb)
+        table = dynamodb.Table(TABLE)
+
+        def newer_upload_starts(*args, **kwargs):
+            table.update_item(Key={"pk": INDEX_ID, "sk": "META"},
+                              UpdateExpression="ADD generation_counter :one",
+                              ExpressionAttributeValues={":one": 1})
+            return None
+
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self._edited()))
+        with patch.object(mod, "_publish_snapshot", side_effect=newer_upload_starts):
+            resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["status"] == "superseded"
+        assert self._items(dynamodb) == before
+        meta = self._meta(dynamodb)
+        assert meta["data_pk"] == f"{INDEX_ID}#g1" and "applying_generation" not in meta
+
+    def test_locked_partition_gets_new_generation(self, lf):
+        """A second small re-upload doesn't interleave with one already editing the partition."""
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        mod.lambda_handler(_make_s3_event(), {})
+        dynamodb.Table(TABLE).update_item(
+            Key={"pk": INDEX_ID, "sk": "META"},
+            UpdateExpression="SET applying_generation = :g, applying_since = :t",
+            ExpressionAttributeValues={":g": 9, ":t": datetime.now(timezone.utc).isoformat()},
+        )
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self._edited()))
+        resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["mode"] == "full"
+        assert self._meta(dynamodb)["data_pk"] == f"{INDEX_ID}#g2"
+
+    def test_large_change_writes_new_generation(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        mod.lambda_handler(_make_s3_event(), {})
+        rewritten = [[v.upper(), c] for v, c in self.ROWS]
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], rewritten))
+        resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["mode"] == "full"
+        assert self._meta(dynamodb)["data_pk"] == f"{INDEX_ID}#g2"
+        assert len(self._rows(dynamodb)) == 20
+        assert _all_partitions(dynamodb) == {INDEX_ID, f"{INDEX_ID}#g2"}
+
+
+class TestFanOut:
+    ROWS = [[f"Vendor {i}", f"CTR-{i:04d}"] for i in range(30)]
+
+    @pytest.fixture(autouse=True)
+    def small_slices(self, lf):
+        mod = lf[0]
+        mod.FANOUT_MIN_ROWS, mod.FANOUT_SLICE_ROWS, mod.FANOUT_WORKERS = 10, 4, 3
+
+    def _slices(self, s3):
+        return s3.list_objects_v2(Bucket=BUCKET, Prefix=f"indexes/{INDEX_ID}/slices/").get("KeyCount", 0)
+
+    def test_large_sheet_written_by_slice_workers(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        with patch.object(mod, "_write_slice", wraps=mod._write_slice) as worker:
+            resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["row_count"] == 30
+        assert worker.call_count == 8
+        items = _index_items(dynamodb)
+        assert items[0]["status"] == "COMPLETE" and len(items) == 31
+        seen = {}
+        expected = [mod._row_key({"Vendor": v, "Contract": c}, seen) for v, c in self.ROWS]
+        rows = sorted(items[1:], key=lambda i: i["_pos"])
+        assert [i["sk"] for i in rows] == expected
+        assert [int(i["_pos"]) for i in rows] == [mod.POSITION_GAP * (n + 1) for n in range(30)]
+        assert self._slices(s3) == 0
+
+    def test_slices_invoke_this_function_when_deployed(self, lf, monkeypatch):
+        mod, dynamodb, s3, *_ = lf
+        monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "excel-parser")
+
+        sync_calls = []
+
+        def invoke(FunctionName, InvocationType, Payload):
+            out = mod.lambda_handler(json.loads(Payload), None)
+            if InvocationType == "RequestResponse":
+                sync_calls.append(FunctionName)
+            return {"Payload": io.BytesIO(json.dumps(out).encode())}
+
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        with patch.object(mod.LAMBDA, "invoke", side_effect=invoke):
+            mod.lambda_handler(_make_s3_event(), {})
+        assert sync_calls == ["excel-parser"] * 8
+        assert len(_index_items(dynamodb)) == 31
+
+    def test_failed_slice_fails_upload_and_discards_generation(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        real = mod._write_slice
+        calls = []
+
+        def flaky(*args):
+            calls.append(args)
+            if len(calls) == 3:
+                raise RuntimeError("worker died")
+            return real(*args)
+
+        _upload(s3, _make_xlsx(["Vendor", "Contract"], self.ROWS))
+        with patch.object(mod, "_write_slice", side_effect=flaky):
+            resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["status"] == "error"
+        assert "worker died" in self._meta_error(dynamodb)
+        assert _all_partitions(dynamodb) == {INDEX_ID}
+        assert self._slices(s3) == 0
+
+    def _meta_error(self, dynamodb):
+        return dynamodb.Table(TABLE).get_item(Key={"pk": INDEX_ID, "sk": "META"})["Item"]["error"]
+
+
+# ---------------------------------------------------------------------------
+# CSV / TSV uploads
+# ---------------------------------------------------------------------------
+
+CSV_KEY = f"indexes/{INDEX_ID}/latest.csv"
+
+
+class TestCsvIngestion:
+    def test_csv_upload_is_ingested(self, lf):
+        mod, dynamodb, s3, mock_write_reg, _ = lf
+        _upload(s3, "Vendor Name,Amount\nAcme,10\n\"Beta, Inc\",2.5\n,\nGamma,7\n".encode(), key=CSV_KEY)
+        resp = mod.lambda_handler(_make_s3_event(key=CSV_KEY), {})
+        body = json.loads(resp["body"])
+        assert body["status"] == "ok" and body["row_count"] == 3
+        meta, *rows = _index_items(dynamodb)
+        assert meta["columns"] == ["Vendor_Name", "Amount"]
+        assert meta["number_columns"] == ["Amount"]
+        assert sorted(r["Vendor_Name"] for r in rows) == ["Acme", "Beta, Inc", "Gamma"]
+        mock_write_reg.assert_called_once()
+
+    def test_tsv_upload_with_bom_is_ingested(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        key = f"indexes/{INDEX_ID}/latest.tsv"
+        _upload(s3, "\ufeffVendor\tState\nAcme\tVA\nBeta\tMD\n".encode(), key=key)
+        mod.lambda_handler(_make_s3_event(key=key), {})
+        meta, *rows = _index_items(dynamodb)
+        assert meta["columns"] == ["Vendor", "State"]
+        assert sorted(r["State"] for r in rows) == ["MD", "VA"]
+
+    def test_csv_with_one_header_column_is_an_error(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, b"Vendor\nAcme\n", key=CSV_KEY)
+        body = json.loads(mod.lambda_handler(_make_s3_event(key=CSV_KEY), {})["body"])
+        assert body["status"] == "error"
+        meta = dynamodb.Table(TABLE).get_item(Key={"pk": INDEX_ID, "sk": "META"})["Item"]
+        assert meta["status"] == "ERROR"
+
+    def test_deleting_a_stale_other_format_keeps_the_index(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(2))
+        mod.lambda_handler(_make_s3_event(), {})
+        _upload(s3, b"Vendor,State\nAcme,VA\nBeta,MD\nGamma,DC\n", key=CSV_KEY)
+        mod.lambda_handler(_make_s3_event(key=CSV_KEY), {})
+
+        body = json.loads(mod.lambda_handler(_make_s3_event(event_name="ObjectRemoved:Delete"), {})["body"])
+        assert body == {}
+        meta = _meta(dynamodb)
+        assert meta["status"] == "COMPLETE" and int(meta["row_count"]) == 3
+
+        mod.lambda_handler(_make_s3_event(key=CSV_KEY, event_name="ObjectRemoved:Delete"), {})
+        assert _meta(dynamodb)["status"] == "NO_DATA"
+
+    def test_other_extensions_are_ignored(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        key = f"indexes/{INDEX_ID}/latest.txt"
+        _upload(s3, b"a,b\n1,2\n", key=key)
+        mod.lambda_handler(_make_s3_event(key=key), {})
+        assert dynamodb.Table(TABLE).scan()["Items"] == []
+
+
+# ---------------------------------------------------------------------------
+# Multi-sheet workbooks
+# ---------------------------------------------------------------------------
+
+def _meta(dynamodb, index_id: str = INDEX_ID) -> dict | None:
+    return dynamodb.Table(TABLE).get_item(Key={"pk": index_id, "sk": "META"}).get("Item")
+
+
+class TestMultiSheet:
+    def _workbook(self, **extra):
+        sheets = {"Vendors": (["Vendor", "Amount"], [["Acme", 1], ["Beta", 2]])}
+        sheets.update(extra)
+        return _make_workbook(sheets)
+
+    def test_each_worksheet_becomes_a_sub_index(self, lf):
+        mod, dynamodb, s3, mock_write_reg, _ = lf
+        _upload(s3, self._workbook(**{
+            "Q1 Invoices": (["Invoice", "Total"], [["I-1", 5], ["I-2", 6], ["I-3", 7]]),
+            "Notes": (["just a note"], [["x"]]),
+        }))
+        body = json.loads(mod.lambda_handler(_make_s3_event(), {})["body"])
+        sub_id = f"{INDEX_ID}.q1_invoices"
+        assert body["row_count"] == 2
+        assert body["sheets"] == [{"sheet": "Q1 Invoices", "index_id": sub_id, "status": "ok",
+                                   "row_count": 3, "mode": "full"}]
+        parent = _meta(dynamodb)
+        assert parent["columns"] == ["Vendor", "Amount"]
+        assert parent["sheets"] == [{"sheet": "Q1 Invoices", "index_id": sub_id}]
+        sub = _meta(dynamodb, sub_id)
+        assert sub["status"] == "COMPLETE" and sub["row_count"] == 3
+        assert sub["columns"] == ["Invoice", "Total"]
+        assert sub["parent_index"] == INDEX_ID and sub["sheet"] == "Q1 Invoices"
+        registered = {c.args[0]: c.args[1] for c in mock_write_reg.call_args_list}
+        assert registered == {INDEX_ID: DISPLAY_NAME, sub_id: f"{DISPLAY_NAME} (Q1 Invoices)"}
+        parents = {c.args[0]: c.kwargs["parent_index_id"] for c in mock_write_reg.call_args_list}
+        assert parents == {INDEX_ID: None, sub_id: INDEX_ID}
+
+    def test_sub_index_registry_writes_use_per_thread_resources(self, lf):
+        import threading
+        import tool_registry
+        tool_registry._ddb = None
+        tables = []
+        worker = threading.Thread(target=lambda: tables.append(tool_registry._get_table()))
+        worker.start()
+        worker.join()
+        tables.append(tool_registry._get_table())
+        assert tables[0].meta.client is not tables[1].meta.client
+        assert tool_registry._get_table().meta.client is tables[1].meta.client
+
+    def test_sheet_names_that_slug_alike_get_distinct_ids(self, lf):
+        mod, *_ = lf
+        wb = Workbook()
+        for title in ("Main", "Q1-Sales", "Q1 Sales", "!!!"):
+            ws = wb.create_sheet(title)
+            ws.append(["A", "B"])
+        wb.active = 1
+        plan = mod._sheet_plan("idx", wb, "Main")
+        assert [p["index_id"] for p in plan] == ["idx.q1_sales", "idx.q1_sales_2", "idx.sheet5"]
+
+    def test_failed_sheet_does_not_fail_the_upload(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, self._workbook(Other=(["A", "B"], [["1", "2"]])))
+        real = mod._ingest_sheet
+
+        def flaky(table, index_id, *args, **kwargs):
+            if index_id.endswith(".other"):
+                raise RuntimeError("boom")
+            return real(table, index_id, *args, **kwargs)
+
+        with patch.object(mod, "_ingest_sheet", side_effect=flaky):
+            body = json.loads(mod.lambda_handler(_make_s3_event(), {})["body"])
+        assert body["status"] == "ok"
+        assert body["sheets"][0]["status"] == "error"
+        assert _meta(dynamodb)["status"] == "COMPLETE"
+        assert _meta(dynamodb, f"{INDEX_ID}.other")["status"] == "ERROR"
+
+    def test_removed_sheet_drops_its_sub_index(self, lf):
+        mod, dynamodb, s3, _, mock_del_reg = lf
+        _upload(s3, self._workbook(Other=(["A", "B"], [["1", "2"]])))
+        mod.lambda_handler(_make_s3_event(), {})
+        _upload(s3, self._workbook())
+        body = json.loads(mod.lambda_handler(_make_s3_event(), {})["body"])
+        assert "sheets" not in body
+        assert _meta(dynamodb)["sheets"] == []
+        left = [i for i in dynamodb.Table(TABLE).scan()["Items"] if i["pk"].startswith(f"{INDEX_ID}.")]
+        assert [(i["pk"], i["sk"], i["status"]) for i in left] == [(f"{INDEX_ID}.other", "META", "NO_DATA")]
+        mock_del_reg.assert_called_once_with(f"{INDEX_ID}.other")
+
+    def test_re_added_sheet_continues_its_generations(self, lf):
+        """A dropped sheet's generation counter survives, so g1 isn't handed out again."""
+        mod, dynamodb, s3, *_ = lf
+        sub_id = f"{INDEX_ID}.other"
+        _upload(s3, self._workbook(Other=(["A", "B"], [["1", "2"]])))
+        mod.lambda_handler(_make_s3_event(), {})
+        assert _meta(dynamodb, sub_id)["data_pk"] == f"{sub_id}#g1"
+        _upload(s3, self._workbook())
+        mod.lambda_handler(_make_s3_event(), {})
+        assert "data_pk" not in _meta(dynamodb, sub_id)
+
+        _upload(s3, self._workbook(Other=(["A", "B"], [["3", "4"]])))
+        mod.lambda_handler(_make_s3_event(), {})
+        meta = _meta(dynamodb, sub_id)
+        assert meta["status"] == "COMPLETE" and meta["data_pk"] == f"{sub_id}#g2"
+        # A late cleanup of the dropped generation leaves the new one alone
+        mod.lambda_handler({"collect_generations": {"index_id": sub_id, "partitions": [f"{sub_id}#g1"]}}, {})
+        assert _meta(dynamodb, sub_id)["row_count"] == 1
+        assert len(dynamodb.Table(TABLE).query(
+            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(f"{sub_id}#g2"))["Items"]) == 1
+
+    def test_delete_event_drops_sub_indexes(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, self._workbook(Other=(["A", "B"], [["1", "2"]])))
+        mod.lambda_handler(_make_s3_event(), {})
+        mod.lambda_handler(_make_s3_event(event_name="ObjectRemoved:Delete"), {})
+        left = [i for i in dynamodb.Table(TABLE).scan()["Items"] if i["pk"].startswith(f"{INDEX_ID}.")]
+        assert [(i["sk"], i["status"]) for i in left] == [("META", "NO_DATA")]
+        assert _meta(dynamodb)["status"] == "NO_DATA"
+
+
 # ---------------------------------------------------------------------------
 # Delete event
 # ---------------------------------------------------------------------------
@@ -684,6 +1428,7 @@ class TestDeleteEvent:
         body = json.loads(resp["body"])
         assert body["status"] == "deleted"
         assert body["index_id"] == INDEX_ID
+        assert _all_partitions(dynamodb) == {INDEX_ID}  # only META is left
 
     def test_delete_event_writes_no_data_meta_status(self, lf):
         mod, dynamodb, s3, *_ = lf
@@ -698,6 +1443,23 @@ class TestDeleteEvent:
         assert meta["status"] == "NO_DATA"
         assert int(meta["row_count"]) == 0
 
+    def test_reupload_after_delete_survives_late_gc(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(2))
+        mod.lambda_handler(_make_s3_event(), {})
+        mod.lambda_handler(_make_s3_event(event_name="ObjectRemoved:Delete"), {})
+        meta = _meta(dynamodb)
+        assert meta["status"] == "NO_DATA" and int(meta["generation_counter"]) == 1
+        assert "data_pk" not in meta and "columns" not in meta
+
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(etag="reuploaded"), {})
+        assert _meta(dynamodb)["data_pk"] == f"{INDEX_ID}#g2"
+
+        # A garbage-collection request for the deleted generation arrives late
+        mod.lambda_handler({"collect_generations": {"index_id": INDEX_ID, "partitions": [f"{INDEX_ID}#g1"]}}, {})
+        assert len([i for i in _index_items(dynamodb) if i["sk"] != "META"]) == 3
+
     def test_delete_event_calls_delete_from_registry(self, lf):
         mod, _, s3, _, mock_del_reg = lf
         _upload(s3, _simple_xlsx(1))
@@ -755,6 +1517,99 @@ class TestErrorHandling:
         assert resp["statusCode"] == 200
 
 
+# ---------------------------------------------------------------------------
+# Idempotent S3 events (ETag / VersionId)
+# ---------------------------------------------------------------------------
+
+class TestIdempotentEvents:
+    def test_duplicate_event_is_skipped(self, lf):
+        mod, dynamodb, s3, mock_write_reg, _ = lf
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        meta = _meta(dynamodb)
+        etag = s3.head_object(Bucket=BUCKET, Key=KEY)["ETag"].strip('"')
+        assert (meta["source_key"], meta["source_etag"]) == (KEY, etag)
+        with patch.object(mod.S3, "download_file") as download:
+            resp = mod.lambda_handler(_make_s3_event(etag=etag), {})
+        body = json.loads(resp["body"])
+        assert (body["status"], body["reason"]) == ("skipped", "unchanged")
+        download.assert_not_called()
+        assert _meta(dynamodb)["generation"] == meta["generation"]
+        mock_write_reg.assert_called_once()
+
+    def test_changed_object_is_reprocessed(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        _upload(s3, _simple_xlsx(4))
+        body = json.loads(mod.lambda_handler(_make_s3_event(), {})["body"])
+        assert body["status"] == "ok" and body["row_count"] == 4
+
+    def test_new_version_of_same_content_is_reprocessed(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        etag = s3.head_object(Bucket=BUCKET, Key=KEY)["ETag"].strip('"')
+        mod.lambda_handler(_make_s3_event(etag=etag), {})
+        event = _make_s3_event(etag=etag)
+        event["Records"][0]["s3"]["object"]["versionId"] = "v2"
+        body = json.loads(mod.lambda_handler(event, {})["body"])
+        assert body["status"] == "ok"
+        assert _meta(dynamodb)["source_version_id"] == "v2"
+
+    def test_failed_upload_is_retried(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        with patch.object(mod, "_stream_rows", side_effect=RuntimeError("boom")):
+            mod.lambda_handler(_make_s3_event(), {})
+        assert "pending_source" not in _meta(dynamodb)
+        body = json.loads(mod.lambda_handler(_make_s3_event(), {})["body"])
+        assert body["status"] == "ok"
+
+    def test_event_for_object_in_flight_is_skipped(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        results = []
+        real = mod._stream_rows
+
+        def duplicate_arrives(*args, **kwargs):
+            results.append(json.loads(mod.lambda_handler(_make_s3_event(), {})["body"]))
+            return real(*args, **kwargs)
+
+        with patch.object(mod, "_stream_rows", side_effect=duplicate_arrives):
+            body = json.loads(mod.lambda_handler(_make_s3_event(), {})["body"])
+        assert body["status"] == "ok"
+        assert results == [{"status": "skipped", "reason": "in_progress", "index_id": INDEX_ID}]
+        assert "pending_source" not in _meta(dynamodb)
+
+    def test_stale_claim_is_taken_over(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        source = mod._object_source(BUCKET, KEY, {})
+        dynamodb.Table(TABLE).put_item(Item={
+            "pk": INDEX_ID, "sk": "META", "status": "PROCESSING",
+            "pending_source": mod._source_tag(source), "pending_source_at": "2020-01-01T00:00:00+00:00",
+        })
+        body = json.loads(mod.lambda_handler(_make_s3_event(), {})["body"])
+        assert body["status"] == "ok"
+
+    def test_retry_takes_over_its_abandoned_claim(self, lf):
+        """Lambda retries a timed-out async invocation with the same request id, well inside the TTL."""
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(3))
+        with patch.object(mod, "_ingest", side_effect=TimeoutError("Task timed out")), \
+                patch.object(mod, "_mark_error"):
+            mod.lambda_handler(_make_s3_event(), SimpleNamespace(aws_request_id="req-1"))
+        assert _meta(dynamodb)["pending_source_request"] == "req-1"
+
+        other = json.loads(mod.lambda_handler(_make_s3_event(), SimpleNamespace(aws_request_id="req-2"))["body"])
+        assert other == {"status": "skipped", "reason": "in_progress", "index_id": INDEX_ID}
+        retry = json.loads(mod.lambda_handler(_make_s3_event(), SimpleNamespace(aws_request_id="req-1"))["body"])
+        assert retry["status"] == "ok"
+        meta = _meta(dynamodb)
+        assert meta["status"] == "COMPLETE" and "pending_source" not in meta
+
+
+
 # ---------------------------------------------------------------------------
 # Multiple records in one event
 # ---------------------------------------------------------------------------
@@ -791,10 +1646,7 @@ class TestValueSerialisation:
         xlsx = _make_xlsx(["Vendor", "Amount"], [["Acme", 42]])
         _upload(s3, xlsx)
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         assert data_rows[0]["Amount"] == "42"
 
@@ -803,10 +1655,7 @@ class TestValueSerialisation:
         xlsx = _make_xlsx(["Vendor", "Amount"], [["Acme", None]])
         _upload(s3, xlsx)
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         assert data_rows[0]["Amount"] == ""
 
@@ -821,10 +1670,7 @@ class TestValueSerialisation:
         wb.save(buf)
         _upload(s3, buf.getvalue())
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         # openpyxl returns date cells as datetime objects; .isoformat() produces
         # either "2024-06-15" (pure date) or "2024-06-15T00:00:00" (datetime).
@@ -835,10 +1681,7 @@ class TestValueSerialisation:
         xlsx = _make_xlsx(["Vendor", "Rate"], [["Acme", 3.14]])
         _upload(s3, xlsx)
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         assert data_rows[0]["Rate"] == "3.14"
 
@@ -848,10 +1691,7 @@ class TestValueSerialisation:
         xlsx = _make_xlsx(["Vendor", "Amount"], [["Acme  Corp\n LLC", "100"]])
         _upload(s3, xlsx)
         mod.lambda_handler(_make_s3_event(), {})
-        table = dynamodb.Table(TABLE)
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("pk").eq(INDEX_ID)
-        )
+        resp = {"Items": _index_items(dynamodb)}
         data_rows = [item for item in resp["Items"] if item["sk"] != "META"]
         assert data_rows[0]["Vendor"] == "Acme Corp LLC"
 
@@ -942,3 +1782,199 @@ class TestDateColumnsEndToEnd:
         item = reg.get_item(Key={"pk": "TOOLS", "sk": INDEX_ID})["Item"]
         assert "date_columns" in item
         assert item["date_columns"] == []
+
+
+# ---------------------------------------------------------------------------
+# Asynchronous, schema-cached index descriptions
+# ---------------------------------------------------------------------------
+
+class TestDescriptions:
+    @pytest.fixture()
+    def registry(self, lf):
+        """The real tool_registry against the moto registry table, with the model call stubbed."""
+        mod, dynamodb, s3, *_ = lf
+        import tool_registry
+        tool_registry._ddb = None
+        tool_registry._bedrock = None
+        with patch.object(tool_registry, "_generate_description", return_value="AI text.") as gen, \
+             patch.object(mod, "write_to_registry", tool_registry.write_to_registry):
+            yield mod, dynamodb, s3, tool_registry, gen
+
+    def _item(self, dynamodb, index_id=INDEX_ID):
+        return dynamodb.Table(REGISTRY_TABLE).get_item(Key={"pk": "TOOLS", "sk": index_id})["Item"]
+
+    def test_fallback_is_deterministic(self):
+        if _PARSER_DIR not in sys.path:
+            sys.path.insert(0, _PARSER_DIR)
+        import tool_registry
+        cols = ["Vendor_Name", "A", "B", "C", "D", "E", "F"]
+        text = tool_registry.fallback_description("Vendors", cols, 12)
+        assert text == "Vendors: 12 rows covering Vendor Name, A, B, C, D, E and 1 more."
+        assert tool_registry.schema_hash("Vendors", cols) == tool_registry.schema_hash("Vendors", list(cols))
+        assert tool_registry.schema_hash("Vendors", cols) != tool_registry.schema_hash("Vendors", cols[:-1])
+
+    def test_upload_publishes_fallback_then_generated(self, registry):
+        mod, dynamodb, s3, tool_registry, gen = registry
+        _upload(s3, _simple_xlsx(3))
+        seen = {}
+        real = tool_registry.describe_index
+
+        def spy(*args):
+            seen["before"] = dict(self._item(dynamodb))
+            return real(*args)
+
+        with patch.object(mod, "describe_index", side_effect=spy):
+            mod.lambda_handler(_make_s3_event(), {})
+        assert seen["before"]["description_source"] == "fallback"
+        assert seen["before"]["description"].startswith(f"{DISPLAY_NAME}: 3 rows")
+        item = self._item(dynamodb)
+        assert item["description"] == "AI text." and item["description_source"] == "generated"
+        gen.assert_called_once()
+
+    def test_same_schema_reuses_cached_description(self, registry):
+        mod, dynamodb, s3, tool_registry, gen = registry
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        dynamodb.Table(REGISTRY_TABLE).delete_item(Key={"pk": "TOOLS", "sk": INDEX_ID})
+        _upload(s3, _simple_xlsx(5))
+        mod.lambda_handler(_make_s3_event(), {})
+        assert self._item(dynamodb)["description"] == "AI text."
+        gen.assert_called_once()
+
+    def test_changed_schema_regenerates(self, registry):
+        mod, dynamodb, s3, tool_registry, gen = registry
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        gen.return_value = "New AI text."
+        _upload(s3, _make_xlsx(["Vendor Name", "Amount"], [["Acme", 1]]))
+        mod.lambda_handler(_make_s3_event(), {})
+        assert self._item(dynamodb)["description"] == "New AI text."
+        assert gen.call_count == 2
+
+    def test_admin_description_is_kept(self, registry):
+        mod, dynamodb, s3, tool_registry, gen = registry
+        dynamodb.Table(REGISTRY_TABLE).put_item(Item={
+            "pk": "TOOLS", "sk": INDEX_ID, "index_name": INDEX_ID, "description": "Curated.",
+        })
+        _upload(s3, _simple_xlsx(3))
+        mod.lambda_handler(_make_s3_event(), {})
+        assert self._item(dynamodb)["description"] == "Curated."
+        gen.assert_not_called()
+
+    def test_failed_generation_keeps_fallback(self, registry):
+        mod, dynamodb, s3, tool_registry, gen = registry
+        gen.return_value = ""
+        _upload(s3, _simple_xlsx(3))
+        resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["status"] == "ok"
+        assert self._item(dynamodb)["description_source"] == "fallback"
+        assert dynamodb.Table(REGISTRY_TABLE).get_item(
+            Key={"pk": "DESCRIPTIONS", "sk": tool_registry.schema_hash(DISPLAY_NAME, ["Vendor_Name", "Contract_Number"])}
+        ).get("Item") is None
+
+    def test_deployed_upload_queues_description_event(self, registry, monkeypatch):
+        mod, dynamodb, s3, tool_registry, gen = registry
+        monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "parser-fn")
+        _upload(s3, _simple_xlsx(3))
+        with patch.object(mod.LAMBDA, "invoke") as invoke:
+            mod.lambda_handler(_make_s3_event(), {})
+        gen.assert_not_called()
+        payloads = [json.loads(c.kwargs["Payload"]) for c in invoke.call_args_list]
+        describe = [p["describe_index"] for p in payloads if "describe_index" in p]
+        assert describe[0]["index_id"] == INDEX_ID
+        assert describe[0]["columns"] == ["Vendor_Name", "Contract_Number"]
+        assert invoke.call_args_list[0].kwargs["InvocationType"] == "Event"
+        resp = mod.lambda_handler({"describe_index": describe[0]}, None)
+        assert json.loads(resp["body"])["status"] == "described"
+        assert self._item(dynamodb)["description"] == "AI text."
+
+
+# ---------------------------------------------------------------------------
+# Published S3 snapshot (cold-load path for the query Lambda)
+# ---------------------------------------------------------------------------
+
+SNAPSHOT_KEY = f"indexes/{INDEX_ID}/snapshot.jsonl.gz"
+
+
+def _read_snapshot(s3) -> list[dict]:
+    body = s3.get_object(Bucket=BUCKET, Key=SNAPSHOT_KEY)["Body"].read()
+    return [json.loads(line) for line in gzip.decompress(body).decode().split("\n")]
+
+
+class TestPublishedSnapshot:
+    def test_snapshot_object_mirrors_rows(self, lf):
+        mod, _, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Amount"], [["Acme", 42], ["Beta", None]]))
+        mod.lambda_handler(_make_s3_event(), {})
+        header, *rows = _read_snapshot(s3)
+        assert header["columns"] == ["Vendor", "Amount"]
+        assert header["row_count"] == 2
+        assert rows == [["Acme", "42"], ["Beta", ""]]
+
+    def test_snapshot_version_matches_meta(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(2))
+        mod.lambda_handler(_make_s3_event(), {})
+        meta = dynamodb.Table(TABLE).get_item(Key={"pk": INDEX_ID, "sk": "META"})["Item"]
+        header = _read_snapshot(s3)[0]
+        assert header["version"] == meta["last_updated"]
+        assert meta["snapshot_key"] == SNAPSHOT_KEY
+
+    def test_snapshot_upload_failure_is_not_fatal(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _simple_xlsx(2))
+        with patch.object(mod.S3, "put_object", side_effect=RuntimeError("denied")):
+            resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["status"] == "ok"
+        meta = dynamodb.Table(TABLE).get_item(Key={"pk": INDEX_ID, "sk": "META"})["Item"]
+        assert meta["status"] == "COMPLETE"
+        assert "snapshot_key" not in meta
+
+    def test_delete_event_removes_snapshot(self, lf):
+        mod, _, s3, *_ = lf
+        _upload(s3, _simple_xlsx(2))
+        mod.lambda_handler(_make_s3_event(), {})
+        mod.lambda_handler(_make_s3_event(event_name="ObjectRemoved:Delete"), {})
+        listed = s3.list_objects_v2(Bucket=BUCKET, Prefix=SNAPSHOT_KEY)
+        assert listed.get("KeyCount", 0) == 0
+
+    def test_snapshot_carries_typed_columns(self, lf):
+        from datetime import date
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(
+            ["Vendor", "Amount", "End"],
+            [["Acme", 10, "2024-01-01"], ["Beta", 2.5, "2024-02-01"], ["Gamma", 7, "2024-03-01"]],
+        ))
+        mod.lambda_handler(_make_s3_event(), {})
+        meta = dynamodb.Table(TABLE).get_item(Key={"pk": INDEX_ID, "sk": "META"})["Item"]
+        assert meta["number_columns"] == ["Amount"]
+        header, *rows = _read_snapshot(s3)
+        assert header["typed_columns"] == [["End", "date"], ["Amount", "number"]]
+        assert rows[0][3:] == [date(2024, 1, 1).toordinal(), 10.0]
+
+    def test_meta_carries_column_stats(self, lf):
+        mod, dynamodb, s3, *_ = lf
+        _upload(s3, _make_xlsx(["Vendor", "Amount"], [["Acme", 1], ["Acme", 2], ["Beta", None]]))
+        mod.lambda_handler(_make_s3_event(), {})
+        meta = dynamodb.Table(TABLE).get_item(Key={"pk": INDEX_ID, "sk": "META"})["Item"]
+        vendor = meta["column_stats"]["Vendor"]
+        assert vendor["cardinality"] == 2
+        assert vendor["top_values"] == [["Acme", 2], ["Beta", 1]]
+        assert meta["column_stats"]["Amount"]["null_count"] == 1
+        assert meta["value_counts"]["Vendor"] == [["Acme", 2], ["Beta", 1]]
+        assert meta["stats_truncated"] is False
+
+    def test_wide_sheet_stats_fit_the_meta_item(self, lf):
+        """60 text columns of long distinct values would put ~700 KB of stats on META."""
+        mod, dynamodb, s3, *_ = lf
+        headers = [f"Note {c}" for c in range(60)]
+        rows = [[f"{c:02d}-{r:02d}-" + "x" * 240 for c in range(60)] for r in range(25)]
+        _upload(s3, _make_xlsx(headers, rows))
+        resp = mod.lambda_handler(_make_s3_event(), {})
+        assert json.loads(resp["body"])["status"] == "ok"
+        meta = dynamodb.Table(TABLE).get_item(Key={"pk": INDEX_ID, "sk": "META"})["Item"]
+        assert meta["status"] == "COMPLETE" and meta["stats_truncated"] is True
+        models = _load_models()
+        size = models._item_bytes({"column_stats": meta["column_stats"], "value_counts": meta["value_counts"]})
+        assert size <= models.STATS_MAX_BYTES
+        assert all(meta["column_stats"][f"Note_{c}"]["top_values"] for c in range(60))
@@ -2,25 +2,44 @@
 Write per-index metadata to the central Index Registry DynamoDB table.
 The chat Lambda reads these entries per-request and builds a single
 generic query_excel_index tool from them.
+
+Descriptions never hold up ingestion: an index without one is registered
+with a deterministic fallback (``description_source="fallback"``), and the
+parser generates the AI description asynchronously (``describe_index``).
+Generated descriptions are cached under ``pk=DESCRIPTIONS`` by a hash of
+(display name, columns), so re-uploads with an unchanged schema reuse them
+without calling the model.
 """
+import hashlib
 import json
 import os
+import threading
 from datetime import datetime, timezone
 
 import boto3
+from botocore.exceptions import ClientError
 
 REGISTRY_TABLE = os.environ.get("INDEX_REGISTRY_TABLE", "")
 PK = "TOOLS"
-
-_ddb = None
+CACHE_PK = "DESCRIPTIONS"
+SOURCE_FALLBACK = "fallback"
+SOURCE_GENERATED = "generated"
+FALLBACK_MAX_COLUMNS = 6
+
+# Per-thread DynamoDB resources: boto3 resources aren't thread-safe, and the
+# parser registers worksheet sub-indexes from a thread pool.
+_ddb: threading.local | None = None
 _bedrock = None
 
 
 def _get_table():
     global _ddb
     if _ddb is None:
-        _ddb = boto3.resource("dynamodb")
-    return _ddb.Table(REGISTRY_TABLE)
+        _ddb = threading.local()
+    resource = getattr(_ddb, "resource", None)
+    if resource is None:
+        resource = _ddb.resource = boto3.session.Session().resource("dynamodb")
+    return resource.Table(REGISTRY_TABLE)
 
 
 def _get_bedrock():
@@ -63,6 +82,26 @@ def _generate_description(display_name: str, columns: list[str], sample_rows: li
     return ""
 
 
+def schema_hash(display_name: str, columns: list[str]) -> str:
+    """Cache key for a generated description: hash of the display name and column list."""
+    return hashlib.sha256(json.dumps([display_name, columns]).encode("utf-8")).hexdigest()[:32]
+
+
+def fallback_description(display_name: str, columns: list[str], row_count: int) -> str:
+    """Deterministic stand-in description, published until the AI one is ready."""
+    fields = [c.replace("_", " ") for c in columns[:FALLBACK_MAX_COLUMNS]]
+    more = f" and {len(columns) - FALLBACK_MAX_COLUMNS} more" if len(columns) > FALLBACK_MAX_COLUMNS else ""
+    return f"{display_name}: {row_count} rows covering {', '.join(fields)}{more}."
+
+
+def _cached_description(table, key: str) -> str:
+    try:
+        return table.get_item(Key={"pk": CACHE_PK, "sk": key}).get("Item", {}).get("description", "") or ""
+    except Exception as e:
+        print(f"Description cache lookup failed: {e}")
+        return ""
+
+
 def write_to_registry(
     index_name: str,
     display_name: str,
@@ -70,24 +109,44 @@ def write_to_registry(
     row_count: int,
     sample_rows: list[dict] | None = None,
     date_columns: list[str] | None = None,
-) -> None:
-    """Persist index metadata to the registry table. Preserves existing description or generates one."""
+    parent_index_id: str | None = None,
+) -> bool:
+    """Persist index metadata to the registry table without calling the model.
+
+    A description set by an admin is always kept. Otherwise, when there is
+    none yet, it is a fallback, or it was generated for a different schema,
+    the cached description for this schema is used; failing that, a
+    fallback is published (a generated one for an older schema stays up
+    meanwhile). Returns True when the caller should generate the AI
+    description (``describe_index``).
+
+    ``parent_index_id`` marks a worksheet sub-index, which the admin API and
+    UI manage only through its parent (no upload or delete of its own).
+    """
     if not REGISTRY_TABLE:
         print("INDEX_REGISTRY_TABLE not set; skipping registry write.")
-        return
+        return False
 
     table = _get_table()
 
-    existing_desc = ""
+    existing = {}
     try:
         existing = table.get_item(Key={"pk": PK, "sk": index_name}).get("Item", {})
-        existing_desc = existing.get("description", "") or ""
     except Exception:
         pass
 
-    description = existing_desc
-    if not description and sample_rows:
-        description = _generate_description(display_name, columns, sample_rows)
+    key = schema_hash(display_name, columns)
+    description = existing.get("description", "") or ""
+    source = existing.get("description_source")
+    pending = False
+    if not description or (source and (source == SOURCE_FALLBACK or existing.get("schema_hash") != key)):
+        cached = _cached_description(table, key)
+        if cached:
+            description, source = cached, SOURCE_GENERATED
+        else:
+            if not description or source == SOURCE_FALLBACK:
+                description, source = fallback_description(display_name, columns, row_count), SOURCE_FALLBACK
+            pending = bool(sample_rows)
 
     item = {
         "pk": PK,
@@ -98,16 +157,63 @@ def write_to_registry(
         "row_count": row_count,
         "last_updated": datetime.now(timezone.utc).isoformat(),
         "status": "COMPLETE",
+        "schema_hash": key,
     }
     if description:
         item["description"] = description
+    if source:
+        item["description_source"] = source
     if isinstance(date_columns, list):
         # May legitimately be empty — an empty list tells the chat Lambda the
         # index has no date columns (vs. absent = legacy item, unknown).
         item["date_columns"] = date_columns
+    if parent_index_id:
+        item["parent_index_id"] = parent_index_id
 
     table.put_item(Item=item)
     print(f"Wrote index metadata for '{index_name}' to registry ({len(columns)} columns, {row_count} rows).")
+    return pending
+
+
+def describe_index(index_name: str, display_name: str, columns: list[str], sample_rows: list[dict]) -> str:
+    """Generate the AI description for an index, cache it and publish it.
+
+    The registry item is only updated while it is still registered with this
+    schema and an automatic description, so a description edited by an
+    admin, or a newer upload with different columns, is never overwritten.
+    Returns the description ("" if generation failed; the fallback then
+    stays in place).
+    """
+    if not REGISTRY_TABLE:
+        return ""
+    table = _get_table()
+    key = schema_hash(display_name, columns)
+    description = _cached_description(table, key)
+    if not description:
+        description = _generate_description(display_name, columns, sample_rows)
+        if not description:
+            return ""
+        table.put_item(Item={
+            "pk": CACHE_PK,
+            "sk": key,
+            "description": description,
+            "created": datetime.now(timezone.utc).isoformat(),
+        })
+    try:
+        table.update_item(
+            Key={"pk": PK, "sk": index_name},
+            UpdateExpression="SET description = :d, description_source = :g",
+            ConditionExpression="schema_hash = :h AND description_source IN (:f, :g)",
+            ExpressionAttributeValues={
+                ":d": description, ":g": SOURCE_GENERATED, ":h": key, ":f": SOURCE_FALLBACK,
+            },
+        )
+        print(f"Published description for '{index_name}'.")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        print(f"Registry entry for '{index_name}' changed since upload; description cached only.")
+    return description
 
 
 def delete_from_registry(index_name: str) -> None:
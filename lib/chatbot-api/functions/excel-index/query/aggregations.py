@@ -0,0 +1,144 @@
+"""
+Declarative multi-aggregation for the Excel index query Lambda.
+
+A request's ``aggregations`` list (count, count_unique, sum, avg, min, max,
+percentile) is evaluated together with an optional multi-column
+``aggregate_by`` in a single pass over the matched rows: each row is assigned
+to its group once and every aggregation's accumulator is updated in the same
+loop. Numeric aggregations read the snapshot's typed numbers and min/max use
+its sort keys, so nothing is parsed per row and results agree with
+``min_value``/``max_value``.
+"""
+from typing import Any, Iterable
+
+from snapshot import IndexSnapshot
+
+# Groups beyond this many are dropped from the response (``truncated`` is set).
+MAX_AGGREGATION_GROUPS = 500
+
+EMPTY_GROUP = "(empty)"
+
+
+def aggregation_name(agg: dict[str, Any]) -> str:
+    """Output key for an aggregation: its ``name``, else derived from op and column."""
+    if agg.get("name"):
+        return agg["name"]
+    op = agg["op"]
+    if op == "count":
+        return "count"
+    if op == "percentile":
+        return f"p{agg['percentile']:g}_{agg['column']}"
+    return f"{op}_{agg['column']}"
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    """Linear-interpolated percentile (same definition as NumPy's default)."""
+    values.sort()
+    pos = (len(values) - 1) * pct / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def run_aggregations(
+    snap: IndexSnapshot,
+    ids: Iterable[int],
+    aggregations: list[dict[str, Any]],
+    aggregate_by: list[str] | None = None,
+) -> dict[str, Any]:
+    """Evaluate ``aggregations`` over rows ``ids``, grouped by ``aggregate_by``.
+
+    Returns ``{"by", "groups", "group_count", "truncated"}`` where each group
+    is ``{"key": {column: value}, "values": {name: result}}``. Blank group
+    values are reported as "(empty)"; groups are ordered by key. An
+    aggregation with no usable values in a group reports None (count_unique
+    reports 0).
+    """
+    by = list(aggregate_by or [])
+    key_cols = [snap.column(c) for c in by]
+    specs = []
+    for agg in aggregations:
+        op, col = agg["op"], agg.get("column")
+        if op in ("sum", "avg", "percentile"):
+            vals = snap.numbers(col)
+        elif op in ("min", "max"):
+            vals = snap.sort_keys(col)
+        elif op == "count_unique":
+            vals = snap.column(col)
+        else:
+            vals = None
+        specs.append((aggregation_name(agg), op, col, vals, agg.get("percentile")))
+
+    def new_state() -> list:
+        state: list[Any] = [0]
+        for _, op, _, _, _ in specs:
+            if op in ("sum", "avg"):
+                state.append([0.0, 0])
+            elif op == "percentile":
+                state.append([])
+            elif op in ("min", "max"):
+                state.append([None, None])
+            elif op == "count_unique":
+                state.append(set())
+            else:
+                state.append(None)
+        return state
+
+    groups: dict[tuple, list] = {}
+    for i in ids:
+        key = tuple(str(c[i] or "").strip() or EMPTY_GROUP for c in key_cols)
+        state = groups.get(key)
+        if state is None:
+            state = groups[key] = new_state()
+        state[0] += 1
+        for j, (_, op, _, vals, _) in enumerate(specs, start=1):
+            if vals is None:
+                continue
+            v = vals[i]
+            if v is None:
+                continue
+            acc = state[j]
+            if op in ("sum", "avg"):
+                acc[0] += v
+                acc[1] += 1
+            elif op == "percentile":
+                acc.append(v)
+            elif op == "min":
+                if acc[0] is None or v < acc[0]:
+                    acc[0], acc[1] = v, i
+            elif op == "max":
+                if acc[0] is None or v > acc[0]:
+                    acc[0], acc[1] = v, i
+            else:
+                s = str(v).strip()
+                if s:
+                    acc.add(s)
+
+    if not by and not groups:
+        groups[()] = new_state()
+
+    out_groups = []
+    for key in sorted(groups)[:MAX_AGGREGATION_GROUPS]:
+        state = groups[key]
+        values: dict[str, Any] = {}
+        for j, (name, op, col, _, pct) in enumerate(specs, start=1):
+            acc = state[j]
+            if op == "count":
+                values[name] = state[0]
+            elif op == "sum":
+                values[name] = acc[0] if acc[1] else None
+            elif op == "avg":
+                values[name] = acc[0] / acc[1] if acc[1] else None
+            elif op == "percentile":
+                values[name] = _percentile(acc, pct) if acc else None
+            elif op in ("min", "max"):
+                values[name] = snap.display_value(col, acc[1]) if acc[1] is not None else None
+            else:
+                values[name] = len(acc)
+        out_groups.append({"key": dict(zip(by, key)), "values": values})
+    return {
+        "by": by,
+        "groups": out_groups,
+        "group_count": len(groups),
+        "truncated": len(groups) > MAX_AGGREGATION_GROUPS,
+    }
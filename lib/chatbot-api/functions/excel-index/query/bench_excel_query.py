@@ -0,0 +1,266 @@
+"""
+Scale benchmark for the Excel index query engine.
+
+Generates reproducible synthetic indexes (vendor / contract / state /
+category / date / amount columns, fixed seed) at 1k, 10k, 100k and 500k rows
+and times every query shape the agent uses against each of them, on both
+engines. Each shape is timed twice: ``cold_ms`` on a freshly loaded snapshot
+(derived columns built on first use, as after an upload) and ``warm_ms``, the
+median of repeated runs on the same snapshot (a warm container). ``load_ms``
+is the cost of decoding the parser-published S3 snapshot.
+
+The query Lambda is loaded the same way ``test_excel_query.py`` loads it,
+inside moto's ``mock_aws`` so nothing can reach AWS; rows are handed to
+``_do_query`` as a snapshot, so the numbers measure the engine rather than
+moto.
+
+Results are written as JSON. Timings are also stored relative to a fixed
+pure-Python calibration loop, which makes a baseline recorded on one machine
+comparable on another. With ``--baseline`` the run fails (exit status 1)
+when any shape's warm time got slower than ``--tolerance`` times its
+baseline ratio, or when a shape matches a different number of rows::
+
+    # record / refresh the committed baseline
+    python bench_excel_query.py --sizes 1000,10000,100000,500000 --output bench_baseline.json
+
+    # CI: compare the small sizes against it
+    python bench_excel_query.py --sizes 1000,10000 --baseline bench_baseline.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Callable
+
+_QUERY_DIR = os.path.dirname(os.path.abspath(__file__))
+_LAYER_DIR = os.path.abspath(
+    os.path.join(_QUERY_DIR, "..", "..", "layers", "python-common", "python")
+)
+for _p in (_LAYER_DIR, _QUERY_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+from abe_utils.excel_snapshot import TYPE_DATE, TYPE_NUMBER, decode_snapshot, encode_snapshot  # noqa: E402
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 500_000)
+COLUMNS = ["Vendor", "Contract_Number", "State", "Category", "Start_Date", "End_Date", "Amount"]
+TYPED_COLUMNS = {"Start_Date": TYPE_DATE, "End_Date": TYPE_DATE, "Amount": TYPE_NUMBER}
+VERSION = "2025-01-01T00:00:00+00:00"
+
+# Query shapes timed at every size: name -> _do_query keyword arguments.
+SHAPES: dict[str, dict[str, Any]] = {
+    "free_text": {"free_text": "northwind", "limit": 50},
+    "filters": {"filters": {"Vendor": "acme", "State": "CA"}, "limit": 50},
+    "fuzzy": {"fuzzy": {"Vendor": "Northwnd Logistcs"}, "count_only": True},
+    "date_range": {"date_after": {"End_Date": "2025-01-01"},
+                   "date_before": {"End_Date": "2026-01-01"}, "count_only": True},
+    "group_by": {"group_by": "State", "count_only": True},
+    "sort_limit": {"sort_by": "Amount", "sort_order": "desc", "limit": 50},
+    "distinct": {"distinct_values": "Category", "count_only": True},
+    "aggregations": {"aggregate_by": ["Category"], "count_only": True, "aggregations": [
+        {"op": "count"}, {"op": "sum", "column": "Amount"},
+        {"op": "percentile", "column": "Amount", "percentile": 90}]},
+}
+
+_PREFIXES = ["Acme", "Northwind", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Tyrell",
+             "Cyberdyne", "Soylent", "Hooli", "Vandelay", "Wonka", "Oscorp", "Aperture"]
+_SUFFIXES = ["Logistics", "Industries", "Consulting", "Construction", "Health", "Systems",
+             "Services", "Supply", "Engineering", "Foods"]
+_FORMS = ["Inc.", "LLC", "Corp.", "Co.", ""]
+_STATES = ["CA", "NV", "OR", "WA", "AZ", "TX", "NY", "FL", "IL", "CO", "UT", "NM", "ID", "MT"]
+_CATEGORIES = ["IT", "Facilities", "Fleet", "Medical", "Office Supplies", "Construction",
+               "Professional Services", "Food Service", "Janitorial", "Security", "Travel", "Energy"]
+
+
+def generate_rows(n: int, seed: int = 7) -> list[dict[str, str]]:
+    """``n`` synthetic contract rows, identical for a given seed."""
+    rng = random.Random(seed)
+    vendors = [
+        " ".join(p for p in (a, b, f) if p) + ("" if k == 0 else f" {k}")
+        for k in range(4) for a in _PREFIXES for b in _SUFFIXES for f in _FORMS
+    ]
+    epoch = date(2020, 1, 1)
+    rows = []
+    for i in range(n):
+        start = epoch + timedelta(days=rng.randrange(6 * 365))
+        end = start + timedelta(days=rng.choice((365, 730, 1095, 1825)))
+        row = {
+            "Vendor": rng.choice(vendors),
+            "Contract_Number": f"C{i:07d}",
+            "State": rng.choice(_STATES),
+            "Category": rng.choice(_CATEGORIES),
+            # Mixed date formats, as in real uploads.
+            "Start_Date": start.isoformat() if i % 3 else start.strftime("%m/%d/%Y"),
+            "End_Date": end.isoformat(),
+            "Amount": f"{rng.lognormvariate(10, 1.5):.2f}",
+        }
+        if i % 50 == 0:
+            row["Amount"] = ""
+        rows.append(row)
+    return rows
+
+
+def load_query_module():
+    """Load ``lambda_function.py`` by path, as the tests do (call inside ``mock_aws``)."""
+    os.environ.setdefault("TABLE_NAME", "bench-excel-table")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+    spec_m = importlib.util.spec_from_file_location("models", os.path.join(_QUERY_DIR, "models.py"))
+    models_mod = importlib.util.module_from_spec(spec_m)
+    sys.modules["models"] = models_mod
+    spec_m.loader.exec_module(models_mod)
+    spec = importlib.util.spec_from_file_location(
+        "excel_query_bench_lf", os.path.join(_QUERY_DIR, "lambda_function.py")
+    )
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _timeit(fn: Callable[[], Any]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+def calibrate(repeat: int = 5) -> float:
+    """Median milliseconds of a fixed pure-Python workload (sorting, hashing, string ops)."""
+    rng = random.Random(1)
+    data = [f"{rng.random():.12f}" for _ in range(100_000)]
+
+    def work():
+        counts: dict[str, int] = {}
+        for s in sorted(data):
+            k = s[2:5]
+            counts[k] = counts.get(k, 0) + 1
+        return counts
+
+    return statistics.median(_timeit(work) for _ in range(repeat))
+
+
+def run_benchmarks(
+    mod,
+    sizes=DEFAULT_SIZES,
+    engines=("python", "numpy"),
+    repeat: int = 5,
+    shapes: dict[str, dict[str, Any]] | None = None,
+) -> dict[str, Any]:
+    """Time every shape at every size on every available engine.
+
+    Returns ``{"calibration_ms", "results": {"<rows>/<engine>/<shape>": {...}}}``
+    where each entry holds ``cold_ms``, ``warm_ms``, their ratios to the
+    calibration time, and ``total_matches`` (a cheap check that every engine
+    and size ran the same query).
+    """
+    shapes = shapes or SHAPES
+    engines = [e for e in engines if e != "numpy" or mod.vector_engine.AVAILABLE]
+    calibration = calibrate()
+    results: dict[str, dict[str, Any]] = {}
+    for n in sizes:
+        rows = generate_rows(n)
+        blob = encode_snapshot(VERSION, COLUMNS, rows, TYPED_COLUMNS)
+
+        def load():
+            header, decoded = decode_snapshot(blob)
+            return mod.IndexSnapshot.from_rows(VERSION, header["columns"], decoded,
+                                               header.get("typed_columns"))
+
+        load_ms = statistics.median(_timeit(load) for _ in range(max(1, min(repeat, 3))))
+        results[f"{n}/load"] = {"warm_ms": round(load_ms, 3),
+                                "warm_ratio": round(load_ms / calibration, 5)}
+        for engine in engines:
+            for name, params in shapes.items():
+                snap = load()
+                out: dict[str, Any] = {}
+
+                def query():
+                    mod._cursor_cache.clear()
+                    out.update(mod._do_query(pk="bench", snap=snap, engine=engine, **params))
+
+                cold = _timeit(query)
+                warm = statistics.median(_timeit(query) for _ in range(repeat))
+                results[f"{n}/{engine}/{name}"] = {
+                    "cold_ms": round(cold, 3),
+                    "warm_ms": round(warm, 3),
+                    "cold_ratio": round(cold / calibration, 5),
+                    "warm_ratio": round(warm / calibration, 5),
+                    "total_matches": out["total_matches"],
+                }
+    return {"calibration_ms": round(calibration, 3), "results": results}
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], tolerance: float,
+            min_ms: float = 5.0) -> list[str]:
+    """Regressions of ``current`` against ``baseline``, as readable lines.
+
+    A warm timing regresses when its calibration ratio exceeds the baseline
+    ratio by more than ``tolerance`` times. Cold timings are single runs and
+    too noisy to gate on, so they are only reported; so are warm timings
+    under ``min_ms``. Entries missing from the baseline are skipped.
+    Differing ``total_matches`` always fail: the engine changed behaviour.
+    """
+    problems = []
+    for key, cur in sorted(current["results"].items()):
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        if "total_matches" in base and cur.get("total_matches") != base["total_matches"]:
+            problems.append(f"{key}: total_matches {cur.get('total_matches')} != {base['total_matches']}")
+        ratio, base_ratio = cur.get("warm_ratio"), base.get("warm_ratio")
+        if ratio is None or base_ratio is None or cur["warm_ms"] < min_ms:
+            continue
+        if ratio > base_ratio * tolerance:
+            problems.append(f"{key}: warm {cur['warm_ms']:.1f} ms is {ratio / base_ratio:.1f}x the baseline")
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="comma-separated row counts")
+    parser.add_argument("--engines", default="python,numpy")
+    parser.add_argument("--shapes", default=",".join(SHAPES), help="comma-separated shape names")
+    parser.add_argument("--repeat", type=int, default=5, help="warm runs per shape")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", help="baseline JSON to check against")
+    parser.add_argument("--tolerance", type=float, default=3.0,
+                        help="allowed slowdown factor versus the baseline")
+    args = parser.parse_args(argv)
+
+    from moto import mock_aws
+
+    with mock_aws():
+        mod = load_query_module()
+        report = run_benchmarks(
+            mod,
+            sizes=[int(s) for s in args.sizes.split(",")],
+            engines=args.engines.split(","),
+            repeat=args.repeat,
+            shapes={k: SHAPES[k] for k in args.shapes.split(",")},
+        )
+
+    print(f"calibration: {report['calibration_ms']:.1f} ms")
+    for key, r in report["results"].items():
+        cold = f"cold {r['cold_ms']:9.2f} ms  " if "cold_ms" in r else " " * 19
+        print(f"{key:40s} {cold}warm {r['warm_ms']:9.2f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for line in problems:
+            print(f"REGRESSION {line}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Approximate (edit-distance) matching for the Excel index query Lambda.
+
+``filters`` match normalized substrings, so a misspelled vendor name ("Acme
+Corporaton") finds nothing and the agent has to guess variations. A ``fuzzy``
+filter instead keeps a row when every word of the needle is within a small
+Levenshtein distance of some word in the column.
+
+Each column gets a BK-tree over its distinct normalized words plus word -> row
+posting lists, built lazily and kept with the snapshot like any other derived
+column. A lookup only descends the tree branches the triangle inequality
+allows, so it computes distances against a small part of the vocabulary
+instead of running Levenshtein over every row.
+"""
+from array import array
+from typing import Any
+
+from snapshot import IndexSnapshot, norm_text
+
+# Closest distinct values reported per fuzzy column.
+MAX_FUZZY_MATCHES = 10
+
+
+def levenshtein(a: str, b: str, limit: int | None = None) -> int:
+    """Edit distance between ``a`` and ``b``.
+
+    With ``limit``, gives up as soon as the distance must exceed it and
+    returns ``limit + 1``.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        cur = [i]
+        for j, cb in enumerate(b, start=1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if limit is not None and min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+class BKTree:
+    """Burkhard-Keller tree over a set of words under Levenshtein distance."""
+
+    def __init__(self, words=()):
+        # node = (word, {distance: child node})
+        self._root: tuple[str, dict] | None = None
+        for w in words:
+            self.add(w)
+
+    def add(self, word: str) -> None:
+        if self._root is None:
+            self._root = (word, {})
+            return
+        node = self._root
+        while True:
+            d = levenshtein(word, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> list[tuple[int, str]]:
+        """``(distance, word)`` for every stored word within ``max_distance`` of ``word``."""
+        out = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_word, children = stack.pop()
+            # Pruning children needs the exact distance, so no early exit here.
+            d = levenshtein(word, node_word)
+            if d <= max_distance:
+                out.append((d, node_word))
+            for dist, child in children.items():
+                if abs(dist - d) <= max_distance:
+                    stack.append(child)
+        return out
+
+
+def default_max_distance(word: str) -> int:
+    """Typos tolerated per word: none for short words, 1 up to 6 characters, else 2."""
+    if len(word) <= 3:
+        return 0
+    return 1 if len(word) <= 6 else 2
+
+
+def _column_index(snap: IndexSnapshot, col: str) -> tuple[BKTree, dict[str, array]]:
+    """BK-tree of the distinct words of ``col`` and word -> ascending row ids."""
+    def build():
+        postings: dict[str, array] = {}
+        for i, text in enumerate(snap.norm_column(col)):
+            for word in set(text.split()):
+                p = postings.get(word)
+                if p is None:
+                    p = postings[word] = array("I")
+                p.append(i)
+        return BKTree(postings), postings
+    return snap.derived(("fuzzy", col), build)
+
+
+def fuzzy_scores(
+    snap: IndexSnapshot,
+    col: str,
+    needle: str,
+    max_distance: int | None = None,
+) -> dict[int, int] | None:
+    """Row id -> summed edit distance for rows of ``col`` matching every word of ``needle``.
+
+    Each needle word matches its closest word in the cell, within
+    ``max_distance`` edits (default: ``default_max_distance`` of the word).
+    Returns None when the normalized needle is empty, i.e. no constraint.
+    """
+    words = norm_text(needle).split()
+    if not words:
+        return None
+    tree, postings = _column_index(snap, col)
+    scores: dict[int, int] | None = None
+    for word in words:
+        limit = default_max_distance(word) if max_distance is None else max_distance
+        best: dict[int, int] = {}
+        for d, hit in tree.search(word, limit):
+            for i in postings[hit]:
+                if d < best.get(i, limit + 1):
+                    best[i] = d
+        if scores is None:
+            scores = best
+        else:
+            scores = {i: s + best[i] for i, s in scores.items() if i in best}
+        if not scores:
+            break
+    return scores
+
+
+def closest_values(
+    snap: IndexSnapshot,
+    col: str,
+    scores: dict[int, int],
+    ids: Any,
+) -> list[dict[str, Any]]:
+    """Distinct values of ``col`` among ``ids``, closest first: ``[{"value", "distance"}]``."""
+    vals = snap.column(col)
+    best: dict[str, int] = {}
+    for i in ids:
+        i = int(i)
+        d = scores.get(i)
+        if d is None:
+            continue
+        v = str(vals[i] or "").strip()
+        if d < best.get(v, d + 1):
+            best[v] = d
+    ranked = sorted(best.items(), key=lambda kv: (kv[1], kv[0]))[:MAX_FUZZY_MATCHES]
+    return [{"value": v, "distance": d} for v, d in ranked]
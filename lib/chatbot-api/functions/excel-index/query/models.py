@@ -6,12 +6,29 @@ from typing import Any, Literal, Optional
 from pydantic import BaseModel, Field, model_validator
 
 
-class QueryIndexRequest(BaseModel):
-    """Request payload for query Lambda (agent or REST)."""
-    action: Literal["query", "status", "preview"] = "query"
-    index_name: str
+class Aggregation(BaseModel):
+    """One entry of ``aggregations``: an operation over a column."""
+    op: Literal["count", "count_unique", "sum", "avg", "min", "max", "percentile"]
+    column: Optional[str] = None
+    percentile: Optional[float] = Field(default=None, ge=0, le=100)
+    name: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_arguments(self):
+        if self.op != "count" and not self.column:
+            raise ValueError(f"{self.op} aggregation requires column")
+        if (self.op == "percentile") != (self.percentile is not None):
+            raise ValueError("percentile is required for, and only allowed with, op 'percentile'")
+        return self
+
+
+class QuerySpec(BaseModel):
+    """Filtering, aggregation and paging options for one query."""
     free_text: Optional[str] = None
     filters: Optional[dict[str, Any]] = None
+    # Typo-tolerant column matches (edit distance per word), e.g. {"Vendor": "acme corporaton"}.
+    fuzzy: Optional[dict[str, str]] = None
+    fuzzy_max_distance: Optional[int] = Field(default=None, ge=0, le=3)
     date_before: Optional[dict[str, str]] = None
     date_after: Optional[dict[str, str]] = None
     count_only: bool = False
@@ -26,7 +43,12 @@ class QueryIndexRequest(BaseModel):
     columns: Optional[list[str]] = None
     limit: int = Field(default=100, ge=1, le=500)
     offset: int = Field(default=0, ge=0)
-    preview_rows: int = Field(default=10, ge=1, le=50)
+    # Opaque ``next_cursor`` from the previous page of the same query.
+    cursor: Optional[str] = None
+    aggregations: Optional[list[Aggregation]] = Field(default=None, min_length=1, max_length=20)
+    aggregate_by: Optional[list[str]] = Field(default=None, min_length=1, max_length=3)
+    # None = the deployment default (QUERY_ENGINE); results are identical.
+    engine: Optional[Literal["python", "numpy"]] = None
 
     @model_validator(mode="after")
     def group_max_requires_group(self):
@@ -34,6 +56,39 @@ class QueryIndexRequest(BaseModel):
             raise ValueError("group_by_value_max requires group_by")
         return self
 
+    @model_validator(mode="after")
+    def aggregate_by_requires_aggregations(self):
+        if self.aggregate_by and not self.aggregations:
+            raise ValueError("aggregate_by requires aggregations")
+        return self
+
+    @model_validator(mode="after")
+    def cursor_excludes_offset(self):
+        if self.cursor and self.offset:
+            raise ValueError("cursor and offset are mutually exclusive")
+        return self
+
+
+class BatchSubQuery(QuerySpec):
+    """One entry of a batch request; ``index_name`` defaults to the request's."""
+    index_name: Optional[str] = None
+
+
+class QueryIndexRequest(QuerySpec):
+    """Request payload for query Lambda (agent or REST)."""
+    action: Literal["query", "status", "preview", "batch"] = "query"
+    index_name: str
+    preview_rows: int = Field(default=10, ge=1, le=50)
+    queries: Optional[list[BatchSubQuery]] = Field(default=None, min_length=1, max_length=20)
+    # Return the invocation's work breakdown as ``_profile`` (metrics are emitted regardless).
+    profile: bool = False
+
+    @model_validator(mode="after")
+    def batch_requires_queries(self):
+        if self.action == "batch" and not self.queries:
+            raise ValueError("batch requires queries")
+        return self
+
 
 class StatusResponse(BaseModel):
     status: Literal["NO_DATA", "PROCESSING", "COMPLETE", "ERROR"] = "NO_DATA"
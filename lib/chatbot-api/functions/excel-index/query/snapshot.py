@@ -0,0 +1,356 @@
+"""
+Columnar in-memory snapshot of a single Excel index partition.
+
+The query Lambda keeps one of these per index in warm-container memory so
+repeat queries against an unchanged index skip DynamoDB entirely. Values are
+stored column-by-column (one Python list per column, aligned by row id) which
+keeps the per-row overhead low and lets the engine evaluate a predicate over a
+whole column at once instead of materializing a dict per row.
+
+A missing attribute is stored as ``None`` so that ``row(i)`` reproduces the
+original DynamoDB item shape exactly (minus ``pk``/``sk``).
+
+Derived columns (normalized text, date ordinals, sort keys, ...) are computed
+lazily on first use and kept for the snapshot's lifetime, so their cost is
+paid once per snapshot load rather than once per query. Columns the parser
+typed at ingest (``typed_columns`` in the published snapshot) arrive with
+their date ordinals / floats precomputed and are never re-parsed.
+
+Large snapshots can also carry trigram posting lists over the normalized text
+(``trigram_candidates``). Every substring of length >= 3 shares all of its
+trigrams with the text containing it, so intersecting the needle's posting
+lists yields a superset of the matching rows that the exact check then
+confirms -- selective lookups touch a handful of rows instead of all of them.
+
+``estimated_bytes`` approximates what a snapshot holds in memory, derived
+columns included, so the query Lambda can bound its cache by bytes.
+"""
+import re
+import sys
+from array import array
+from datetime import date
+from typing import Any, Callable, Iterable
+
+from abe_utils.excel_snapshot import TYPE_DATE, TYPE_NUMBER, parse_number_like, typed_value
+
+# Row item attribute the parser stores each row's spreadsheet position in.
+ROW_POSITION = "_pos"
+SKIP_FIELDS = {"pk", "sk", ROW_POSITION}
+
+# Joins per-cell normalized text in ``row_text``. Normalized needles can never
+# contain it (``norm_text`` strips everything but word chars and spaces), so a
+# free-text match can't straddle two cells.
+CELL_SEP = "\x00"
+
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_MULTI_WS = re.compile(r'\s+')
+
+
+def norm_text(s: str) -> str:
+    """Strip punctuation and collapse whitespace for fuzzy substring matching."""
+    return _MULTI_WS.sub(' ', _PUNCT_RE.sub('', s)).strip().lower()
+
+
+# Elements per list sampled by ``_approx_bytes``, and CPython's per-slot and
+# per-dict-entry overheads.
+_SIZE_SAMPLE = 64
+_SLOT_BYTES = 8
+_DICT_ENTRY_BYTES = 100
+
+
+def _approx_bytes(obj: Any) -> int:
+    """Rough deep size of a snapshot structure (lists, dicts, tuples, arrays).
+
+    A list is measured on an evenly spaced sample of its elements and scaled
+    to its length; NumPy and ``array`` buffers report their exact size.
+    """
+    if obj is None:
+        return 0
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(obj, array):
+        return sys.getsizeof(obj)
+    if isinstance(obj, list):
+        n = len(obj)
+        if not n:
+            return sys.getsizeof(obj)
+        sample = obj[::max(1, n // _SIZE_SAMPLE)]
+        per_item = sum(_approx_bytes(v) for v in sample) / len(sample)
+        return sys.getsizeof([]) + int(n * (_SLOT_BYTES + per_item))
+    if isinstance(obj, tuple):
+        return sys.getsizeof(obj) + sum(_approx_bytes(v) for v in obj)
+    if isinstance(obj, dict):
+        return sum(_DICT_ENTRY_BYTES + _approx_bytes(v) for v in obj.values())
+    if isinstance(obj, set):
+        return sys.getsizeof(obj) + len(obj) * _SLOT_BYTES
+    return sys.getsizeof(obj)
+
+
+def _trigrams(s: str) -> set[str]:
+    """Distinct 3-character substrings of ``s`` (empty for strings shorter than 3)."""
+    return {s[j:j + 3] for j in range(len(s) - 2)}
+
+
+def row_order(item: dict) -> tuple:
+    """Order row items by spreadsheet position.
+
+    The parser stores each row's position in ``_pos`` (its sort key is a
+    content hash); indexes ingested before that used bare row numbers as
+    sort keys, which are ordered numerically ('2' before '10').
+    """
+    pos = item.get(ROW_POSITION)
+    if pos is not None:
+        return (0, int(pos), "")
+    s = str(item.get("sk"))
+    return (1, int(s), "") if s.isdigit() else (2, 0, s)
+
+
+class IndexSnapshot:
+    """Immutable, column-oriented copy of one index's data rows.
+
+    ``version`` is the META ``last_updated`` stamp the rows were read under;
+    the cache treats a snapshot as valid only while META still carries the
+    same stamp. ``None`` means the snapshot must not be cached.
+    """
+
+    def __init__(self, version: str | None, columns: list[str], values: dict[str, list], n_rows: int,
+                 typed: dict[str, tuple[str, list]] | None = None):
+        self.version = version
+        self.columns = columns
+        self.values = values
+        self.n_rows = n_rows
+        # column -> (kind, typed values) as published by the parser
+        self.typed = typed or {}
+        # column -> parser statistics from META (cardinality, null rate, top values)
+        self.column_stats: dict[str, dict] = {}
+        self._derived: dict[tuple, Any] = {}
+        self._base_bytes: int | None = None
+        # (number of derived entries, their estimated size) -- entries are
+        # only ever added, so the count tells when to re-measure.
+        self._derived_bytes = (0, 0)
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[dict],
+        version: str | None = None,
+        column_order: list[str] | None = None,
+    ) -> "IndexSnapshot":
+        """Build a snapshot from raw DynamoDB items (META items are skipped).
+
+        Rows are ordered by their spreadsheet position (``row_order``), so the
+        snapshot matches the parser-published one whatever order the items
+        arrive in. Columns
+        follow ``column_order`` (the META column list) with any extra
+        attributes appended in first-seen order.
+        """
+        rows = [it for it in items if it.get("sk") != "META"]
+        rows.sort(key=row_order)
+        columns: list[str] = []
+        seen: set[str] = set()
+        for col in column_order or []:
+            if col not in seen:
+                seen.add(col)
+                columns.append(col)
+        for it in rows:
+            for k in it:
+                if k not in SKIP_FIELDS and k not in seen:
+                    seen.add(k)
+                    columns.append(k)
+        values = {col: [it.get(col) for it in rows] for col in columns}
+        return cls(version, columns, values, len(rows))
+
+    @classmethod
+    def from_rows(
+        cls,
+        version: str | None,
+        columns: list[str],
+        rows: list[list],
+        typed_columns: list[list[str]] | None = None,
+    ) -> "IndexSnapshot":
+        """Build a snapshot from positional rows aligned with ``columns``.
+
+        This is the shape of the parser-published S3 snapshot
+        (``abe_utils.excel_snapshot``); rows are already in spreadsheet order
+        and carry one trailing typed value per ``[column, kind]`` pair in
+        ``typed_columns``.
+        """
+        values = {col: [r[j] for r in rows] for j, col in enumerate(columns)}
+        base = len(columns)
+        typed = {
+            col: (kind, [r[base + k] for r in rows])
+            for k, (col, kind) in enumerate(typed_columns or [])
+        }
+        return cls(version, list(columns), values, len(rows), typed)
+
+    def estimated_bytes(self) -> int:
+        """Approximate memory held by the snapshot: values, typed values and derived columns.
+
+        Grows as queries build derived columns (``row_text``, trigram
+        postings, ...). The values are measured once and the derived
+        columns again only after one is added, so repeat calls are cheap.
+        """
+        if self._base_bytes is None:
+            self._base_bytes = _approx_bytes(self.values) + _approx_bytes(self.typed)
+        count, size = self._derived_bytes
+        if count != len(self._derived):
+            count, size = len(self._derived), _approx_bytes(self._derived)
+            self._derived_bytes = (count, size)
+        return self._base_bytes + size
+
+    def row(self, i: int) -> dict[str, Any]:
+        """Reconstruct row ``i`` as a dict of present attributes."""
+        return {col: self.values[col][i] for col in self.columns if self.values[col][i] is not None}
+
+    def column(self, col: str) -> list:
+        """Return the value list for ``col`` (all ``None`` when the column is absent)."""
+        vals = self.values.get(col)
+        return vals if vals is not None else [None] * self.n_rows
+
+    def derived(self, key: tuple, build: Callable[[], Any]) -> Any:
+        """Return the derived value cached under ``key``, building it on first use.
+
+        Lets query engines keep their own per-snapshot structures (e.g. NumPy
+        arrays) alongside the built-in derived columns.
+        """
+        out = self._derived.get(key)
+        if out is None:
+            out = build()
+            self._derived[key] = out
+        return out
+
+    def display_value(self, col: str, i: int) -> str:
+        """Cell ``i`` of ``col`` as reported by min/max: ISO form for dates, else stripped text."""
+        ordinal = self.date_ordinals(col)[i]
+        if ordinal is not None:
+            return date.fromordinal(ordinal).isoformat()
+        return str(self.column(col)[i]).strip()
+
+    def norm_column(self, col: str) -> list[str]:
+        """Normalized text of every cell in ``col`` (missing/empty cells become "")."""
+        key = ("norm", col)
+        out = self._derived.get(key)
+        if out is None:
+            out = [norm_text(str(v or "")) for v in self.column(col)]
+            self._derived[key] = out
+        return out
+
+    def row_text(self) -> list[str | None]:
+        """Per-row normalized text of every present cell, joined by ``CELL_SEP``.
+
+        ``None`` marks a row with no attributes at all, which no free-text
+        search can match.
+        """
+        key = ("row_text",)
+        out = self._derived.get(key)
+        if out is None:
+            cols = [self.values[c] for c in self.columns]
+            out = []
+            for i in range(self.n_rows):
+                cells = [norm_text(str(vals[i])) for vals in cols if vals[i] is not None]
+                out.append(CELL_SEP.join(cells) if cells else None)
+            self._derived[key] = out
+        return out
+
+    def date_ordinals(self, col: str) -> list[int | None]:
+        """Date ordinal of every cell in ``col`` (None where the cell isn't a date)."""
+        key = ("dates", col)
+        out = self._derived.get(key)
+        if out is None:
+            kind, typed = self.typed.get(col, (None, None))
+            if kind == TYPE_DATE:
+                out = typed
+            elif kind == TYPE_NUMBER:
+                # A numeric cell never parses as a date; only the rest need a look.
+                out = [None if t is not None else typed_value(TYPE_DATE, v)
+                       for v, t in zip(self.column(col), typed)]
+            else:
+                out = [typed_value(TYPE_DATE, v) for v in self.column(col)]
+            self._derived[key] = out
+        return out
+
+    def numbers(self, col: str) -> list[float | None]:
+        """Float value of every cell in ``col`` (None where the cell isn't numeric)."""
+        key = ("numbers", col)
+        out = self._derived.get(key)
+        if out is None:
+            kind, typed = self.typed.get(col, (None, None))
+            if kind == TYPE_NUMBER:
+                out = typed
+            else:
+                out = [None if v is None else parse_number_like(v) for v in self.column(col)]
+            self._derived[key] = out
+        return out
+
+    def sort_keys(self, col: str) -> list[tuple | None]:
+        """Comparable ``(priority, value)`` key for every cell in ``col``.
+
+        Dates (as ordinals) and numbers get priority 0 and plain strings
+        (lower-cased) priority 1, so typed values always rank ahead of text
+        and mixed columns never compare a number with a string. Blank or
+        missing cells map to None.
+        """
+        key = ("sort", col)
+        out = self._derived.get(key)
+        if out is None:
+            dates = self.date_ordinals(col)
+            nums = self.numbers(col)
+            out = []
+            for v, d, n in zip(self.column(col), dates, nums):
+                if d is not None:
+                    out.append((0, d))
+                elif n is not None:
+                    out.append((0, n))
+                else:
+                    s = "" if v is None else str(v).strip()
+                    out.append((1, s.lower()) if s else None)
+            self._derived[key] = out
+        return out
+
+    def trigram_postings(self, col: str | None = None) -> dict[str, array]:
+        """Trigram -> ascending row ids, over ``norm_column(col)`` or ``row_text()`` when ``col`` is None.
+
+        Posting lists are compact ``array('I')`` buffers; the index is built on
+        first use and kept with the snapshot like any other derived column.
+        """
+        key = ("trigrams", col)
+        out = self._derived.get(key)
+        if out is None:
+            texts = self.row_text() if col is None else self.norm_column(col)
+            out = {}
+            for i, text in enumerate(texts):
+                if not text:
+                    continue
+                for gram in _trigrams(text):
+                    postings = out.get(gram)
+                    if postings is None:
+                        postings = out[gram] = array("I")
+                    postings.append(i)
+            self._derived[key] = out
+        return out
+
+    def trigram_candidates(self, needle: str, col: str | None = None) -> list[int] | None:
+        """Ascending ids of rows that contain every trigram of a normalized ``needle``.
+
+        The result is a superset of the rows whose text contains ``needle``;
+        callers still apply the exact substring check. Returns None when the
+        needle is too short to have trigrams, i.e. no narrowing is possible.
+        """
+        grams = _trigrams(needle)
+        if not grams:
+            return None
+        postings = self.trigram_postings(col)
+        lists = []
+        for gram in grams:
+            p = postings.get(gram)
+            if p is None:
+                return []
+            lists.append(p)
+        lists.sort(key=len)
+        out = set(lists[0])
+        for p in lists[1:]:
+            if not out:
+                break
+            out.intersection_update(p)
+        return sorted(out)
@@ -1,5 +1,5 @@
 """
-Unit tests for the Excel Index Query Lambda (_do_query, _row_matches, _norm, etc.).
+Unit tests for the Excel Index Query Lambda (_do_query, _match_ids, _norm, etc.).
 Uses moto to mock DynamoDB — no real AWS calls made.
 """
 import datetime
@@ -185,6 +185,25 @@ class TestFreeText:
         result = mod._do_query(pk=INDEX, free_text="zzznomatch")
         assert result["total_matches"] == 0
 
+    def test_match_does_not_span_cells(self, lf):
+        """"acme corp" must not match Vendor="Acme" + Type="Corp" in adjacent columns."""
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed(table, [{"Vendor": "Acme", "Type": "Corp"}])
+        result = mod._do_query(pk=INDEX, free_text="acme corp")
+        assert result["total_matches"] == 0
+
+    def test_columns_normalized_once_per_snapshot(self, lf):
+        """Cached snapshots reuse normalized text; only the needle is normalized per query."""
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed_complete(table, [{"Vendor": f"Vendor {i}"} for i in range(20)])
+        mod._do_query(pk=INDEX, free_text="vendor 1", filters={"Vendor": "vendor"})
+        snapshot_mod = sys.modules["snapshot"]
+        with patch.object(snapshot_mod, "norm_text", side_effect=AssertionError("re-normalized")):
+            result = mod._do_query(pk=INDEX, free_text="vendor 1", filters={"Vendor": "vendor"})
+        assert result["total_matches"] == 11
+
 
 # ---------------------------------------------------------------------------
 # Column filters
@@ -358,6 +377,61 @@ class TestSortBy:
         names = [r["Name"] for r in result["rows"]]
         assert names == ["Charlie", "Beta", "Alpha"]
 
+    def test_top_k_page_matches_full_sort(self, lf):
+        """The bounded-heap path returns the same page, ties included, as a stable sort."""
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        rows = [{"id": str(i), "Due": f"2024-0{1 + i % 4}-01"} for i in range(20)]
+        _seed(table, rows)
+        for order in ("asc", "desc"):
+            full = mod._do_query(pk=INDEX, sort_by="Due", sort_order=order, limit=20)["rows"]
+            for offset in (0, 3):
+                page = mod._do_query(pk=INDEX, sort_by="Due", sort_order=order, offset=offset, limit=4)
+                assert page["rows"] == full[offset:offset + 4]
+                assert page["total_matches"] == 20
+
+
+class TestTypedValues:
+    def test_max_compares_numbers_numerically(self, lf):
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed(table, [{"Amount": "9"}, {"Amount": "100"}, {"Amount": "25"}])
+        result = mod._do_query(pk=INDEX, max_value="Amount", min_value="Amount")
+        assert result["max"]["value"] == "100"
+        assert result["min"]["value"] == "9"
+
+    def test_mixed_date_number_text_sort(self, lf):
+        """Dates, numbers and text in one column sort without type errors."""
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed(table, [{"V": "zeta"}, {"V": "2024-01-01"}, {"V": "5"}])
+        result = mod._do_query(pk=INDEX, sort_by="V")
+        assert [r["V"] for r in result["rows"]] == ["5", "2024-01-01", "zeta"]
+
+    def test_published_typed_dates_are_not_reparsed(self, lf):
+        from datetime import date
+        from abe_utils.excel_snapshot import encode_snapshot
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        version = "2025-03-01T00:00:00+00:00"
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="test-index-bucket")
+        rows = [{"End": "2024-01-05"}, {"End": "2026-06-01"}]
+        s3.put_object(
+            Bucket="test-index-bucket", Key="indexes/TEST_INDEX/snapshot.jsonl.gz",
+            Body=encode_snapshot(version, ["End"], rows, {"End": "date"}),
+        )
+        table.put_item(Item={
+            "pk": INDEX, "sk": "META", "row_count": 2, "status": "COMPLETE",
+            "last_updated": version, "snapshot_key": "indexes/TEST_INDEX/snapshot.jsonl.gz",
+        })
+        mod.BUCKET = "test-index-bucket"
+        mod.S3 = s3
+        with patch("snapshot.typed_value", side_effect=AssertionError("reparsed")):
+            result = mod._do_query(pk=INDEX, date_after={"End": "2025-01-01"}, max_value="End")
+        assert [r["End"] for r in result["rows"]] == ["2026-06-01"]
+        assert result["max"]["value"] == date(2026, 6, 1).isoformat()
+
 
 # ---------------------------------------------------------------------------
 # column projection
@@ -375,6 +449,256 @@ class TestColumnProjection:
         assert "Amount" not in row
 
 
+# ---------------------------------------------------------------------------
+# Warm-container snapshot cache
+# ---------------------------------------------------------------------------
+
+def _seed_complete(table, rows: list[dict], last_updated: str = "2025-01-01T00:00:00+00:00"):
+    """Seed rows plus a parser-style COMPLETE META item (cacheable snapshot)."""
+    _seed(table, rows)
+    table.put_item(Item={
+        "pk": INDEX, "sk": "META", "row_count": len(rows),
+        "status": "COMPLETE", "last_updated": last_updated,
+    })
+
+
+class TestSnapshotCache:
+    def test_repeat_query_skips_partition_read(self, lf):
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed_complete(table, [{"Vendor": "Acme"}, {"Vendor": "Beta"}])
+        assert mod._do_query(pk=INDEX)["total_matches"] == 2
+
+        with patch.object(mod, "_read_partition", side_effect=AssertionError("partition re-read")):
+            result = mod._do_query(pk=INDEX, free_text="acme")
+        assert result["total_matches"] == 1
+
+    def test_new_last_updated_invalidates_snapshot(self, lf):
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed_complete(table, [{"Vendor": "Acme"}])
+        assert mod._do_query(pk=INDEX)["total_matches"] == 1
+
+        table.put_item(Item={"pk": INDEX, "sk": "ROW#0001", "Vendor": "Beta"})
+        _seed_complete(table, [{"Vendor": "Acme"}, {"Vendor": "Beta"}],
+                       last_updated="2025-02-01T00:00:00+00:00")
+        assert mod._do_query(pk=INDEX)["total_matches"] == 2
+
+    def test_processing_index_is_not_cached(self, lf):
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed_complete(table, [{"Vendor": "Acme"}])
+        table.update_item(
+            Key={"pk": INDEX, "sk": "META"},
+            UpdateExpression="SET #s = :s",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={":s": "PROCESSING"},
+        )
+        mod._do_query(pk=INDEX)
+        assert INDEX not in mod._snapshot_cache
+
+    def test_rows_read_from_generation_partition(self, lf):
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed_complete(table, [{"Vendor": "Stale"}])
+        for i, vendor in enumerate(["Acme", "Beta"]):
+            table.put_item(Item={"pk": f"{INDEX}#g2", "sk": str(i), "Vendor": vendor})
+        table.update_item(Key={"pk": INDEX, "sk": "META"},
+                          UpdateExpression="SET data_pk = :p, row_count = :n",
+                          ExpressionAttributeValues={":p": f"{INDEX}#g2", ":n": 2})
+        result = mod._do_query(pk=INDEX)
+        assert sorted(r["Vendor"] for r in result["rows"]) == ["Acme", "Beta"]
+        assert mod._do_preview(INDEX, 5)["rows"][0]["Vendor"] == "Acme"
+
+    def test_row_count_mismatch_is_not_cached(self, lf):
+        """A partition that doesn't match META's row_count may be mid-write."""
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed_complete(table, [{"Vendor": "Acme"}])
+        table.put_item(Item={"pk": INDEX, "sk": "ROW#0009", "Vendor": "Stray"})
+        assert mod._do_query(pk=INDEX)["total_matches"] == 2
+        assert INDEX not in mod._snapshot_cache
+
+    def test_cold_load_uses_published_s3_snapshot(self, lf):
+        from abe_utils.excel_snapshot import encode_snapshot
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        version = "2025-03-01T00:00:00+00:00"
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="test-index-bucket")
+        s3.put_object(
+            Bucket="test-index-bucket", Key="indexes/TEST_INDEX/snapshot.jsonl.gz",
+            Body=encode_snapshot(version, ["Vendor"], [{"Vendor": "Acme"}, {"Vendor": "Beta"}]),
+        )
+        table.put_item(Item={
+            "pk": INDEX, "sk": "META", "row_count": 2, "status": "COMPLETE",
+            "last_updated": version, "snapshot_key": "indexes/TEST_INDEX/snapshot.jsonl.gz",
+        })
+        mod.BUCKET = "test-index-bucket"
+        mod.S3 = s3
+        with patch.object(mod, "_read_partition", side_effect=AssertionError("partition read")):
+            result = mod._do_query(pk=INDEX, free_text="beta")
+        assert result["total_matches"] == 1
+        assert mod._snapshot_cache[INDEX].version == version
+
+    def test_stale_s3_snapshot_falls_back_to_partition(self, lf):
+        from abe_utils.excel_snapshot import encode_snapshot
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="test-index-bucket")
+        s3.put_object(
+            Bucket="test-index-bucket", Key="indexes/TEST_INDEX/snapshot.jsonl.gz",
+            Body=encode_snapshot("2024-01-01T00:00:00+00:00", ["Vendor"], [{"Vendor": "Old"}]),
+        )
+        _seed_complete(table, [{"Vendor": "New"}])
+        table.update_item(
+            Key={"pk": INDEX, "sk": "META"},
+            UpdateExpression="SET snapshot_key = :k",
+            ExpressionAttributeValues={":k": "indexes/TEST_INDEX/snapshot.jsonl.gz"},
+        )
+        mod.BUCKET = "test-index-bucket"
+        mod.S3 = s3
+        result = mod._do_query(pk=INDEX)
+        assert [r["Vendor"] for r in result["rows"]] == ["New"]
+
+    def test_rows_follow_numeric_sort_key_order(self, lf):
+        """Parser sort keys are '0'..'N'; the snapshot orders them numerically."""
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        for i in (0, 1, 2, 10):
+            table.put_item(Item={"pk": INDEX, "sk": str(i), "id": str(i)})
+        result = mod._do_query(pk=INDEX)
+        assert [r["id"] for r in result["rows"]] == ["0", "1", "2", "10"]
+
+
+    def test_estimated_bytes_scale_with_rows_and_derived_columns(self, lf):
+        mod, _ = lf
+        rows = [{"Vendor": f"Vendor number {i}", "State": "CA"} for i in range(2000)]
+        small = mod.IndexSnapshot.from_items(rows[:200], version="v1")
+        big = mod.IndexSnapshot.from_items(rows, version="v1")
+        assert 8 * small.estimated_bytes() < big.estimated_bytes() < 12 * small.estimated_bytes()
+        before = big.estimated_bytes()
+        big.row_text()
+        assert big.estimated_bytes() > before * 1.3
+
+    def test_cache_evicts_by_estimated_bytes(self, lf):
+        mod, _ = lf
+        rows = [{"Vendor": f"Vendor number {i}"} for i in range(500)]
+        snaps = {f"IDX_{n}": mod.IndexSnapshot.from_items(rows, version="v1") for n in range(3)}
+        mod.SNAPSHOT_CACHE_MAX_BYTES = int(snaps["IDX_0"].estimated_bytes() * 2.5)
+        for pk, snap in snaps.items():
+            mod._snapshot_cache[pk] = snap
+            mod._trim_snapshot_cache()
+        assert list(mod._snapshot_cache) == ["IDX_1", "IDX_2"]
+
+        # Derived columns built by queries count too, checked on the next hit
+        snaps["IDX_1"].row_text()
+        assert mod._cached_snapshot("IDX_2", "v1") is snaps["IDX_2"]
+        assert list(mod._snapshot_cache) == ["IDX_2"]
+
+    def test_snapshot_over_budget_is_served_but_not_kept(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), [{"Vendor": "Acme"}, {"Vendor": "Beta"}])
+        mod.SNAPSHOT_CACHE_MAX_BYTES = 10
+        assert mod._do_query(pk=INDEX, free_text="beta")["total_matches"] == 1
+        assert INDEX not in mod._snapshot_cache
+
+
+class TestRowOrder:
+    """Every read path returns rows in spreadsheet order (parser keys: content hashes, order in ``_pos``)."""
+    VERSION = "2025-04-01T00:00:00+00:00"
+    ROWS = [{"Id": f"row{i:02d}", "Vendor": f"V{i}"} for i in range(12)]
+
+    def _seed_parser_keys(self, table, status="COMPLETE"):
+        import hashlib
+        table.put_item(Item={"pk": INDEX, "sk": "META", "row_count": len(self.ROWS), "status": status,
+                             "last_updated": self.VERSION, "columns": ["Id", "Vendor"]})
+        # Written out of order, with hashes that don't sort like the rows
+        for i in (11, 2, 7, 0, 9, 1, 3, 10, 4, 8, 5, 6):
+            digest = hashlib.blake2b(self.ROWS[i]["Id"].encode(), digest_size=10).hexdigest()
+            table.put_item(Item={"pk": INDEX, "sk": digest, "_pos": (i + 1) << 20, **self.ROWS[i]})
+
+    def _ids(self, body):
+        return [r["Id"] for r in body["rows"]]
+
+    def _call(self, mod, **event):
+        return json.loads(mod.lambda_handler({"index_name": INDEX, **event}, {})["body"])
+
+    def test_preview_follows_spreadsheet_order(self, lf):
+        mod, dynamodb = lf
+        self._seed_parser_keys(dynamodb.Table(TABLE))
+        body = self._call(mod, action="preview", preview_rows=5)
+        assert self._ids(body) == ["row00", "row01", "row02", "row03", "row04"]
+        assert all("_pos" not in row for row in body["rows"]) and body["columns"] == ["Id", "Vendor"]
+
+    def test_unsorted_query_order_matches_across_read_paths(self, lf):
+        from abe_utils.excel_snapshot import encode_snapshot
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        expected = [f"row{i:02d}" for i in range(5)]
+
+        # DynamoDB, whole partition (COMPLETE, no published snapshot)
+        self._seed_parser_keys(table)
+        assert self._ids(self._call(mod, action="query", limit=5)) == expected
+
+        # DynamoDB pushdown (PROCESSING index, projected columns)
+        mod._snapshot_cache.clear()
+        mod._result_cache.clear()
+        self._seed_parser_keys(table, status="PROCESSING")
+        assert self._ids(self._call(mod, action="query", limit=5, columns=["Id"])) == expected
+
+        # Parser-published S3 snapshot
+        mod._snapshot_cache.clear()
+        mod._result_cache.clear()
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="test-index-bucket")
+        s3.put_object(Bucket="test-index-bucket", Key="indexes/TEST_INDEX/snapshot.jsonl.gz",
+                      Body=encode_snapshot(self.VERSION, ["Id", "Vendor"], self.ROWS))
+        self._seed_parser_keys(table)
+        table.update_item(Key={"pk": INDEX, "sk": "META"}, UpdateExpression="SET snapshot_key = :k",
+                          ExpressionAttributeValues={":k": "indexes/TEST_INDEX/snapshot.jsonl.gz"})
+        mod.BUCKET, mod.S3 = "test-index-bucket", s3
+        with patch.object(mod, "_read_partition", side_effect=AssertionError("partition read")):
+            assert self._ids(self._call(mod, action="query", limit=5)) == expected
+
+
+class TestTrigramIndex:
+    ROWS = [
+        {"Vendor": "Acme Corp", "Contract": "C-1001"},
+        {"Vendor": "Beta, LLC.", "Contract": "C-2002"},
+        {"Vendor": "Gamma Acme", "Contract": "C-3003"},
+        {"Vendor": "Delta", "Contract": "AC"},
+    ]
+
+    def test_prefiltered_results_match_linear_scan(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), self.ROWS)
+        queries = [
+            {"free_text": "acme"}, {"free_text": "beta llc"}, {"free_text": "ac"},
+            {"filters": {"Vendor": "acme"}}, {"filters": {"Contract": "2002"}},
+            {"filters": {"Vendor": "zzz"}}, {"free_text": "acme", "filters": {"Contract": "3003"}},
+        ]
+        linear = [mod._do_query(pk=INDEX, **q)["total_matches"] for q in queries]
+        mod.TRIGRAM_MIN_ROWS = 0
+        indexed = [mod._do_query(pk=INDEX, **q)["total_matches"] for q in queries]
+        assert indexed == linear == [2, 1, 3, 2, 1, 0, 1]
+
+    def test_candidates_narrow_to_rows_holding_every_trigram(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), self.ROWS)
+        snap = mod._load_snapshot(dynamodb.Table(TABLE), INDEX, mod._get_meta(dynamodb.Table(TABLE), INDEX))
+        assert snap.trigram_candidates("acme", "Vendor") == [0, 2]
+        assert snap.trigram_candidates("acme xyz") == []
+        assert snap.trigram_candidates("ac") is None
+
+    def test_small_snapshots_skip_the_index(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), self.ROWS)
+        mod._do_query(pk=INDEX, free_text="acme")
+        assert not any(k[0] == "trigrams" for k in mod._snapshot_cache[INDEX]._derived)
+
+
 # ---------------------------------------------------------------------------
 # lambda_handler integration
 # ---------------------------------------------------------------------------
@@ -406,3 +730,625 @@ class TestLambdaHandler:
         body = json.loads(resp["body"])
         assert body["status"] == "COMPLETE"
         assert body["row_count"] == 5
+
+    def test_status_processing_while_new_generation_pending(self, lf):
+        mod, dynamodb = lf
+        dynamodb.Table(TABLE).put_item(Item={"pk": INDEX, "sk": "META", "row_count": 5,
+                                             "status": "COMPLETE", "pending_generation": 3})
+        body = json.loads(mod.lambda_handler({"action": "status", "index_name": INDEX}, {})["body"])
+        assert body["status"] == "PROCESSING"
+        assert body["has_data"] is True
+
+
+# ---------------------------------------------------------------------------
+# batch action
+# ---------------------------------------------------------------------------
+
+class TestBatch:
+    def test_batch_runs_each_query_in_order(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), [
+            {"Contract_ID": "C1", "Vendor": "Acme"},
+            {"Contract_ID": "C1", "Vendor": "Acme"},
+            {"Contract_ID": "C2", "Vendor": "Beta"},
+        ])
+        event = {"action": "batch", "index_name": INDEX, "queries": [
+            {"free_text": "acme", "limit": 1},
+            {"free_text": "acme", "count_only": True, "count_unique": "Contract_ID", "group_by": "Contract_ID"},
+        ]}
+        body = json.loads(mod.lambda_handler(event, {})["body"])
+        detail, summary = body["results"]
+        assert detail["index_name"] == INDEX
+        assert detail["total_matches"] == 2 and detail["returned"] == 1
+        assert summary["unique_count"] == 1
+        assert summary["groups"] == {"C1": 2}
+
+    def test_batch_reads_each_index_once(self, lf):
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed(table, [{"Vendor": "Acme"}])
+        table.put_item(Item={"pk": "OTHER", "sk": "0", "Vendor": "Zed"})
+        queries = [{"count_only": True}, {"free_text": "acme"}, {"index_name": "OTHER"}]
+        with patch.object(mod, "_read_partition", wraps=mod._read_partition) as read:
+            out = mod._do_batch(INDEX, [sys.modules["models"].BatchSubQuery(**q) for q in queries])
+        assert [c.args[1] for c in read.call_args_list] == [INDEX, "OTHER"]
+        assert [r["total_matches"] for r in out["results"]] == [1, 1, 1]
+        assert out["results"][2]["index_name"] == "OTHER"
+
+    def test_failing_sub_query_does_not_fail_batch(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), [{"Vendor": "Acme"}])
+        event = {"action": "batch", "index_name": INDEX, "queries": [
+            {"count_only": True}, {"count_only": True},
+        ]}
+        real = mod._do_query
+        calls = []
+
+        def flaky(**kw):
+            calls.append(kw)
+            if len(calls) == 2:
+                raise RuntimeError("boom")
+            return real(**kw)
+
+        with patch.object(mod, "_do_query", side_effect=flaky):
+            body = json.loads(mod.lambda_handler(event, {})["body"])
+        assert body["results"][0]["total_matches"] == 1
+        assert body["results"][1] == {"index_name": INDEX, "error": "boom"}
+
+    def test_batch_without_queries_is_rejected(self, lf):
+        mod, _ = lf
+        resp = mod.lambda_handler({"action": "batch", "index_name": INDEX}, {})
+        assert resp["statusCode"] == 400
+
+
+# ---------------------------------------------------------------------------
+# result cache
+# ---------------------------------------------------------------------------
+
+class TestResultCache:
+    EVENT = {"action": "query", "index_name": INDEX, "free_text": "acme", "count_only": True}
+
+    def test_repeat_query_served_from_cache(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), [{"Vendor": "Acme"}, {"Vendor": "Beta"}])
+        first = json.loads(mod.lambda_handler(dict(self.EVENT), {})["body"])
+        with patch.object(mod, "_do_query", side_effect=AssertionError("recomputed")):
+            second = json.loads(mod.lambda_handler(dict(self.EVENT), {})["body"])
+        assert first == second
+        assert second["total_matches"] == 1
+
+    def test_key_ignores_field_order_and_defaults(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), [{"Vendor": "Acme"}])
+        mod.lambda_handler({"index_name": INDEX, "filters": {"Vendor": "acme"}, "limit": 100}, {})
+        with patch.object(mod, "_do_query", side_effect=AssertionError("recomputed")):
+            resp = mod.lambda_handler({"filters": {"Vendor": "acme"}, "index_name": INDEX}, {})
+        assert json.loads(resp["body"])["total_matches"] == 1
+
+    def test_new_upload_invalidates_entries(self, lf):
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed_complete(table, [{"Vendor": "Acme"}])
+        mod.lambda_handler(dict(self.EVENT), {})
+        _seed_complete(table, [{"Vendor": "Acme"}, {"Vendor": "Acme 2"}],
+                       last_updated="2025-02-01T00:00:00+00:00")
+        body = json.loads(mod.lambda_handler(dict(self.EVENT), {})["body"])
+        assert body["total_matches"] == 2
+        assert {k[1] for k in mod._result_cache} == {"2025-02-01T00:00:00+00:00"}
+
+    def test_processing_index_results_not_cached(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), [{"Vendor": "Acme"}])
+        mod.lambda_handler(dict(self.EVENT), {})
+        assert not mod._result_cache
+
+    def test_byte_cap_evicts_least_recently_used(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), [{"Vendor": "Acme"}, {"Vendor": "Beta"}])
+        mod.RESULT_CACHE_MAX_BYTES = 400
+        for needle in ("acme", "beta", "zzz", "a", "b", "e"):
+            mod.lambda_handler({"index_name": INDEX, "free_text": needle}, {})
+        assert 0 < mod._result_cache_bytes <= 400
+        assert mod._result_cache_bytes == sum(len(v) for v in mod._result_cache.values())
+        assert not any('"acme"' in k[2] for k in mod._result_cache)
+
+
+# ---------------------------------------------------------------------------
+# NumPy engine
+# ---------------------------------------------------------------------------
+
+@pytest.mark.skipif(importlib.util.find_spec("numpy") is None, reason="numpy not installed")
+class TestNumpyEngine:
+    @staticmethod
+    def _rows(n: int = 60) -> list[dict]:
+        vendors = ["Acme", "Beta, LLC.", "Gamma", "", "acme"]
+        dates = ["2024-01-05", "01/15/2025", "", "n/a", "2026-07-01", "2023-12-31"]
+        amounts = ["100", "9", "2,5", "", "25.5", "x"]
+        rows = []
+        for i in range(n):
+            row = {"id": str(i), "Vendor": vendors[i % 5], "End": dates[i % 6], "Amount": amounts[i % 4]}
+            if i % 7 == 0:
+                del row["Amount"]
+            rows.append(row)
+        return rows
+
+    QUERIES = [
+        {},
+        {"free_text": "acme"},
+        {"filters": {"Vendor": "beta llc"}},
+        {"filters": {"Missing": "x"}},
+        {"date_before": {"End": "2025-06-01"}, "date_after": {"End": "2024-01-01"}},
+        {"count_unique": "Vendor", "distinct_values": "Amount", "count_only": True},
+        {"group_by": "Vendor", "group_by_value_max": "End"},
+        {"group_by": "Amount", "group_by_value_max": "Vendor", "free_text": "a"},
+        {"min_value": "Amount", "max_value": "End"},
+        {"min_value": "Vendor", "max_value": "Amount", "filters": {"Vendor": "zzz"}},
+        {"sort_by": "End", "limit": 7, "offset": 3},
+        {"sort_by": "Amount", "sort_order": "desc", "limit": 50},
+        {"sort_by": "Vendor", "sort_order": "desc", "limit": 5, "columns": ["id"]},
+    ]
+
+    def test_engines_return_identical_results(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), self._rows())
+        mod.TRIGRAM_MIN_ROWS = 10
+        for q in self.QUERIES:
+            expected = mod._do_query(pk=INDEX, engine="python", **q)
+            actual = mod._do_query(pk=INDEX, engine="numpy", **q)
+            assert actual == expected, q
+
+    def test_request_engine_overrides_deployment_default(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), self._rows(10))
+        mod.QUERY_ENGINE = "numpy"
+        with patch.object(mod._PYTHON_ENGINE, "match_ids", side_effect=AssertionError("python")):
+            resp = mod.lambda_handler({"index_name": INDEX, "group_by": "Vendor"}, {})
+        body = json.loads(resp["body"])
+        assert sum(body["groups"].values()) == 10
+        with patch.object(mod._NUMPY_ENGINE, "match_ids", side_effect=AssertionError("numpy")):
+            resp = mod.lambda_handler({"index_name": INDEX, "engine": "python", "count_only": True}, {})
+        assert json.loads(resp["body"])["total_matches"] == 10
+
+    def test_numpy_falls_back_when_unavailable(self, lf):
+        mod, _ = lf
+        with patch.object(mod.vector_engine, "AVAILABLE", False):
+            assert mod._engine("numpy") is mod._PYTHON_ENGINE
+
+
+# ---------------------------------------------------------------------------
+# projection / filter pushdown
+# ---------------------------------------------------------------------------
+
+class TestPushdown:
+    ROWS = [
+        {"Vendor": "Acme", "Contract": "C1", "End": "2025-01-01", "Notes": "x" * 50},
+        {"Vendor": "Beta", "Contract": "C2", "End": "2026-01-01", "Notes": "y" * 50},
+        {"Contract": "C3", "End": "2027-01-01", "Notes": "z" * 50},
+    ]
+
+    def _query(self, mod, **params):
+        event = {"action": "query", "index_name": INDEX, **params}
+        return json.loads(mod.lambda_handler(event, {})["body"])
+
+    def test_projects_only_needed_attributes(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)  # no status -> not cacheable
+        with patch.object(mod, "_read_partition", wraps=mod._read_partition) as read:
+            body = self._query(mod, filters={"Vendor": "acme"}, columns=["Contract"], sort_by="End")
+        assert read.call_args.args[2:] == (["Contract", "End", "Vendor"], ["Vendor"])
+        assert body["rows"] == [{"Contract": "C1"}]
+
+    def test_count_only_reads_sort_keys(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        with patch.object(mod, "_read_partition", wraps=mod._read_partition) as read:
+            body = self._query(mod, count_only=True, date_after={"End": "2025-06-01"})
+        assert read.call_args.args[2:] == (["End"], ["End"])
+        assert body["total_matches"] == 2
+
+    def test_whole_rows_when_needed(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        with patch.object(mod, "_read_partition", wraps=mod._read_partition) as read:
+            body = self._query(mod, free_text="beta", count_only=True)
+        assert read.call_args.args[2] is None
+        assert body["total_matches"] == 1
+
+    def test_projected_items_hold_only_requested_attributes(self, lf):
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed(table, self.ROWS)
+        items = mod._read_partition(table, INDEX, ["Vendor"], ["Vendor"])
+        assert sorted(it["Vendor"] for it in items) == ["Acme", "Beta"]
+        assert all(set(it) == {"sk", "Vendor"} for it in items)
+
+    def test_large_complete_index_is_not_cached(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), self.ROWS)
+        mod.SNAPSHOT_CACHE_MAX_ROWS = 2
+        body = self._query(mod, group_by="Vendor", count_only=True)
+        assert body["groups"] == {"(empty)": 1, "Acme": 1, "Beta": 1}
+        assert INDEX not in mod._snapshot_cache
+
+
+# ---------------------------------------------------------------------------
+# aggregations
+# ---------------------------------------------------------------------------
+
+class TestMultiAggregations:
+    ROWS = [
+        {"State": "CA", "Type": "IT", "Amount": "100", "End": "2025-01-01", "Vendor": "Acme"},
+        {"State": "CA", "Type": "IT", "Amount": "300", "End": "2026-01-01", "Vendor": "Beta"},
+        {"State": "CA", "Type": "Ops", "Amount": "50", "End": "2024-06-01", "Vendor": "Acme"},
+        {"State": "NV", "Type": "IT", "Amount": "", "End": "", "Vendor": "Acme"},
+        {"Type": "Ops", "Amount": "10", "Vendor": "Gamma"},
+    ]
+    AGGS = [
+        {"op": "count"},
+        {"op": "sum", "column": "Amount"},
+        {"op": "avg", "column": "Amount"},
+        {"op": "min", "column": "End"},
+        {"op": "max", "column": "Amount", "name": "largest"},
+        {"op": "percentile", "column": "Amount", "percentile": 50},
+        {"op": "count_unique", "column": "Vendor"},
+    ]
+
+    def test_ungrouped_aggregations(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        out = mod._do_query(pk=INDEX, count_only=True, aggregations=self.AGGS)["aggregations"]
+        assert out["by"] == [] and out["group_count"] == 1 and not out["truncated"]
+        assert out["groups"][0] == {"key": {}, "values": {
+            "count": 5, "sum_Amount": 460.0, "avg_Amount": 115.0, "min_End": "2024-06-01",
+            "largest": "300", "p50_Amount": 75.0, "count_unique_Vendor": 3,
+        }}
+
+    def test_multi_column_group_by(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        out = mod._do_query(
+            pk=INDEX, count_only=True, aggregate_by=["State", "Type"],
+            aggregations=[{"op": "count"}, {"op": "sum", "column": "Amount"}],
+        )["aggregations"]
+        assert [(g["key"]["State"], g["key"]["Type"], g["values"]["count"], g["values"]["sum_Amount"])
+                for g in out["groups"]] == [
+            ("(empty)", "Ops", 1, 10.0), ("CA", "IT", 2, 400.0),
+            ("CA", "Ops", 1, 50.0), ("NV", "IT", 1, None),
+        ]
+
+    def test_respects_filters_and_reads_rows_once(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        with patch.object(mod, "_read_partition", wraps=mod._read_partition) as read:
+            out = mod._do_query(
+                pk=INDEX, filters={"Type": "it"}, count_only=True, aggregate_by=["State"],
+                aggregations=[{"op": "avg", "column": "Amount"}, {"op": "max", "column": "End"}],
+            )["aggregations"]
+        assert read.call_count == 1
+        assert out["groups"] == [
+            {"key": {"State": "CA"}, "values": {"avg_Amount": 200.0, "max_End": "2026-01-01"}},
+            {"key": {"State": "NV"}, "values": {"avg_Amount": None, "max_End": None}},
+        ]
+
+    def test_group_cap_sets_truncated(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        with patch.object(sys.modules["aggregations"], "MAX_AGGREGATION_GROUPS", 2):
+            out = mod._do_query(pk=INDEX, aggregate_by=["Vendor"], aggregations=[{"op": "count"}])
+        agg = out["aggregations"]
+        assert agg["group_count"] == 3 and agg["truncated"] and len(agg["groups"]) == 2
+
+    def test_handler_validates_aggregations(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        bad = [
+            {"aggregations": [{"op": "sum"}]},
+            {"aggregations": [{"op": "percentile", "column": "Amount"}]},
+            {"aggregate_by": ["State"]},
+        ]
+        for extra in bad:
+            resp = mod.lambda_handler({"index_name": INDEX, **extra}, {})
+            assert resp["statusCode"] == 400, extra
+        resp = mod.lambda_handler({"index_name": INDEX, "count_only": True, "aggregations": [
+            {"op": "percentile", "column": "Amount", "percentile": 90}]}, {})
+        body = json.loads(resp["body"])
+        assert body["aggregations"]["groups"][0]["values"] == {"p90_Amount": pytest.approx(240.0)}
+
+
+# ---------------------------------------------------------------------------
+# column statistics
+# ---------------------------------------------------------------------------
+
+class TestColumnStats:
+    ROWS = [
+        {"State": "CA", "Vendor": "Acme"},
+        {"State": "CA", "Vendor": "Beta"},
+        {"State": "NV", "Vendor": "Acme"},
+        {"Vendor": "Gamma"},
+    ]
+    STATS = {
+        "State": {"type": "text", "cardinality": 2, "null_count": 1,
+                  "top_values": [["CA", 2], ["NV", 1]]},
+        "Vendor": {"type": "text", "cardinality": 3, "null_count": 0,
+                   "top_values": [["Acme", 2]]},  # incomplete: top_n cut it short
+    }
+
+    def _seed(self, table):
+        _seed_complete(table, self.ROWS)
+        table.update_item(Key={"pk": INDEX, "sk": "META"},
+                          UpdateExpression="SET column_stats = :s",
+                          ExpressionAttributeValues={":s": self.STATS})
+
+    def test_unfiltered_aggregates_answered_from_stats(self, lf):
+        mod, dynamodb = lf
+        self._seed(dynamodb.Table(TABLE))
+        params = {"count_only": True, "group_by": "State", "distinct_values": "State",
+                  "count_unique": "Vendor"}
+        with patch.object(mod, "_load_snapshot", side_effect=AssertionError("snapshot loaded")):
+            fast = mod._cached_query(dynamodb.Table(TABLE), INDEX, dict(params), {})
+        assert fast == mod._do_query(pk=INDEX, **params)
+        assert fast["groups"] == {"(empty)": 1, "CA": 2, "NV": 1}
+
+    def test_incomplete_top_values_fall_back_to_snapshot(self, lf):
+        mod, dynamodb = lf
+        self._seed(dynamodb.Table(TABLE))
+        assert mod._answer_from_stats(mod._get_meta(dynamodb.Table(TABLE), INDEX),
+                                      {"count_only": True, "group_by": "Vendor"}) is None
+        out = mod._cached_query(dynamodb.Table(TABLE), INDEX,
+                                {"count_only": True, "group_by": "Vendor"}, {})
+        assert out["groups"] == {"Acme": 2, "Beta": 1, "Gamma": 1}
+
+    def test_inexact_cardinality_not_used_for_count_unique(self, lf):
+        mod, dynamodb = lf
+        self._seed(dynamodb.Table(TABLE))
+        meta = mod._get_meta(dynamodb.Table(TABLE), INDEX)
+        meta["column_stats"]["Vendor"]["cardinality_exact"] = False
+        assert mod._answer_from_stats(meta, {"count_only": True, "count_unique": "Vendor"}) is None
+
+    def test_filtered_query_not_answered_from_stats(self, lf):
+        mod, dynamodb = lf
+        self._seed(dynamodb.Table(TABLE))
+        meta = mod._get_meta(dynamodb.Table(TABLE), INDEX)
+        assert mod._answer_from_stats(meta, {"count_only": True, "group_by": "State",
+                                             "filters": {"Vendor": "acme"}}) is None
+
+    def test_value_counts_serve_uncacheable_index_without_reading_rows(self, lf):
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        rows = [{"Category": f"C{i % 25:02d}"} for i in range(50)] + [{"Category": ""}]
+        _seed_complete(table, rows)
+        table.update_item(Key={"pk": INDEX, "sk": "META"},
+                          UpdateExpression="SET value_counts = :v",
+                          ExpressionAttributeValues={":v": {
+                              "Category": [[f"C{i:02d}", 2] for i in range(25)]}})
+        expected = mod._do_query(pk=INDEX, count_only=True, group_by="Category")
+        mod._snapshot_cache.clear()
+        mod.SNAPSHOT_CACHE_MAX_ROWS = 10
+        event = {"index_name": INDEX, "count_only": True, "group_by": "Category"}
+        with patch.object(mod, "_read_partition", side_effect=AssertionError("rows read")):
+            body = json.loads(mod.lambda_handler(event, {})["body"])
+        assert body == expected
+        assert len(body["groups"]) == 26 and body["groups"]["(empty)"] == 1
+
+    def test_filters_ordered_most_selective_first(self, lf):
+        mod, dynamodb = lf
+        snap = mod.IndexSnapshot.from_items(self.ROWS, version="v1")
+        snap.column_stats = self.STATS
+        ordered = mod._ordered_filters(snap, {"State": "ca", "Vendor": "gamma"})
+        assert [col for col, _ in ordered] == ["Vendor", "State"]
+
+
+# ---------------------------------------------------------------------------
+# cursors
+# ---------------------------------------------------------------------------
+
+class TestCursors:
+    ROWS = [{"Vendor": f"V{i:02d}", "Amount": str(i)} for i in range(25)]
+
+    def test_cursor_pages_match_offset_pages_without_rematching(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), self.ROWS)
+        query = {"sort_by": "Amount", "sort_order": "desc", "limit": 10}
+        first = mod._do_query(pk=INDEX, **query)
+        pages = [first["rows"]]
+        cursor = first["next_cursor"]
+        with patch.object(mod._PYTHON_ENGINE, "match_ids", side_effect=AssertionError("rematched")):
+            while cursor:
+                out = mod._do_query(pk=INDEX, cursor=cursor, **query)
+                pages.append(out["rows"])
+                cursor = out.get("next_cursor")
+        expected = [mod._do_query(pk=INDEX, offset=o, **query)["rows"] for o in (0, 10, 20)]
+        assert pages == expected
+        assert [r["Amount"] for r in pages[2]] == ["4", "3", "2", "1", "0"]
+
+    def test_pages_stay_consistent_across_reupload(self, lf):
+        mod, dynamodb = lf
+        table = dynamodb.Table(TABLE)
+        _seed_complete(table, self.ROWS)
+        first = mod._do_query(pk=INDEX, limit=20)
+        _seed_complete(table, [{"Vendor": "New"}], last_updated="2025-02-01T00:00:00+00:00")
+        second = mod._do_query(pk=INDEX, limit=20, cursor=first["next_cursor"])
+        assert [r["Vendor"] for r in second["rows"]] == [f"V{i}" for i in range(20, 25)]
+        assert "next_cursor" not in second
+
+        mod._cursor_cache.clear()
+        with pytest.raises(ValueError, match="expired"):
+            mod._do_query(pk=INDEX, limit=20, cursor=first["next_cursor"])
+
+    def test_cursor_rejected_for_other_query_or_with_offset(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), self.ROWS)
+        cursor = mod._do_query(pk=INDEX, limit=10)["next_cursor"]
+        with pytest.raises(ValueError, match="different query"):
+            mod._do_query(pk=INDEX, limit=10, free_text="v1", cursor=cursor)
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            mod._do_query(pk=INDEX, cursor="not-a-cursor")
+        resp = mod.lambda_handler({"index_name": INDEX, "cursor": cursor, "offset": 10}, {})
+        assert resp["statusCode"] == 400
+
+    def test_cursor_entries_hold_ids_not_snapshots(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), self.ROWS)
+        first = mod._do_query(pk=INDEX, limit=10)
+        (entry,) = mod._cursor_cache.values()
+        assert not any(isinstance(part, mod.IndexSnapshot) for part in entry)
+
+        # Evicting the snapshot drops its cursors; the next page re-runs the query
+        mod._drop_snapshot(INDEX)
+        assert not mod._cursor_cache
+        second = mod._do_query(pk=INDEX, limit=10, cursor=first["next_cursor"])
+        assert [r["Vendor"] for r in second["rows"]] == [f"V{i}" for i in range(10, 20)]
+
+    @pytest.mark.skipif(importlib.util.find_spec("numpy") is None, reason="numpy not installed")
+    def test_engine_can_change_between_pages(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), self.ROWS)
+        query = {"sort_by": "Amount", "group_by": "Vendor", "min_value": "Amount", "limit": 10}
+        first = mod._do_query(pk=INDEX, engine="python", **query)
+        second = mod._do_query(pk=INDEX, engine="numpy", cursor=first["next_cursor"], **query)
+        third = mod._do_query(pk=INDEX, engine="python", cursor=second["next_cursor"], **query)
+        expected = [mod._do_query(pk=INDEX, offset=o, **query) for o in (10, 20)]
+        assert second["rows"] == expected[0]["rows"] and second["groups"] == expected[0]["groups"]
+        assert third["rows"] == expected[1]["rows"] and third["min"] == expected[1]["min"]
+
+    def test_no_cursor_for_unversioned_snapshot(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        out = mod._do_query(pk=INDEX, limit=10)
+        assert out["returned"] == 10 and "next_cursor" not in out
+
+
+# ---------------------------------------------------------------------------
+# fuzzy matching
+# ---------------------------------------------------------------------------
+
+class TestFuzzy:
+    ROWS = [
+        {"Vendor": "Acme Corporation", "State": "CA"},
+        {"Vendor": "ACME Corp.", "State": "NV"},
+        {"Vendor": "Beta Industries", "State": "CA"},
+        {"Vendor": "Acme Corporation", "State": "OR"},
+        {"State": "CA"},
+    ]
+
+    def test_levenshtein_and_bk_tree(self, lf):
+        fuzzy = sys.modules["fuzzy"]
+        assert fuzzy.levenshtein("kitten", "sitting") == 3
+        assert fuzzy.levenshtein("kitten", "sitting", limit=1) == 2
+        words = ["acme", "acne", "beta", "corporation", "corp"]
+        tree = fuzzy.BKTree(words)
+        assert sorted(tree.search("acme", 1)) == [(0, "acme"), (1, "acne")]
+        brute = sorted((fuzzy.levenshtein("corporaton", w), w) for w in words
+                       if fuzzy.levenshtein("corporaton", w) <= 2)
+        assert sorted(tree.search("corporaton", 2)) == brute
+
+    def test_misspelled_vendor_matches_closest_entities(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        assert mod._do_query(pk=INDEX, filters={"Vendor": "acme corporaton"})["total_matches"] == 0
+        out = mod._do_query(pk=INDEX, fuzzy={"Vendor": "Acme Corporaton"}, columns=["State"])
+        assert [r["State"] for r in out["rows"]] == ["CA", "OR"]
+        assert out["fuzzy_matches"] == {"Vendor": [{"value": "Acme Corporation", "distance": 1}]}
+
+    def test_max_distance_and_other_filters_combine(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        out = mod._do_query(pk=INDEX, fuzzy={"Vendor": "akme"}, filters={"State": "ca"},
+                            count_only=True)
+        assert out["total_matches"] == 1
+        out = mod._do_query(pk=INDEX, fuzzy={"Vendor": "akme"}, fuzzy_max_distance=0,
+                            count_only=True)
+        assert out["total_matches"] == 0
+        assert out["fuzzy_matches"] == {"Vendor": []}
+
+    def test_each_column_is_scored_once(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        engines = ["python"] + (["numpy"] if mod.vector_engine.AVAILABLE else [])
+        for engine in engines:
+            with patch.object(mod, "fuzzy_scores", wraps=mod.fuzzy_scores) as py_scores, \
+                    patch.object(mod.vector_engine, "fuzzy_scores",
+                                 wraps=mod.vector_engine.fuzzy_scores) as np_scores:
+                out = mod._do_query(pk=INDEX, engine=engine,
+                                    fuzzy={"Vendor": "Acme Corporaton", "State": "ca"})
+            assert py_scores.call_count + np_scores.call_count == 2, engine
+            assert out["fuzzy_matches"]["Vendor"] == [{"value": "Acme Corporation", "distance": 1}]
+
+    @pytest.mark.skipif(importlib.util.find_spec("numpy") is None, reason="numpy not installed")
+    def test_engines_agree(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), self.ROWS)
+        query = {"fuzzy": {"Vendor": "acme corp"}, "free_text": "ca"}
+        assert (mod._do_query(pk=INDEX, engine="numpy", **query)
+                == mod._do_query(pk=INDEX, engine="python", **query))
+
+
+# ---------------------------------------------------------------------------
+# profiling
+# ---------------------------------------------------------------------------
+
+class TestProfile:
+    def test_profile_reports_reads_and_work(self, lf):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), [{"Vendor": "Acme"}, {"Vendor": "Beta"}, {"Vendor": "Acme 2"}])
+        resp = mod.lambda_handler({"index_name": INDEX, "free_text": "acme", "limit": 1,
+                                   "profile": True}, {})
+        prof = json.loads(resp["body"])["_profile"]
+        # Not COMPLETE, so read per request; the partition read includes META.
+        assert prof["sources"] == {"pushdown": 1}
+        assert prof["meta_reads"] == 1 and prof["ddb_pages"] == 1 and prof["ddb_items"] == 4
+        assert prof["rows_matched"] == 2 and prof["rows_returned"] == 1
+        for key in ("meta_ms", "load_ms", "filter_ms", "aggregate_ms", "sort_ms",
+                    "serialize_ms", "total_ms"):
+            assert prof[key] >= 0, key
+
+    def test_cached_reads_reported_as_such(self, lf):
+        mod, dynamodb = lf
+        _seed_complete(dynamodb.Table(TABLE), [{"Vendor": "Acme"}])
+        event = {"index_name": INDEX, "free_text": "acme", "profile": True}
+        mod.lambda_handler(dict(event, free_text="beta"), {})
+        prof = json.loads(mod.lambda_handler(dict(event), {})["body"])["_profile"]
+        assert prof["sources"] == {"memory": 1} and "ddb_pages" not in prof
+        prof = json.loads(mod.lambda_handler(dict(event), {})["body"])["_profile"]
+        assert prof["sources"] == {"result_cache": 1}
+
+    def test_emf_record_emitted_without_profile_flag(self, lf, capsys):
+        mod, dynamodb = lf
+        _seed(dynamodb.Table(TABLE), [{"Vendor": "Acme"}])
+        body = json.loads(mod.lambda_handler({"index_name": INDEX, "count_only": True}, {})["body"])
+        assert "_profile" not in body
+        record = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+        metrics = record["_aws"]["CloudWatchMetrics"][0]
+        assert metrics["Namespace"] == "ExcelIndexQuery" and metrics["Dimensions"] == [["Action"]]
+        names = {m["Name"]: m["Unit"] for m in metrics["Metrics"]}
+        assert names["filter_ms"] == "Milliseconds" and names["ddb_items"] == "Count"
+        assert record["Action"] == "query" and record["ddb_items"] == 2
+
+
+# ---------------------------------------------------------------------------
+# benchmark suite (smoke test; the real run is bench_excel_query.py)
+# ---------------------------------------------------------------------------
+
+class TestBenchmark:
+    def test_every_shape_runs_and_engines_agree(self, lf):
+        mod, _ = lf
+        import bench_excel_query as bench
+        report = bench.run_benchmarks(mod, sizes=[300], repeat=1)
+        results = report["results"]
+        assert "300/load" in results
+        for name in bench.SHAPES:
+            py = results[f"300/python/{name}"]
+            assert py["warm_ms"] >= 0 and py["cold_ms"] >= 0
+            if f"300/numpy/{name}" in results:
+                assert results[f"300/numpy/{name}"]["total_matches"] == py["total_matches"]
+
+    def test_compare_flags_slowdowns_and_changed_results(self, lf):
+        import bench_excel_query as bench
+        base = {"results": {"1/python/a": {"warm_ms": 10, "warm_ratio": 0.1, "total_matches": 5},
+                            "1/python/b": {"warm_ms": 10, "warm_ratio": 0.1, "total_matches": 5}}}
+        cur = {"results": {"1/python/a": {"warm_ms": 40, "warm_ratio": 0.4, "total_matches": 5},
+                           "1/python/b": {"warm_ms": 12, "warm_ratio": 0.12, "total_matches": 6},
+                           "1/python/new": {"warm_ms": 99, "warm_ratio": 9.9}}}
+        problems = bench.compare(cur, base, tolerance=3.0)
+        assert len(problems) == 2
+        assert problems[0].startswith("1/python/a: warm") and "total_matches" in problems[1]
@@ -0,0 +1,197 @@
+"""
+Optional NumPy engine for the Excel index query Lambda.
+
+Exposes the same functions, arguments and results as the pure-Python engine
+in ``lambda_function`` (``match_ids``, ``unique_values``, ``group_counts``,
+``extreme_value``, ``sorted_page``), but evaluates predicates as boolean
+masks over per-snapshot arrays and aggregates as vectorized reductions:
+
+  - column filters test the needle once per *distinct* normalized value and
+    broadcast the hits through an integer code array,
+  - date filters compare a float array of date ordinals (NaN = not a date),
+  - ``group_by`` / ``count_unique`` / ``distinct_values`` are ``bincount`` /
+    ``unique`` over factorized codes,
+  - ``min``/``max``, ``sort_by`` and ``group_by_value_max`` work on integer
+    ranks of the snapshot's ``sort_keys``, so mixed date/number/text columns
+    order exactly as they do in the Python engine.
+
+Arrays are stored with the snapshot's derived columns, so they are built once
+per snapshot load. NumPy is an optional dependency: ``AVAILABLE`` is False
+when it can't be imported and the Lambda keeps using the Python engine.
+"""
+from typing import Any, Callable
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy ships with the Lambda bundle
+    np = None
+
+from abe_utils.dates import parse_date_like
+from fuzzy import fuzzy_scores
+from snapshot import IndexSnapshot, norm_text
+
+AVAILABLE = np is not None
+
+# Rank given to blank cells when sorting: the Python engine sorts them as the
+# empty string, i.e. ahead of all text.
+_BLANK_KEY = (1, "")
+
+
+def _factorize(values: list) -> tuple["np.ndarray", list]:
+    """Integer code per value plus the distinct values in first-seen order."""
+    index: dict[Any, int] = {}
+    codes = np.fromiter(
+        (index.setdefault(v, len(index)) for v in values), dtype=np.int64, count=len(values),
+    )
+    return codes, list(index)
+
+
+def _text_codes(snap: IndexSnapshot, col: str, empty_label: str = "") -> tuple["np.ndarray", list[str]]:
+    """Codes of the stripped cell text of ``col``; blanks become ``empty_label``."""
+    def build():
+        return _factorize([str(v or "").strip() or empty_label for v in snap.column(col)])
+    return snap.derived(("np_text", col, empty_label), build)
+
+
+def _norm_codes(snap: IndexSnapshot, col: str) -> tuple["np.ndarray", list[str]]:
+    """Codes of the normalized text of ``col`` (what column filters compare)."""
+    return snap.derived(("np_norm", col), lambda: _factorize(snap.norm_column(col)))
+
+
+def _date_array(snap: IndexSnapshot, col: str) -> "np.ndarray":
+    """Float date ordinals of ``col``; NaN where the cell isn't a date."""
+    return snap.derived(("np_dates", col), lambda: np.array(snap.date_ordinals(col), dtype=float))
+
+
+def _ranks(snap: IndexSnapshot, col: str) -> tuple["np.ndarray", "np.ndarray"]:
+    """Dense rank of every cell's sort key, and a mask of non-blank cells.
+
+    Blank cells get the rank of ``(1, "")`` so sorting matches the Python
+    engine; the mask keeps them out of min/max.
+    """
+    def build():
+        keys = snap.sort_keys(col)
+        ordered = sorted({k for k in keys if k is not None} | {_BLANK_KEY})
+        rank = {k: r for r, k in enumerate(ordered)}
+        blank = rank[_BLANK_KEY]
+        ranks = np.fromiter((blank if k is None else rank[k] for k in keys), dtype=np.int64, count=len(keys))
+        present = np.fromiter((k is not None for k in keys), dtype=bool, count=len(keys))
+        return ranks, present
+    return snap.derived(("np_ranks", col), build)
+
+
+def match_ids(
+    snap: IndexSnapshot,
+    free_text: str | None,
+    filters: dict[str, Any] | None,
+    date_before: dict[str, str] | None = None,
+    date_after: dict[str, str] | None = None,
+    fuzzy: dict[str, str] | None = None,
+    fuzzy_max_distance: int | None = None,
+    fuzzy_scores_out: dict[str, dict[int, int] | None] | None = None,
+    narrow: Callable | None = None,
+) -> "np.ndarray":
+    """Ascending ids of rows passing all criteria (same semantics as ``_match_ids``).
+
+    ``narrow`` is the caller's trigram prefilter for ``free_text``; row text
+    is mostly unique per row, so it is the one predicate not evaluated per
+    distinct value, and it only scans rows the column filters kept.
+    """
+    n = snap.n_rows
+    mask = np.ones(n, dtype=bool)
+    if filters:
+        for col, value in filters.items():
+            needle = norm_text(str(value))
+            codes, labels = _norm_codes(snap, col)
+            hits = np.fromiter((needle in label for label in labels), dtype=bool, count=len(labels))
+            mask &= hits[codes]
+    for col, value in (fuzzy or {}).items():
+        scores = fuzzy_scores(snap, col, str(value), fuzzy_max_distance)
+        if fuzzy_scores_out is not None:
+            fuzzy_scores_out[col] = scores
+        if scores is not None:
+            hit = np.zeros(n, dtype=bool)
+            hit[list(scores)] = True
+            mask &= hit
+    if free_text:
+        needle = norm_text(free_text)
+        text = snap.row_text()
+        # Only rows the column filters kept are scanned.
+        survivors = np.flatnonzero(mask).tolist() if filters or fuzzy else range(n)
+        candidates = narrow(snap, survivors, needle, None) if narrow else survivors
+        hit = np.zeros(n, dtype=bool)
+        hit[[i for i in candidates if text[i] is not None and needle in text[i]]] = True
+        mask &= hit
+    for bounds, keep in ((date_before, np.less), (date_after, np.greater)):
+        if not bounds:
+            continue
+        for col, threshold_str in bounds.items():
+            threshold = parse_date_like(threshold_str)
+            if threshold is None:
+                continue
+            mask &= keep(_date_array(snap, col), threshold.toordinal())
+    return np.flatnonzero(mask)
+
+
+def unique_values(snap: IndexSnapshot, col: str, ids: "np.ndarray") -> set[str]:
+    """Distinct non-blank stripped values of ``col`` among ``ids``."""
+    codes, labels = _text_codes(snap, col)
+    return {labels[c] for c in np.unique(codes[ids]).tolist() if labels[c]}
+
+
+def group_counts(
+    snap: IndexSnapshot,
+    col: str,
+    ids: "np.ndarray",
+    value_max_col: str | None = None,
+) -> tuple[dict[str, int], dict[str, str]]:
+    """Row count per value of ``col`` and, optionally, each group's max of ``value_max_col``.
+
+    The max is reported as the stripped text of the first row holding the
+    group's highest sort key, as in the Python engine.
+    """
+    codes, labels = _text_codes(snap, col, "(empty)")
+    group_codes = codes[ids]
+    counts = np.bincount(group_codes, minlength=len(labels))
+    groups = {labels[c]: int(n) for c, n in enumerate(counts.tolist()) if n}
+    max_display: dict[str, str] = {}
+    if value_max_col:
+        ranks, present = _ranks(snap, value_max_col)
+        sel = ids[present[ids]]
+        if len(sel):
+            g = codes[sel]
+            r = ranks[sel]
+            best = np.full(len(labels), -1, dtype=np.int64)
+            np.maximum.at(best, g, r)
+            winners = sel[r == best[g]]
+            first_codes, first_pos = np.unique(codes[winners], return_index=True)
+            raw = snap.column(value_max_col)
+            for c, pos in zip(first_codes.tolist(), first_pos.tolist()):
+                max_display[labels[c]] = str(raw[int(winners[pos])] or "").strip()
+    return groups, max_display
+
+
+def extreme_value(snap: IndexSnapshot, col: str, ids: "np.ndarray", pick_max: bool) -> str | None:
+    """Display value of the smallest/largest cell of ``col`` among ``ids`` (first on ties)."""
+    ranks, present = _ranks(snap, col)
+    sel = ids[present[ids]]
+    if not len(sel):
+        return None
+    r = ranks[sel]
+    best = int(sel[np.argmax(r) if pick_max else np.argmin(r)])
+    return snap.display_value(col, best)
+
+
+def sorted_page(
+    snap: IndexSnapshot,
+    col: str,
+    ids: "np.ndarray",
+    offset: int,
+    limit: int,
+    descending: bool,
+) -> list[int]:
+    """Ids of rows ``offset:offset + limit`` after a stable sort of ``ids`` by ``col``."""
+    ranks, _ = _ranks(snap, col)
+    r = ranks[ids]
+    order = np.argsort(-r if descending else r, kind="stable")
+    return ids[order[offset:offset + limit]].tolist()
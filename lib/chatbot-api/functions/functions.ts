@@ -30,7 +30,7 @@
  *     - StepFunctionsStack              — Orchestrates batch RAGAS evaluation
  *
  *   Excel Index (structured contract/vendor data)
- *     - ExcelIndexParserFunction        — S3 event-driven: parses .xlsx into DynamoDB
+ *     - ExcelIndexParserFunction        — S3 event-driven: parses .xlsx/.csv/.tsv into DynamoDB
  *     - ExcelIndexQueryFunction         — DynamoDB query engine (filters, counts, sorts)
  *     - ExcelIndexApiFunction           — REST API gateway for index management
  *
@@ -741,9 +741,12 @@ this.contextSummarizerFunction = contextSummarizerFunction;
 
 // ─── Excel Index Domain ──────────────────────────────────────────────
 
-// S3 event-driven parser: triggered on .xlsx upload/delete under indexes/.
-// Reads the spreadsheet, uses LLM to generate column descriptions, and
-// writes rows to DynamoDB. 2-min timeout + 512 MB for large spreadsheets.
+// S3 event-driven parser: triggered on .xlsx/.csv/.tsv upload/delete under
+// indexes/. Reads the spreadsheet (each worksheet as its own sub-index), uses
+// LLM to generate column descriptions, and writes rows to DynamoDB. 512 MB; rows are streamed through /tmp (workbook,
+// row spool, snapshot), hence 2 GB of it. Very large sheets are written by
+// parallel invocations of this same function (slice workers), which the
+// coordinating invocation waits on -- hence the 15-min timeout.
 const excelIndexParserFunction = new lambda.Function(scope, 'ExcelIndexParserFunction', {
   ...LAMBDA_DEFAULTS,
   runtime: lambda.Runtime.PYTHON_3_12,
@@ -764,25 +767,68 @@ const excelIndexParserFunction = new lambda.Function(scope, 'ExcelIndexParserFun
     TABLE_NAME: props.excelIndexDataTable.tableName,
     INDEX_REGISTRY_TABLE: props.indexRegistryTable.tableName,
     PRIMARY_MODEL_ID: process.env.PRIMARY_MODEL_ID || 'us.anthropic.claude-opus-4-6-v1',
+    // Threads sending DynamoDB batch writes/deletes in parallel during (re)ingest.
+    BULK_WRITE_WORKERS: '8',
+    // Re-uploads changing at most this share of rows are diffed into the live
+    // generation in place instead of being rewritten as a new one.
+    INCREMENTAL_MAX_CHANGE_RATIO: '0.2',
+    // Sheets with at least FANOUT_MIN_ROWS rows are cut into slices written
+    // by up to FANOUT_WORKERS concurrent worker invocations.
+    FANOUT_MIN_ROWS: '50000',
+    FANOUT_SLICE_ROWS: '25000',
+    FANOUT_WORKERS: '8',
+    // Worksheets beyond the active one ingested concurrently as sub-indexes.
+    SHEET_WORKERS: '4',
   },
-  timeout: cdk.Duration.minutes(2),
+  timeout: cdk.Duration.minutes(15),
   memorySize: 512,
+  ephemeralStorageSize: cdk.Size.mebibytes(2048),
 });
 excelIndexParserFunction.addToRolePolicy(new iam.PolicyStatement({
   effect: iam.Effect.ALLOW,
   actions: ['s3:GetObject'],
   resources: [props.contractIndexBucket.bucketArn + '/*'],
 }));
+// Compressed row snapshot published next to each workbook for fast query cold loads.
 excelIndexParserFunction.addToRolePolicy(new iam.PolicyStatement({
   effect: iam.Effect.ALLOW,
-  actions: ['dynamodb:Query', 'dynamodb:BatchWriteItem', 'dynamodb:PutItem', 'dynamodb:DeleteItem', 'dynamodb:UpdateItem', 'dynamodb:GetItem'],
+  actions: ['s3:PutObject', 's3:DeleteObject'],
+  resources: [props.contractIndexBucket.bucketArn + '/indexes/*/snapshot.jsonl.gz'],
+}));
+// Row slices handed to fan-out workers; deleted once every slice is written.
+excelIndexParserFunction.addToRolePolicy(new iam.PolicyStatement({
+  effect: iam.Effect.ALLOW,
+  actions: ['s3:PutObject', 's3:DeleteObject'],
+  resources: [props.contractIndexBucket.bucketArn + '/indexes/*/slices/*'],
+}));
+// One action per DynamoDB call the parser makes on the data table: Query
+// (partition reads), BatchWriteItem (bulk_writer puts/deletes), BatchGetItem
+// (_save_rows, the incremental rollback copy), PutItem/UpdateItem/GetItem/
+// DeleteItem (META and status). test/gen-ai-mvp.test.ts pins this list.
+excelIndexParserFunction.addToRolePolicy(new iam.PolicyStatement({
+  effect: iam.Effect.ALLOW,
+  actions: ['dynamodb:Query', 'dynamodb:BatchWriteItem', 'dynamodb:BatchGetItem', 'dynamodb:PutItem', 'dynamodb:DeleteItem', 'dynamodb:UpdateItem', 'dynamodb:GetItem'],
   resources: [props.excelIndexDataTable.tableArn],
 }));
 excelIndexParserFunction.addToRolePolicy(new iam.PolicyStatement({
   effect: iam.Effect.ALLOW,
-  actions: ['dynamodb:PutItem', 'dynamodb:DeleteItem', 'dynamodb:GetItem'],
+  actions: ['dynamodb:PutItem', 'dynamodb:DeleteItem', 'dynamodb:GetItem', 'dynamodb:UpdateItem'],
   resources: [props.indexRegistryTable.tableArn],
 }));
+// Self-invocation: asynchronous deletion of superseded index generations and
+// description generation, and synchronous fan-out slice workers. Granted on
+// the function's own ARN in a policy of its own: the function depends on its
+// role's default policy, so naming its ARN there would be circular, whereas
+// this policy only depends on the function. (A name pattern breaks when CDK
+// truncates the generated function name.)
+new iam.Policy(scope, 'ExcelIndexParserSelfInvokePolicy', {
+  roles: [excelIndexParserFunction.role!],
+  statements: [new iam.PolicyStatement({
+    effect: iam.Effect.ALLOW,
+    actions: ['lambda:InvokeFunction'],
+    resources: [excelIndexParserFunction.functionArn],
+  })],
+});
 excelIndexParserFunction.addToRolePolicy(new iam.PolicyStatement({
   effect: iam.Effect.ALLOW,
   actions: ['bedrock:InvokeModel'],
@@ -791,14 +837,18 @@ excelIndexParserFunction.addToRolePolicy(new iam.PolicyStatement({
     'arn:aws:bedrock:*::foundation-model/anthropic.claude-opus-4-6-v1',
   ],
 }));
-excelIndexParserFunction.addEventSource(new S3EventSource(props.contractIndexBucket, {
-  events: [s3.EventType.OBJECT_CREATED, s3.EventType.OBJECT_REMOVED],
-  filters: [{ prefix: 'indexes/', suffix: '.xlsx' }],
-}));
+// One notification per suffix: an S3 notification filter holds a single suffix.
+for (const suffix of ['.xlsx', '.csv', '.tsv']) {
+  excelIndexParserFunction.addEventSource(new S3EventSource(props.contractIndexBucket, {
+    events: [s3.EventType.OBJECT_CREATED, s3.EventType.OBJECT_REMOVED],
+    filters: [{ prefix: 'indexes/', suffix }],
+  }));
+}
 this.excelIndexParserFunction = excelIndexParserFunction;
 
 // DynamoDB query engine invoked by the chat Lambda's query_excel_index tool.
-// Supports filters, counts, sorts, distinct values. 256 MB for large result sets.
+// Supports filters, counts, sorts, distinct values. 512 MB so warm containers
+// can hold columnar snapshots of recently queried indexes in memory.
 const excelIndexQueryFunction = new lambda.Function(scope, 'ExcelIndexQueryFunction', {
   ...LAMBDA_DEFAULTS,
   runtime: lambda.Runtime.PYTHON_3_12,
@@ -816,15 +866,28 @@ const excelIndexQueryFunction = new lambda.Function(scope, 'ExcelIndexQueryFunct
   layers: [pythonCommonLayer],
   environment: {
     TABLE_NAME: props.excelIndexDataTable.tableName,
+    BUCKET: props.contractIndexBucket.bucketName,
+    SNAPSHOT_CACHE_MAX_INDEXES: '8',
+    SNAPSHOT_CACHE_MAX_ROWS: '200000',
+    TRIGRAM_MIN_ROWS: '5000',
+    RESULT_CACHE_MAX_BYTES: String(16 * 1024 * 1024),
+    QUERY_ENGINE: 'python',
+    CURSOR_CACHE_MAX_ENTRIES: '16',
+    METRICS_NAMESPACE: 'ExcelIndexQuery',
   },
   timeout: cdk.Duration.seconds(30),
-  memorySize: 256,
+  memorySize: 512,
 });
 excelIndexQueryFunction.addToRolePolicy(new iam.PolicyStatement({
   effect: iam.Effect.ALLOW,
   actions: ['dynamodb:GetItem', 'dynamodb:Query', 'dynamodb:Scan'],
   resources: [props.excelIndexDataTable.tableArn],
 }));
+excelIndexQueryFunction.addToRolePolicy(new iam.PolicyStatement({
+  effect: iam.Effect.ALLOW,
+  actions: ['s3:GetObject'],
+  resources: [props.contractIndexBucket.bucketArn + '/indexes/*/snapshot.jsonl.gz'],
+}));
 this.excelIndexQueryFunction = excelIndexQueryFunction;
 
 // REST API for admin index management: create, list, delete indexes.
@@ -854,7 +917,7 @@ excelIndexApiFunction.addToRolePolicy(new iam.PolicyStatement({
 }));
 excelIndexApiFunction.addToRolePolicy(new iam.PolicyStatement({
   effect: iam.Effect.ALLOW,
-  actions: ['dynamodb:Query', 'dynamodb:PutItem', 'dynamodb:UpdateItem', 'dynamodb:DeleteItem'],
+  actions: ['dynamodb:Query', 'dynamodb:GetItem', 'dynamodb:PutItem', 'dynamodb:UpdateItem', 'dynamodb:DeleteItem'],
   resources: [props.indexRegistryTable.tableArn],
 }));
 excelIndexApiFunction.addToRolePolicy(new iam.PolicyStatement({
@@ -16,7 +16,9 @@ DATE_FORMATS = [
 def parse_date_like(value) -> "datetime.date | None":
     """Try common date formats; return date or None."""
     s = str(value).strip()
-    if not s:
+    # Every format needs digits; rejecting plain text up front skips seven
+    # failing strptime calls per cell when typing text-heavy columns.
+    if not s or not any(ch.isdigit() for ch in s):
         return None
     for fmt in DATE_FORMATS:
         try:
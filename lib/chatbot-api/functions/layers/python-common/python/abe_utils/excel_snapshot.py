@@ -0,0 +1,129 @@
+"""Compressed row snapshots for the Excel index pipeline.
+
+The parser Lambda publishes one snapshot object per index next to the source
+workbook, and the query Lambda loads it on a cold cache instead of paginating
+the whole DynamoDB partition -- a single S3 GET of a few hundred KB instead of
+N ``Query`` pages. Both sides import the format from here so the writer and
+reader never drift apart.
+
+Layout (gzip-compressed JSON lines):
+  line 1   -- header: ``{"format", "version", "columns", "typed_columns", "row_count"}``
+  line 2.. -- one JSON array per row: the cells aligned with ``columns``
+              (``null`` = attribute absent on that row), followed by one
+              typed value per entry of ``typed_columns``
+
+``version`` is the META ``last_updated`` stamp the rows belong to; readers
+must ignore a snapshot whose version doesn't match META.
+
+Typed values are computed once at ingest so the query engine never has to
+guess date formats per cell: a ``date`` column stores the proleptic ordinal
+(``date.toordinal()``) and a ``number`` column stores a finite float;
+``null`` marks a cell that didn't parse as that type.
+"""
+import gzip
+import io
+import json
+import math
+from typing import BinaryIO, Iterable
+
+from .dates import parse_date_like
+
+SNAPSHOT_FORMAT = 1
+TYPE_DATE = "date"
+TYPE_NUMBER = "number"
+
+
+def parse_number_like(value) -> float | None:
+    """Parse a cell as a finite float; return None for blanks, text, NaN and infinities."""
+    s = str(value).strip()
+    if not s:
+        return None
+    try:
+        f = float(s)
+    except ValueError:
+        return None
+    return f if math.isfinite(f) else None
+
+
+def typed_value(kind: str, value) -> int | float | None:
+    """Canonical typed form of a cell: date ordinal or float (None if it doesn't parse)."""
+    if value is None:
+        return None
+    if kind == TYPE_DATE:
+        d = parse_date_like(value)
+        return d.toordinal() if d is not None else None
+    return parse_number_like(value)
+
+
+def snapshot_key(index_id: str) -> str:
+    """S3 key of the snapshot object for an index."""
+    return f"indexes/{index_id}/snapshot.jsonl.gz"
+
+
+def write_snapshot(
+    fileobj: BinaryIO,
+    version: str,
+    columns: list[str],
+    rows: Iterable[dict],
+    row_count: int,
+    typed_columns: dict[str, str] | None = None,
+) -> None:
+    """Stream rows (dicts keyed by column name) into ``fileobj`` as a snapshot.
+
+    Rows are compressed one at a time, so memory stays flat however many
+    there are. ``row_count`` goes into the header up front and must match
+    the number of rows written (readers reject a mismatch as truncated).
+    ``typed_columns`` maps column name -> ``"date"`` / ``"number"``; each
+    listed column gets its typed value appended to every row.
+    """
+    typed = [[col, kind] for col, kind in (typed_columns or {}).items()]
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "columns": columns,
+        "typed_columns": typed,
+        "row_count": row_count,
+    }
+    written = 0
+    with gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=6) as gz:
+        gz.write(json.dumps(header).encode("utf-8"))
+        for r in rows:
+            line = json.dumps(
+                [r.get(c) for c in columns] + [typed_value(kind, r.get(col)) for col, kind in typed],
+                separators=(",", ":"),
+            )
+            gz.write(b"\n" + line.encode("utf-8"))
+            written += 1
+    if written != row_count:
+        raise ValueError(f"Snapshot row count mismatch: header {row_count}, wrote {written}")
+
+
+def encode_snapshot(
+    version: str,
+    columns: list[str],
+    rows: Iterable[dict],
+    typed_columns: dict[str, str] | None = None,
+) -> bytes:
+    """Serialize rows (dicts keyed by column name) into snapshot bytes (see ``write_snapshot``)."""
+    rows = list(rows)
+    buf = io.BytesIO()
+    write_snapshot(buf, version, columns, rows, len(rows), typed_columns)
+    return buf.getvalue()
+
+
+def decode_snapshot(data: bytes) -> tuple[dict, list[list]]:
+    """Parse snapshot bytes into ``(header, rows)``.
+
+    Raises ``ValueError`` for an unknown format or a row count that doesn't
+    match the header (a truncated upload).
+    """
+    lines = gzip.decompress(data).decode("utf-8").split("\n")
+    header = json.loads(lines[0])
+    if header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format: {header.get('format')}")
+    rows = [json.loads(line) for line in lines[1:] if line]
+    if len(rows) != header.get("row_count"):
+        raise ValueError(
+            f"Snapshot row count mismatch: header {header.get('row_count')}, read {len(rows)}"
+        )
+    return header, rows
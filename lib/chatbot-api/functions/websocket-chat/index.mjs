@@ -56,7 +56,7 @@ import { randomUUID } from "crypto";
 
 import { insertCitationMarkers, validateSelfManagedCitations, renumberCitations } from './citations.mjs';
 import { retrieveKBDocs, retrieveFullDocument } from './kb.mjs';
-import { STATIC_TOOLS, truncate, capToolResultSize, getAllTools, fetchMetadata, enrichExcelIndexResult, invokeIndexQuery, constructSysPrompt } from './tools.mjs';
+import { STATIC_TOOLS, truncate, capToolResultSize, getAllTools, fetchMetadata, invokeExcelIndexQuery, constructSysPrompt } from './tools.mjs';
 import { logger, setCorrelationId } from './logger.mjs';
 
 
@@ -1145,11 +1145,13 @@ const getUserResponse = async (id, requestJSON, authorizedUserId) => {
                   } catch (statusErr) {
                     logger.warn("Status send failed", { error: statusErr?.message });
                   }
-                  let toolResultContent = await invokeIndexQuery({
+                  let toolResultContent = await invokeExcelIndexQuery({
                     action: "query",
                     index_name: indexName,
                     free_text: query.free_text || null,
                     filters: query.filters || null,
+                    fuzzy: query.fuzzy || null,
+                    fuzzy_max_distance: typeof query.fuzzy_max_distance === "number" ? query.fuzzy_max_distance : null,
                     date_before: query.date_before || null,
                     date_after: query.date_after || null,
                     columns: Array.isArray(query.columns) ? query.columns : null,
@@ -1160,13 +1162,15 @@ const getUserResponse = async (id, requestJSON, authorizedUserId) => {
                     distinct_values: query.distinct_values || null,
                     min_value: query.min_value || null,
                     max_value: query.max_value || null,
+                    aggregations: Array.isArray(query.aggregations) && query.aggregations.length > 0 ? query.aggregations : null,
+                    aggregate_by: Array.isArray(query.aggregate_by) && query.aggregate_by.length > 0 ? query.aggregate_by : null,
                     sort_by: query.sort_by || null,
                     sort_order: query.sort_order || "asc",
                     limit: typeof query.limit === "number" ? query.limit : 100,
                     offset: typeof query.offset === "number" ? query.offset : 0,
-                  });
+                    cursor: typeof query.cursor === "string" && query.cursor ? query.cursor : null,
+                  }, query, idxMeta);
 
-                  toolResultContent = await enrichExcelIndexResult(query, indexName, toolResultContent, idxMeta);
                   toolResultContent = capToolResultSize(toolResultContent);
 
                   const excelSourceIndex = fullDocs.sources.length + 1;
@@ -39,8 +39,7 @@ vi.mock("./tools.mjs", () => ({
   capToolResultSize:                   vi.fn(s => s),
   getAllTools:                          vi.fn(() => Promise.resolve({ tools: [], indexes: [] })),
   fetchMetadata:                       vi.fn(),
-  enrichExcelIndexResult:              vi.fn((_q, _n, s) => s),
-  invokeIndexQuery:                    vi.fn(),
+  invokeExcelIndexQuery:               vi.fn(),
   constructSysPrompt:                  vi.fn(() => Promise.resolve({
     metadata: {},
     promptVersionId: "test",
@@ -58,7 +57,7 @@ vi.mock("./models/chat-model.mjs", () => ({ default: vi.fn() }));
 import { handler } from "./index.mjs";
 import ClaudeModel from "./models/chat-model.mjs";
 import { retrieveKBDocs, retrieveFullDocument } from "./kb.mjs";
-import { fetchMetadata, invokeIndexQuery, capToolResultSize } from "./tools.mjs";
+import { fetchMetadata, invokeExcelIndexQuery, capToolResultSize } from "./tools.mjs";
 import {
   insertCitationMarkers,
   validateSelfManagedCitations,
@@ -177,7 +176,7 @@ beforeEach(() => {
   retrieveKBDocs.mockResolvedValue({ content: "", sources: [], documentBlocks: [] });
   retrieveFullDocument.mockResolvedValue({ content: "", sources: [], documentBlocks: [] });
   fetchMetadata.mockResolvedValue(null);
-  invokeIndexQuery.mockResolvedValue(JSON.stringify({ total_matches: 0, returned: 0, rows: [] }));
+  invokeExcelIndexQuery.mockResolvedValue(JSON.stringify({ total_matches: 0, returned: 0, rows: [] }));
 });
 
 // ---------------------------------------------------------------------------
@@ -561,7 +560,7 @@ describe("agentic loop — tool dispatch", () => {
     expect(sentData.some(d => typeof d === "string" && d.includes('Fetching document inventory for "FAC115"'))).toBe(true);
   });
 
-  it("calls invokeIndexQuery when the model invokes query_excel_index", async () => {
+  it("calls invokeExcelIndexQuery when the model invokes query_excel_index", async () => {
     let callCount = 0;
     const mockInstance = {
       assembleHistory: vi.fn((_hist, prompt) => [
@@ -588,8 +587,10 @@ describe("agentic loop — tool dispatch", () => {
 
     await handler(makeEvent());
 
-    expect(invokeIndexQuery).toHaveBeenCalledWith(
-      expect.objectContaining({ index_name: "STATEWIDE", free_text: "HVAC" })
+    expect(invokeExcelIndexQuery).toHaveBeenCalledWith(
+      expect.objectContaining({ index_name: "STATEWIDE", free_text: "HVAC" }),
+      expect.objectContaining({ free_text: "HVAC" }),
+      undefined,
     );
   });
 
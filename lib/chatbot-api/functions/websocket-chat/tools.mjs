@@ -156,6 +156,8 @@ export function capToolResultSize(resultStr) {
     data.rows = data.rows.slice(0, best);
     data.returned = best;
     data._truncated = true;
+    // The cursor points past the rows dropped above; paginate by offset instead.
+    delete data.next_cursor;
     data._note = `Only ${best} of ${data.total_matches} rows shown (result too large). ` +
       `Use count_unique, group_by, or narrower filters for complete analysis. ` +
       `Use offset=${best} to fetch the next page.`;
@@ -252,13 +254,15 @@ export function buildExcelIndexTool(indexes) {
   const enumValues = indexes.map(idx => idx.index_name);
   return {
     name: "query_excel_index",
-    description: `Query structured Excel-based data indexes. Available indexes:\n\n${indexDescriptions}\n\nUse free_text for broad search across all columns. Use filters for column-specific matching (keys are exact column names from above). Matching is punctuation-insensitive.\n\nResponse fields: total_matches (row count), returned (rows in response), offset (starting position), rows (array of row objects). When count_unique is set, response also includes unique_count and unique_column. When group_by is set, response includes groups (object mapping each value to its count). When group_by and group_by_value_max are both set, response also includes group_max_values (max value of that column per group) and group_by_value_max_column. When distinct_values is set, response includes distinct_values (sorted list of unique values), distinct_column, and distinct_count. When min_value or max_value is set, response includes min/max objects with column and value. Date-filtered queries may include _entity_summary (server-added): distinct_entity_count, rows_per_entity, and optional max_value_per_entity — use these so the first answer states entity count vs row count correctly.\n\nIMPORTANT RULES:\n- total_matches counts ROWS, not distinct entities. NEVER count items yourself from returned rows — ALWAYS use count_unique or group_by to get accurate counts.\n- For ANY question involving counts or "how many", use count_only, count_unique, or group_by FIRST before fetching row data.\n- ALWAYS specify "columns" with only the fields needed to answer the question. Returning all columns wastes context and may cause errors.\n- If a result includes "_truncated": true, not all rows were returned. Use count_unique/group_by for totals, or paginate with offset.\n- For date-based questions (expired, expiring soon, valid contracts), use date_before/date_after to filter server-side on one of the date columns listed for the index. NEVER scan all rows and compare dates yourself. Example: to find expired items, use date_before with a date column from the index list and today's date.\n- If an index lists no date columns, do NOT attempt date filtering on it — answer from other sources and state that the index has no date information.\n- Use sort_by to order results by any column (dates, names, etc.) and sort_order for direction (e.g. sort by a date column ascending for soonest-expiring first).\n- Use distinct_values to list all unique values in a column. Use min_value/max_value to find the earliest/latest date or smallest/largest value.\n\nPagination: default limit is 50 rows. If total_matches > returned + offset, use offset to fetch the next page. Use limit up to 500 only when the user explicitly asks for a complete list.`,
+    description: `Query structured Excel-based data indexes. Available indexes:\n\n${indexDescriptions}\n\nUse free_text for broad search across all columns. Use filters for column-specific matching (keys are exact column names from above). Matching is punctuation-insensitive.\n\nResponse fields: total_matches (row count), returned (rows in response), offset (starting position), rows (array of row objects), next_cursor (present when more rows remain). When count_unique is set, response also includes unique_count and unique_column. When group_by is set, response includes groups (object mapping each value to its count). When group_by and group_by_value_max are both set, response also includes group_max_values (max value of that column per group) and group_by_value_max_column. When distinct_values is set, response includes distinct_values (sorted list of unique values), distinct_column, and distinct_count. When min_value or max_value is set, response includes min/max objects with column and value. When fuzzy is set, response includes fuzzy_matches: {column: [{value, distance}]} -- the closest matching values, best first. When aggregations is set, response includes aggregations: {by, groups: [{key: {column: value}, values: {name: result}}], group_count, truncated}. Date-filtered queries may include _entity_summary (server-added): distinct_entity_count, rows_per_entity, and optional max_value_per_entity — use these so the first answer states entity count vs row count correctly.\n\nIMPORTANT RULES:\n- total_matches counts ROWS, not distinct entities. NEVER count items yourself from returned rows — ALWAYS use count_unique or group_by to get accurate counts.\n- For ANY question involving counts or "how many", use count_only, count_unique, or group_by FIRST before fetching row data.\n- ALWAYS specify "columns" with only the fields needed to answer the question. Returning all columns wastes context and may cause errors.\n- If a result includes "_truncated": true, not all rows were returned. Use count_unique/group_by for totals, or paginate with offset.\n- For date-based questions (expired, expiring soon, valid contracts), use date_before/date_after to filter server-side on one of the date columns listed for the index. NEVER scan all rows and compare dates yourself. Example: to find expired items, use date_before with a date column from the index list and today's date.\n- If an index lists no date columns, do NOT attempt date filtering on it — answer from other sources and state that the index has no date information.\n- Use sort_by to order results by any column (dates, names, etc.) and sort_order for direction (e.g. sort by a date column ascending for soonest-expiring first).\n- Use distinct_values to list all unique values in a column. Use min_value/max_value to find the earliest/latest date or smallest/largest value.\n- To build a breakdown table (e.g. count, total and average amount per state and category), use ONE query with aggregations and aggregate_by instead of chaining several queries.\n\nPagination: default limit is 50 rows. If the response includes next_cursor, more rows remain: repeat the same query with cursor set to next_cursor (and no offset) to fetch the next page. Use limit up to 500 only when the user explicitly asks for a complete list.`,
     input_schema: {
       type: "object",
       properties: {
         index_name: { type: "string", enum: enumValues, description: "Which index to query." },
         free_text: { type: "string", description: "Search across all columns (punctuation-insensitive partial match)." },
         filters: { type: "object", description: "Column-specific filters as {column_name: search_value}. Use exact column names from the index description." },
+        fuzzy: { type: "object", description: "Typo-tolerant column matches as {column_name: name}, e.g. {\"Vendor\": \"Acme Corporaton\"}. Every word must be within a small edit distance of a word in the cell. Use when the user's spelling of a name may be off, instead of retrying filters with variations." },
+        fuzzy_max_distance: { type: "integer", description: "Edits allowed per word for fuzzy (0-3). Default: 0 for words of up to 3 letters, 1 up to 6, else 2." },
         date_before: { type: "object", description: "Date range filter: {column_name: \"YYYY-MM-DD\"}. Returns only rows where the column's date is BEFORE the given date (exclusive). Use for finding expired/past items." },
         date_after: { type: "object", description: "Date range filter: {column_name: \"YYYY-MM-DD\"}. Returns only rows where the column's date is AFTER the given date (exclusive). Use for finding future/upcoming items." },
         columns: { type: "array", items: { type: "string" }, description: "Column names to include in each returned row. ALWAYS specify this — include only fields relevant to the question." },
@@ -269,10 +273,26 @@ export function buildExcelIndexTool(indexes) {
         distinct_values: { type: "string", description: "Column name to list all unique values for. Returns distinct_values (sorted array), distinct_column, and distinct_count. Use for 'what are all the X?' questions." },
         min_value: { type: "string", description: "Column name to find the minimum value for. Returns min object {column, value}. Works with dates and numbers." },
         max_value: { type: "string", description: "Column name to find the maximum value for. Returns max object {column, value}. Works with dates and numbers." },
+        aggregations: {
+          type: "array",
+          description: "Aggregations computed together in one pass over the matching rows. Each item: {op, column, percentile, name}. op is one of count, count_unique, sum, avg, min, max, percentile. column is required except for count; percentile (0-100) is required for op percentile. Results are keyed by name (default e.g. sum_Amount, p90_Amount, count).",
+          items: {
+            type: "object",
+            properties: {
+              op: { type: "string", enum: ["count", "count_unique", "sum", "avg", "min", "max", "percentile"] },
+              column: { type: "string" },
+              percentile: { type: "number" },
+              name: { type: "string" },
+            },
+            required: ["op"],
+          },
+        },
+        aggregate_by: { type: "array", items: { type: "string" }, description: "Up to 3 columns to group aggregations by (e.g. [\"State\", \"Category\"]). Requires aggregations." },
         sort_by: { type: "string", description: "Column name to sort results by. Works with dates, numbers, and text. Combine with sort_order." },
         sort_order: { type: "string", enum: ["asc", "desc"], description: "Sort direction: 'asc' (default) for ascending, 'desc' for descending." },
         limit: { type: "integer", description: "Max rows to return (default 50, max 500). Use 50 or fewer unless the user explicitly asks for a full list.", default: 50 },
         offset: { type: "integer", description: "Number of matching rows to skip before collecting results. Use for pagination (e.g. offset=100 for the second page of 100).", default: 0 },
+        cursor: { type: "string", description: "next_cursor from the previous page of this exact query. Fetches the next page consistently and without re-running the search. Do not combine with offset." },
       },
       required: ["index_name"],
     },
@@ -364,6 +384,7 @@ export function pickDateColumnFromQuery(query) {
 
 export function excelQueryNeedsEntitySummaryEnrichment(query) {
   if (query.count_unique) return false;
+  if (Array.isArray(query.aggregations) && query.aggregations.length > 0) return false;
   if (query.group_by) return false;
   if (query.distinct_values) return false;
   const db = query.date_before && typeof query.date_before === "object" ? Object.keys(query.date_before).length : 0;
@@ -433,12 +454,38 @@ export async function enrichExcelIndexResult(query, indexName, toolResultStr, id
   }
   if (parsed.total_matches <= 1) return toolResultStr;
 
-  const dateCol = pickDateColumnFromQuery(query);
-  const enrichPayload = {
+  const enrichStr = await invokeIndexQuery({
     action: "query",
     index_name: indexName,
+    ...buildEntitySummaryQuery(query, entityCol),
+  });
+  let enrichParsed;
+  try {
+    enrichParsed = JSON.parse(enrichStr);
+  } catch {
+    return toolResultStr;
+  }
+  if (typeof enrichParsed !== "object" || enrichParsed === null || enrichParsed.error) {
+    return toolResultStr;
+  }
+  return attachEntitySummary(parsed, enrichParsed, entityCol);
+}
+
+/**
+ * Build the count-only sub-query behind `_entity_summary`: the original
+ * filters, grouped and uniquely counted on the entity ID column.
+ *
+ * @param {object} query - The original tool-use input from the model.
+ * @param {string} entityCol - Entity ID column (see {@link pickEntityIdColumn}).
+ * @returns {object} Query fields without `action` / `index_name`.
+ */
+export function buildEntitySummaryQuery(query, entityCol) {
+  const dateCol = pickDateColumnFromQuery(query);
+  return {
     free_text: query.free_text || null,
     filters: query.filters || null,
+    fuzzy: query.fuzzy || null,
+    fuzzy_max_distance: typeof query.fuzzy_max_distance === "number" ? query.fuzzy_max_distance : null,
     date_before: query.date_before || null,
     date_after: query.date_after || null,
     count_only: true,
@@ -448,15 +495,22 @@ export async function enrichExcelIndexResult(query, indexName, toolResultStr, id
     limit: typeof query.limit === "number" ? query.limit : 100,
     offset: 0,
   };
-  const enrichStr = await invokeIndexQuery(enrichPayload);
-  let enrichParsed;
-  try {
-    enrichParsed = JSON.parse(enrichStr);
-  } catch {
-    return toolResultStr;
-  }
+}
+
+/**
+ * Inject `_entity_summary` into a parsed query result.
+ *
+ * Returns the original result re-serialized unchanged when the summary query
+ * failed or produced something unexpected.
+ *
+ * @param {object} parsed - Parsed result of the original query.
+ * @param {object} enrichParsed - Parsed result of {@link buildEntitySummaryQuery}.
+ * @param {string} entityCol - Entity ID column.
+ * @returns {string} JSON string of the (possibly) enriched result.
+ */
+function attachEntitySummary(parsed, enrichParsed, entityCol) {
   if (typeof enrichParsed !== "object" || enrichParsed === null || enrichParsed.error) {
-    return toolResultStr;
+    return JSON.stringify(parsed);
   }
 
   const groups = enrichParsed.groups || {};
@@ -483,6 +537,52 @@ export async function enrichExcelIndexResult(query, indexName, toolResultStr, id
   return JSON.stringify(parsed);
 }
 
+/**
+ * Run a model-issued Excel index query, with its entity summary when needed,
+ * in a single Lambda invocation.
+ *
+ * When {@link excelQueryNeedsEntitySummaryEnrichment} applies, the query and
+ * its entity-summary sub-query are sent together as one `action: "batch"`
+ * request, so the index is loaded once and the chat turn pays one Lambda
+ * round trip instead of two. The summary is attached only when more than one
+ * row matched, exactly as {@link enrichExcelIndexResult} does. Otherwise the
+ * query is sent on its own.
+ *
+ * @param {object} payload - Query payload (`action: "query"`, `index_name`, ...).
+ * @param {object} query - The original tool-use input from the model.
+ * @param {object} idxMeta - Index metadata (columns list) from the registry.
+ * @returns {Promise<string>} JSON string of query results, or an error message.
+ */
+export async function invokeExcelIndexQuery(payload, query, idxMeta) {
+  const entityCol = excelQueryNeedsEntitySummaryEnrichment(query)
+    ? pickEntityIdColumn(idxMeta?.columns)
+    : null;
+  if (!entityCol) return invokeIndexQuery(payload);
+
+  const main = { ...payload };
+  delete main.action;
+  delete main.index_name;
+  const batchStr = await invokeIndexQuery({
+    action: "batch",
+    index_name: payload.index_name,
+    queries: [main, buildEntitySummaryQuery(query, entityCol)],
+  });
+  let results;
+  try {
+    results = JSON.parse(batchStr).results;
+  } catch {
+    return batchStr;
+  }
+  if (!Array.isArray(results) || results.length !== 2) return batchStr;
+  const [parsed, enrichParsed] = results;
+  delete parsed.index_name;
+  if (parsed.error) return parsed.error;
+  if (typeof parsed.total_matches !== "number" || parsed.total_matches <= 1) {
+    return JSON.stringify(parsed);
+  }
+  return attachEntitySummary(parsed, enrichParsed, entityCol);
+}
+
 /**
  * Invoke the Excel index query Lambda and return the response body as a string.
  *
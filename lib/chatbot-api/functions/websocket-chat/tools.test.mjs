@@ -25,6 +25,7 @@ import {
   buildExcelIndexTool,
   excelQueryNeedsEntitySummaryEnrichment,
   enrichExcelIndexResult,
+  invokeExcelIndexQuery,
   fetchMetadata,
   STATIC_TOOLS,
 } from "./tools.mjs";
@@ -129,6 +130,14 @@ describe("capToolResultSize", () => {
     expect(parsed._note).toContain("offset=");
   });
 
+  it("drops next_cursor when rows are truncated", () => {
+    const rows = Array.from({ length: 200 }, (_, i) => ({ data: "x".repeat(1000), id: i }));
+    const input = JSON.stringify({ rows, total_matches: 400, next_cursor: "abc" });
+    const parsed = JSON.parse(capToolResultSize(input));
+    expect(parsed._truncated).toBe(true);
+    expect(parsed.next_cursor).toBeUndefined();
+  });
+
   it("truncated result fits within MAX_TOOL_RESULT_CHARS", () => {
     const bigRow = { data: "x".repeat(1000) };
     const rows = Array.from({ length: 200 }, (_, i) => ({ ...bigRow, id: i }));
@@ -397,6 +406,13 @@ describe("excelQueryNeedsEntitySummaryEnrichment", () => {
       distinct_values: "Vendor",
     })).toBe(false);
   });
+
+  it("returns false when filters + aggregations (suppressed)", () => {
+    expect(excelQueryNeedsEntitySummaryEnrichment({
+      filters: { State: "CA" },
+      aggregations: [{ op: "count" }],
+    })).toBe(false);
+  });
 });
 
 // ---------------------------------------------------------------------------
@@ -513,6 +529,88 @@ describe("enrichExcelIndexResult", () => {
   });
 });
 
+// ---------------------------------------------------------------------------
+// invokeExcelIndexQuery
+// ---------------------------------------------------------------------------
+
+describe("invokeExcelIndexQuery", () => {
+  const IDX_META = { columns: ["Contract_ID", "Vendor", "EndDate"] };
+  const lambdaResponse = (body) => ({
+    Payload: Buffer.from(JSON.stringify({ statusCode: 200, body: JSON.stringify(body) })),
+  });
+  const sentPayload = (n = 0) =>
+    JSON.parse(Buffer.from(mockLambdaSend.mock.calls[n][0].Payload).toString());
+
+  beforeEach(() => {
+    mockLambdaSend.mockReset();
+    process.env.EXCEL_INDEX_QUERY_FUNCTION = "test-excel-query-fn";
+  });
+
+  it("sends the query and its entity summary as one batch invocation", async () => {
+    mockLambdaSend.mockResolvedValue(lambdaResponse({
+      results: [
+        { index_name: "statewide", total_matches: 10, rows: [] },
+        { index_name: "statewide", unique_count: 3, groups: { C1: 5, C2: 3, C3: 2 } },
+      ],
+    }));
+    const result = await invokeExcelIndexQuery(
+      { action: "query", index_name: "statewide", free_text: "facilities" },
+      { free_text: "facilities" },
+      IDX_META,
+    );
+    expect(mockLambdaSend).toHaveBeenCalledTimes(1);
+    const sent = sentPayload();
+    expect(sent.action).toBe("batch");
+    expect(sent.index_name).toBe("statewide");
+    expect(sent.queries[0]).toEqual({ free_text: "facilities" });
+    expect(sent.queries[1].count_unique).toBe("Contract_ID");
+    const parsed = JSON.parse(result);
+    expect(parsed.index_name).toBeUndefined();
+    expect(parsed._entity_summary.distinct_entity_count).toBe(3);
+    expect(parsed._entity_summary.row_total_matches).toBe(10);
+  });
+
+  it("skips the summary when at most one row matched", async () => {
+    mockLambdaSend.mockResolvedValue(lambdaResponse({
+      results: [
+        { index_name: "statewide", total_matches: 1, rows: [{ Contract_ID: "C1" }] },
+        { index_name: "statewide", unique_count: 1, groups: { C1: 1 } },
+      ],
+    }));
+    const result = await invokeExcelIndexQuery(
+      { action: "query", index_name: "statewide", free_text: "acme" },
+      { free_text: "acme" },
+      IDX_META,
+    );
+    expect(JSON.parse(result)).toEqual({ total_matches: 1, rows: [{ Contract_ID: "C1" }] });
+  });
+
+  it("returns the sub-query error message when the main query fails", async () => {
+    mockLambdaSend.mockResolvedValue(lambdaResponse({
+      results: [
+        { index_name: "statewide", error: "DynamoDB get failed" },
+        { index_name: "statewide", error: "DynamoDB get failed" },
+      ],
+    }));
+    const result = await invokeExcelIndexQuery(
+      { action: "query", index_name: "statewide", free_text: "acme" },
+      { free_text: "acme" },
+      IDX_META,
+    );
+    expect(result).toBe("DynamoDB get failed");
+  });
+
+  it("sends a plain query when no enrichment applies", async () => {
+    mockLambdaSend.mockResolvedValue(lambdaResponse({ total_matches: 4, rows: [] }));
+    await invokeExcelIndexQuery(
+      { action: "query", index_name: "statewide", group_by: "Vendor" },
+      { group_by: "Vendor" },
+      IDX_META,
+    );
+    expect(sentPayload().action).toBe("query");
+  });
+});
+
 // ---------------------------------------------------------------------------
 // fetchMetadata
 // ---------------------------------------------------------------------------
@@ -16,6 +16,26 @@ export interface IndexPreview {
   rows: Record<string, unknown>[];
 }
 
+/** Upload formats the index parser ingests, by extension. */
+export const INDEX_UPLOAD_TYPES: Record<string, string> = {
+  ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+  ".csv": "text/csv",
+  ".tsv": "text/tab-separated-values",
+};
+
+export const INDEX_UPLOAD_ACCEPT = Object.keys(INDEX_UPLOAD_TYPES).join(",");
+
+/** Content-Type for an index upload, or undefined if the format isn't supported. */
+export function indexUploadType(fileName: string): string | undefined {
+  const dot = fileName.lastIndexOf(".");
+  return dot < 0 ? undefined : INDEX_UPLOAD_TYPES[fileName.slice(dot).toLowerCase()];
+}
+
+export interface UploadTarget {
+  signedUrl: string;
+  contentType: string;
+}
+
 export interface IndexInfo {
   index_name: string;
   display_name: string;
@@ -24,6 +44,8 @@ export interface IndexInfo {
   row_count: number;
   last_updated: string | null;
   status: IndexStatusValue;
+  /** Set on worksheet sub-indexes: the workbook index they belong to. */
+  parent_index_id?: string | null;
 }
 
 export class ExcelIndexClient {
@@ -103,7 +125,7 @@ export class ExcelIndexClient {
     };
   }
 
-  async getUploadUrl(indexId: string): Promise<string> {
+  async getUploadUrl(indexId: string, fileName: string): Promise<UploadTarget> {
     const auth = await Utils.authenticate();
     const response = await fetch(
       this.API + `/admin/indexes/${encodeURIComponent(indexId)}/upload-url`,
@@ -113,7 +135,7 @@ export class ExcelIndexClient {
           "Content-Type": "application/json",
           Authorization: auth,
         },
-        body: JSON.stringify({}),
+        body: JSON.stringify({ file_name: fileName }),
       }
     );
     const data = await response.json().catch(() => ({}));
@@ -123,7 +145,10 @@ export class ExcelIndexClient {
         `Failed to get upload URL (${response.status})`;
       throw new Error(msg);
     }
-    return data.signedUrl;
+    return {
+      signedUrl: data.signedUrl,
+      contentType: data.contentType ?? indexUploadType(fileName) ?? "",
+    };
   }
 
   async getPreview(indexId: string): Promise<IndexPreview> {
@@ -25,14 +25,15 @@ import {
 } from "react";
 import { AppContext } from "../../common/app-context";
 import { ApiClient } from "../../common/api-client/api-client";
-import type { IndexInfo } from "../../common/api-client/excel-index-client";
+import {
+  INDEX_UPLOAD_ACCEPT,
+  indexUploadType,
+  type IndexInfo,
+} from "../../common/api-client/excel-index-client";
 import { FileUploader } from "../../common/file-uploader";
 import { Utils } from "../../common/utils";
 import IndexCard, { type IndexApiAdapter } from "./index-card";
 
-const XLSX_MIME =
-  "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet";
-
 function IndexCardSkeleton() {
   return (
     <Paper sx={{ p: 2.5 }}>
@@ -133,10 +134,13 @@ export default function DataIndexesTab() {
         newDescription.trim() || undefined
       );
 
-      const signedUrl =
-        await apiClientRef.current.excelIndex.getUploadUrl(indexName);
+      const { signedUrl, contentType } =
+        await apiClientRef.current.excelIndex.getUploadUrl(
+          indexName,
+          newFile.name
+        );
       const uploader = new FileUploader();
-      await uploader.upload(newFile, signedUrl, XLSX_MIME, (uploaded) =>
+      await uploader.upload(newFile, signedUrl, contentType, (uploaded) =>
         setUploadProgress(Math.round((uploaded / newFile.size) * 100))
       );
 
@@ -153,7 +157,10 @@ export default function DataIndexesTab() {
   // ── optimistic delete — remove card immediately ──
   const handleDelete = useCallback(
     async (indexId: string) => {
-      setIndexes((prev) => prev.filter((i) => i.index_name !== indexId));
+      // Worksheet sub-indexes go with their workbook index
+      setIndexes((prev) =>
+        prev.filter((i) => i.index_name !== indexId && i.parent_index_id !== indexId)
+      );
       adapterCache.current.delete(indexId);
       try {
         await apiClientRef.current.excelIndex.deleteIndex(indexId);
@@ -168,8 +175,8 @@ export default function DataIndexesTab() {
   const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
     if (!file) return;
-    if (!file.name.toLowerCase().endsWith(".xlsx")) {
-      setCreateError("Only .xlsx files are supported.");
+    if (!indexUploadType(file.name)) {
+      setCreateError("Only .xlsx, .csv and .tsv files are supported.");
       setNewFile(null);
       return;
     }
@@ -184,8 +191,8 @@ export default function DataIndexesTab() {
       adapter = {
         getStatus: () =>
           apiClientRef.current.excelIndex.getStatus(indexId),
-        getUploadUrl: () =>
-          apiClientRef.current.excelIndex.getUploadUrl(indexId),
+        getUploadUrl: (fileName) =>
+          apiClientRef.current.excelIndex.getUploadUrl(indexId, fileName),
         getPreview: () =>
           apiClientRef.current.excelIndex.getPreview(indexId),
         updateIndex: (fields) =>
@@ -196,6 +203,11 @@ export default function DataIndexesTab() {
     return adapter;
   }, []);
 
+  const parentTitle = (parentId: string): string => {
+    const parent = indexes.find((i) => i.index_name === parentId);
+    return parent?.display_name || parentId;
+  };
+
   // ── skeleton loading ──
   if (loading) {
     return (
@@ -216,7 +228,8 @@ export default function DataIndexesTab() {
           title={idx.display_name || idx.index_name}
           description={idx.description || ""}
           api={getAdapter(idx.index_name)}
-          onDelete={() => handleDelete(idx.index_name)}
+          parentTitle={idx.parent_index_id ? parentTitle(idx.parent_index_id) : undefined}
+          onDelete={idx.parent_index_id ? undefined : () => handleDelete(idx.index_name)}
           onUpdated={() => loadIndexes()}
           pollUntilReady={idx.index_name === justCreatedId}
           onStatusChange={(status) => {
@@ -293,8 +306,8 @@ export default function DataIndexesTab() {
                 ref={fileInputRef}
                 onChange={handleFileChange}
                 style={{ display: "none" }}
-                accept=".xlsx"
-                aria-label="Choose .xlsx file"
+                accept={INDEX_UPLOAD_ACCEPT}
+                aria-label="Choose .xlsx, .csv or .tsv file"
               />
               <Button
                 variant="outlined"
@@ -302,7 +315,7 @@ export default function DataIndexesTab() {
                 onClick={() => fileInputRef.current?.click()}
                 disabled={creating}
               >
-                {newFile ? newFile.name : "Choose .xlsx file"}
+                {newFile ? newFile.name : "Choose .xlsx, .csv or .tsv file"}
               </Button>
               {newFile && (
                 <Typography
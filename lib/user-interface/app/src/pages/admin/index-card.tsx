@@ -31,6 +31,11 @@ import ExpandLessIcon from "@mui/icons-material/ExpandLess";
 import { useState, useRef, useEffect, useCallback } from "react";
 import { Utils } from "../../common/utils";
 import { FileUploader } from "../../common/file-uploader";
+import {
+  INDEX_UPLOAD_ACCEPT,
+  indexUploadType,
+  type UploadTarget,
+} from "../../common/api-client/excel-index-client";
 import StatusChip, { type StatusVariant } from "./status-chip";
 
 export interface IndexStatus {
@@ -48,7 +53,7 @@ export interface IndexPreview {
 
 export interface IndexApiAdapter {
   getStatus: () => Promise<IndexStatus>;
-  getUploadUrl: () => Promise<string>;
+  getUploadUrl: (fileName: string) => Promise<UploadTarget>;
   getPreview: () => Promise<IndexPreview>;
   updateIndex: (fields: {
     display_name?: string;
@@ -64,11 +69,11 @@ interface IndexCardProps {
   onDelete?: () => void;
   onUpdated?: () => void;
   pollUntilReady?: boolean;
+  /** Title of the workbook index this worksheet sub-index belongs to; its
+   *  data is replaced and deleted only through that index. */
+  parentTitle?: string;
 }
 
-const XLSX_MIME =
-  "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet";
-
 function toChipVariant(s: IndexStatus | null): StatusVariant {
   if (!s) return "empty";
   if (s.status === "PROCESSING") return "processing";
@@ -99,6 +104,7 @@ export default function IndexCard({
   onDelete,
   onUpdated,
   pollUntilReady,
+  parentTitle,
 }: IndexCardProps) {
   // ── stable refs for parent callbacks (avoids effect dependency churn) ──
   const onStatusChangeRef = useRef(onStatusChange);
@@ -197,7 +203,7 @@ export default function IndexCard({
   const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
     if (!file) return;
-    if (!file.name.toLowerCase().endsWith(".xlsx")) {
+    if (!indexUploadType(file.name)) {
       setUploadFile(null);
       return;
     }
@@ -214,8 +220,10 @@ export default function IndexCard({
     setUploadError(null);
     const uploader = new FileUploader();
     try {
-      const signedUrl = await api.getUploadUrl();
-      await uploader.upload(uploadFile, signedUrl, XLSX_MIME, (uploaded) =>
+      const { signedUrl, contentType } = await api.getUploadUrl(
+        uploadFile.name
+      );
+      await uploader.upload(uploadFile, signedUrl, contentType, (uploaded) =>
         setUploadProgress(Math.round((uploaded / uploadFile.size) * 100))
       );
       setUploadResult("success");
@@ -373,6 +381,11 @@ export default function IndexCard({
                 {description}
               </Typography>
             )}
+            {parentTitle && (
+              <Typography variant="body2" color="text.secondary">
+                {`Worksheet of "${parentTitle}"; replace or delete that index to change it`}
+              </Typography>
+            )}
             <Typography variant="body2" color="text.secondary">
               {statusError ? statusError : statusLabel(status)}
             </Typography>
@@ -401,14 +414,16 @@ export default function IndexCard({
 
       {/* Action buttons */}
       <Stack direction="row" spacing={1} sx={{ px: 2.5, pb: 2 }}>
-        <Button
-          size="small"
-          variant={showUpload ? "contained" : "outlined"}
-          startIcon={showUpload ? <ExpandLessIcon /> : <CloudUploadIcon />}
-          onClick={() => setShowUpload((v) => !v)}
-        >
-          {showUpload ? "Close" : "Replace Index"}
-        </Button>
+        {!parentTitle && (
+          <Button
+            size="small"
+            variant={showUpload ? "contained" : "outlined"}
+            startIcon={showUpload ? <ExpandLessIcon /> : <CloudUploadIcon />}
+            onClick={() => setShowUpload((v) => !v)}
+          >
+            {showUpload ? "Close" : "Replace Index"}
+          </Button>
+        )}
         <Button
           size="small"
           variant="outlined"
@@ -433,15 +448,15 @@ export default function IndexCard({
       </Stack>
 
       {/* Upload section */}
-      <Collapse in={showUpload}>
+      <Collapse in={showUpload && !parentTitle}>
         <Stack spacing={1.5} sx={{ px: 2.5, pb: 2.5, pt: 0.5 }}>
           <input
             type="file"
             ref={fileInputRef}
             onChange={handleFileChange}
             style={{ display: "none" }}
-            accept=".xlsx"
-            aria-label="Choose .xlsx file to upload"
+            accept={INDEX_UPLOAD_ACCEPT}
+            aria-label="Choose .xlsx, .csv or .tsv file to upload"
           />
           <Stack direction="row" alignItems="center" spacing={2}>
             <Button
@@ -354,6 +354,40 @@ describe('IAM roles and policies', () => {
     const policies = template.findResources('AWS::IAM::Policy');
     expect(Object.keys(policies).length).toBeGreaterThan(0);
   });
+
+  test('Excel index parser may make every DynamoDB call it issues on the data table', () => {
+    // Mirrors the boto3 calls in excel-index/parser (the unit tests mock AWS,
+    // so a missing action only shows up as AccessDenied in a deployment).
+    const required = [
+      'dynamodb:Query',
+      'dynamodb:BatchWriteItem',
+      'dynamodb:BatchGetItem',
+      'dynamodb:PutItem',
+      'dynamodb:DeleteItem',
+      'dynamodb:UpdateItem',
+      'dynamodb:GetItem',
+    ];
+    const statements = Object.values(template.findResources('AWS::IAM::Policy'))
+      .flatMap((policy: any) => policy.Properties.PolicyDocument.Statement);
+    // Policy minimization may merge and reorder statements, so compare as sets.
+    const granted = statements.some((st: any) => {
+      const actions = ([] as string[]).concat(st.Action);
+      return required.every((action) => actions.includes(action));
+    });
+    expect(granted).toBe(true);
+  });
+
+  test('Excel index parser may invoke itself by ARN (slice workers, async cleanup)', () => {
+    const parserIds = Object.keys(template.findResources('AWS::Lambda::Function'))
+      .filter((id) => id.includes('ExcelIndexParserFunction'));
+    expect(parserIds).toHaveLength(1);
+    const statements = Object.values(template.findResources('AWS::IAM::Policy'))
+      .flatMap((policy: any) => policy.Properties.PolicyDocument.Statement);
+    const granted = statements.some((st: any) =>
+      ([] as string[]).concat(st.Action).includes('lambda:InvokeFunction')
+      && JSON.stringify(st.Resource).includes(`"${parserIds[0]}"`));
+    expect(granted).toBe(true);
+  });
 });
 
 // ─── OpenSearch Serverless ────────────────────────────────────────────────────